@@ -1,19 +1,34 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
-import mysql.connector
-import pandas as pd
-import matplotlib.pyplot as plt
+from tkinter import ttk, messagebox, scrolledtext, filedialog
+from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import json
-import re
 import os
-import openai
 from dotenv import load_dotenv
 import threading
+import time
+import concurrent.futures
+from nl2sql_db import ConnectionPool, QueryCancelled
+from nl2sql_guard import QueryRejected
+from nl2sql_grid import VirtualTable
+from nl2sql_pipeline import NL2SQLPipeline, read_config, CONFIG_FILE
+from nl2sql_chart import draw_chart
+from nl2sql_export import ResultExport, progress_text
+from nl2sql_trace import Tracer
+from nl2sql_waterfall import WaterfallView
 
 # Load environment variables from .env file
 load_dotenv()
 
+class QueryRun:
+    """State of one submitted question, so that a newer question can cancel it"""
+    def __init__(self, query, trace):
+        self.query = query
+        self.trace = trace
+        self.cancelled = threading.Event()
+        self.futures = []
+
+
 class NL2SQLApp:
     def __init__(self, root):
         self.root = root
@@ -32,20 +47,34 @@ class NL2SQLApp:
             "database": ""
         }
         
+        # Optional tuning sections from the config file (schema cache, ...)
+        self.settings = {}
+        
+        # Performance figures shown next to the status indicator
+        self.metrics = {}
+        
         # Load saved configurations if available
         self.load_config()
         
+        # Question -> SQL -> results pipeline (pool, schema catalog, caches, LLM client)
+        self.pipeline = self.create_pipeline()
+        
+        # Per-stage timing spans of every question, for the Performance tab and the trace log
+        self.tracer = self.create_tracer()
+        
+        # Pipeline stages run on a shared executor; current_run is the question being answered
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.settings.get("pipeline", {}).get("workers", 4), thread_name_prefix="nl2sql")
+        self.current_run = None
+        
+        # Validated SQL of the last answered question, for File > Export Results
+        self.last_sql = None
+        
         # Create menu
         self.create_menu()
         
         # Create main UI
         self.create_widgets()
-        
-        # SQL blacklist for safety
-        self.sql_blacklist = [
-            "DELETE", "DROP", "UPDATE", "INSERT", "ALTER", "TRUNCATE", 
-            "CREATE", "RENAME", "REPLACE", "GRANT", "REVOKE"
-        ]
     
     def create_menu(self):
         menubar = tk.Menu(self.root)
@@ -55,6 +84,8 @@ class NL2SQLApp:
         file_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="File", menu=file_menu)
         file_menu.add_command(label="Database Configuration", command=self.show_config_window)
+        file_menu.add_command(label="Refresh Schema", command=self.refresh_schema)
+        file_menu.add_command(label="Export Results...", command=self.export_results)
         file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.root.quit)
         
@@ -97,6 +128,7 @@ class NL2SQLApp:
         buttons_frame.pack(fill=tk.X, padx=5, pady=5)
         
         ttk.Button(buttons_frame, text="Execute Query", command=self.process_query).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons_frame, text="Cancel", command=self.cancel_query).pack(side=tk.LEFT, padx=5)
         ttk.Button(buttons_frame, text="Clear", command=self.clear_query).pack(side=tk.LEFT, padx=5)
         
         # Status indicator
@@ -105,6 +137,10 @@ class NL2SQLApp:
         self.status_indicator = ttk.Label(buttons_frame, textvariable=self.status_var)
         self.status_indicator.pack(side=tk.RIGHT, padx=5)
         
+        # Performance metrics (schema tokens, cache hits, ...)
+        self.metrics_var = tk.StringVar()
+        ttk.Label(buttons_frame, textvariable=self.metrics_var, foreground="gray").pack(side=tk.RIGHT, padx=10)
+        
         # Generated SQL area
         sql_frame = ttk.LabelFrame(main_frame, text="Generated SQL", padding="10")
         sql_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -124,25 +160,35 @@ class NL2SQLApp:
         self.data_frame = ttk.Frame(self.results_notebook)
         self.results_notebook.add(self.data_frame, text="Data")
         
-        # Create treeview for data results
-        self.result_tree = ttk.Treeview(self.data_frame)
-        self.result_tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        
-        # Add scrollbar to treeview
-        tree_scrollbar = ttk.Scrollbar(self.data_frame, orient="vertical", command=self.result_tree.yview)
-        tree_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.result_tree.configure(yscrollcommand=tree_scrollbar.set)
+        # Virtualised grid for data results (only visible rows become Treeview items)
+        self.result_grid = VirtualTable(self.data_frame)
+        self.result_grid.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
         # Tab 2: Chart view
         self.chart_frame = ttk.Frame(self.results_notebook)
         self.results_notebook.add(self.chart_frame, text="Chart")
         
+        # One figure and canvas, redrawn for every result instead of being rebuilt
+        self.chart_figure = Figure(figsize=(10, 6))
+        self.chart_canvas = FigureCanvasTkAgg(self.chart_figure, master=self.chart_frame)
+        self.chart_canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.chart_width = 1000
+        self.chart_frame.bind("<Configure>", lambda event: setattr(self, "chart_width", event.width))
+        
         # Tab 3: Summary view
         self.summary_frame = ttk.Frame(self.results_notebook)
         self.results_notebook.add(self.summary_frame, text="Summary")
         
         self.summary_text = scrolledtext.ScrolledText(self.summary_frame, wrap=tk.WORD)
         self.summary_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        # Tab 4: Performance view (stage waterfall of the last few questions)
+        self.performance_frame = ttk.Frame(self.results_notebook)
+        self.results_notebook.add(self.performance_frame, text="Performance")
+        
+        self.waterfall = WaterfallView(self.performance_frame)
+        self.waterfall.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.waterfall.set_traces(self.tracer.traces())
     
     def show_config_window(self):
         """Show database configuration window"""
@@ -209,15 +255,25 @@ class NL2SQLApp:
     
     def test_connection(self, host, port, user, password, database):
         """Test MySQL connection with provided credentials"""
+        test_config = {
+            "host": host,
+            "port": port,
+            "user": user,
+            "password": password,
+            "database": database
+        }
         try:
-            conn = mysql.connector.connect(
-                host=host,
-                port=port,
-                user=user,
-                password=password,
-                database=database
-            )
-            conn.close()
+            if test_config == self.db_config:
+                # Same settings as the running app: check a pooled connection
+                with self.pipeline.get_connection_pool().connection() as conn:
+                    conn.ping()
+            else:
+                pool = ConnectionPool(test_config, size=1)
+                try:
+                    with pool.connection() as conn:
+                        conn.ping()
+                finally:
+                    pool.close()
             messagebox.showinfo("Success", "Database connection successful!")
         except Exception as e:
             messagebox.showerror("Connection Error", f"Failed to connect to database: {str(e)}")
@@ -235,14 +291,19 @@ class NL2SQLApp:
         self.openai_api_key = api_key
         os.environ["OPENAI_API_KEY"] = api_key
         
+        # The pool, schema catalog and LLM client belong to the previous settings
+        self.pipeline.close()
+        self.pipeline = self.create_pipeline()
+        
         # Save to file
         config_data = {
             "database": self.db_config,
-            "openai_api_key": self.openai_api_key
+            "openai_api_key": self.openai_api_key,
+            **self.settings
         }
         
         try:
-            with open("nl2sql_config.json", "w") as f:
+            with open(CONFIG_FILE, "w") as f:
                 json.dump(config_data, f)
             messagebox.showinfo("Success", "Configuration saved successfully!")
             window.destroy()
@@ -252,16 +313,27 @@ class NL2SQLApp:
     def load_config(self):
         """Load configuration from file if it exists"""
         try:
-            if os.path.exists("nl2sql_config.json"):
-                with open("nl2sql_config.json", "r") as f:
-                    config_data = json.load(f)
-                
-                self.db_config = config_data.get("database", self.db_config)
-                self.openai_api_key = config_data.get("openai_api_key", "")
+            if os.path.exists(CONFIG_FILE):
+                self.db_config, self.openai_api_key, self.settings = read_config(CONFIG_FILE)
                 os.environ["OPENAI_API_KEY"] = self.openai_api_key
         except Exception as e:
             messagebox.showwarning("Warning", f"Failed to load configuration: {str(e)}")
     
+    def create_pipeline(self):
+        """Build the pipeline for the current settings, reporting its metrics in the status area"""
+        return NL2SQLPipeline(self.db_config, self.openai_api_key, self.settings, on_metric=self.set_metric)
+    
+    def create_tracer(self):
+        """Build the tracer from the tracing settings"""
+        tracing = self.settings.get("tracing", {})
+        return Tracer(
+            path=tracing.get("path", os.path.join(".nl2sql_cache", "traces.jsonl")) if tracing.get("enabled", True) else None,
+            keep=tracing.get("keep", 20),
+            max_bytes=tracing.get("max_bytes", 10 * 1024 * 1024),
+            otlp_endpoint=tracing.get("otlp_endpoint"),
+            service_name=tracing.get("service_name", "nl2sql")
+        )
+    
     def process_query(self):
         """Process the natural language query and execute it"""
         query = self.query_text.get("1.0", tk.END).strip()
@@ -270,300 +342,292 @@ class NL2SQLApp:
             messagebox.showwarning("Warning", "Please enter a query.")
             return
         
-        # Check if configuration is set
-        if not self.db_config["host"] or not self.db_config["user"] or not self.openai_api_key:
+        # Check if configuration is set (a local OpenAI-compatible server may not need a key)
+        has_llm = self.openai_api_key or self.settings.get("llm", {}).get("base_url")
+        if not self.db_config["host"] or not self.db_config["user"] or not has_llm:
             messagebox.showwarning("Warning", "Please configure database and API settings first.")
             self.show_config_window()
             return
         
+        # A new question supersedes whatever is still running
+        if self.current_run is not None:
+            self.cancel_run(self.current_run)
+        run = QueryRun(query, self.tracer.start(query))
+        self.current_run = run
+        
         # Update status
         self.status_var.set("Processing...")
         self.root.update_idletasks()
         
         # Run the query processing in a separate thread to avoid UI freezing
-        threading.Thread(target=self.execute_query_process, args=(query,), daemon=True).start()
+        threading.Thread(target=self.execute_query_process, args=(query, run), daemon=True).start()
     
-    def execute_query_process(self, query):
+    def execute_query_process(self, query, run):
+        status = "ok"
+        error = None
         try:
-            # Step 1: Convert natural language to SQL using GPT-4o-mini
-            sql_query = self.nl_to_sql(query)
-            
-            # Update SQL text area
-            self.root.after(0, lambda: self.sql_text.delete("1.0", tk.END))
-            self.root.after(0, lambda: self.sql_text.insert(tk.END, sql_query))
-            
-            # Step 2: Validate SQL for safety
-            if not self.validate_sql(sql_query):
-                self.root.after(0, lambda: self.status_var.set("Ready"))
-                return
-            
-            # Step 3: Execute SQL on MySQL database
-            df = self.execute_sql(sql_query)
-            
-            # Step 4: Display results
-            self.root.after(0, lambda: self.display_results(df))
-            
-            # Step 5: Generate summary
-            summary = self.generate_summary(query, sql_query, df)
-            self.root.after(0, lambda: self.summary_text.delete("1.0", tk.END))
-            self.root.after(0, lambda: self.summary_text.insert(tk.END, summary))
-            
-            # Step 6: Generate chart if appropriate
-            self.root.after(0, lambda: self.generate_chart(df))
+            # Step 1: Fetch the schema of the tables relevant to the question
+            schema_info = self.run_stage(run, "schema", self.pipeline.get_prompt_schema, query)
+            
+            # Step 2: Convert natural language to SQL using GPT-4o-mini, showing tokens as they arrive
+            self.post(run, lambda: self.sql_text.delete("1.0", tk.END))
+            sql_query = self.run_stage(run, "generate", self.pipeline.nl_to_sql, query, schema_info=schema_info,
+                                       on_token=lambda token: self.post(run, lambda: self.sql_text.insert(tk.END, token)))
+            
+            # Replace the raw stream with the cleaned-up SQL
+            self.post(run, lambda: self.sql_text.delete("1.0", tk.END))
+            self.post(run, lambda: self.sql_text.insert(tk.END, sql_query))
+            
+            # Step 3 to 6: Validate the SQL, check its plan against the cost budget (adding a LIMIT and a
+            # server-side time limit) and execute it, displaying rows as they arrive; fixable failures
+            # go back to the model for a corrected statement
+            shown = []
+            
+            def show_chunk(chunk):
+                if not shown:
+                    self.post(run, lambda: self.traced(run, "display", self.display_results, chunk))
+                else:
+                    self.post(run, lambda: self.traced(run, "display", self.append_results, chunk))
+                shown.append(len(chunk))
+            
+            def show_repair(repaired_sql):
+                # The repaired statement's rows replace whatever the failed one displayed
+                shown.clear()
+                self.post(run, lambda: self.status_var.set("Retrying with repaired SQL..."))
+                self.post(run, lambda: self.sql_text.delete("1.0", tk.END))
+                self.post(run, lambda: self.sql_text.insert(tk.END, repaired_sql))
+            
+            outcome = self.pipeline.execute_with_repair(
+                query, sql_query,
+                stage=lambda name, func, *args, **kwargs: self.run_stage(run, name, func, *args, **kwargs),
+                on_chunk=show_chunk,
+                on_repair=show_repair
+            )
+            df = outcome["df"]
+            sql_query = outcome["sql"]
+            run_sql = outcome["run_sql"]
+            self.set_metric("guard", "; ".join(outcome["notes"]))
+            self.post(run, lambda: self.sql_text.delete("1.0", tk.END))
+            self.post(run, lambda: self.sql_text.insert(tk.END, run_sql))
+            self.post(run, lambda: setattr(self, "last_sql", sql_query))
+            
+            # Step 7 and 8: Chart preparation and the summary only need the data, so they run side by side;
+            # the prepared chart is drawn on the UI thread as soon as it is ready
+            chart_future = self.executor.submit(self.prepare_chart, run, df, sql_query)
+            run.futures.append(chart_future)
+            self.post(run, lambda: self.summary_text.delete("1.0", tk.END))
+            try:
+                summary = self.run_stage(run, "summary", self.pipeline.generate_summary, query, sql_query, df,
+                                         on_token=lambda token: self.post(run, lambda: self.summary_text.insert(tk.END, token)))
+            except QueryCancelled:
+                raise
+            except Exception as e:
+                summary = f"Failed to generate summary: {str(e)}"
+            
+            # Let the chart queue its drawing before the trace is closed
+            concurrent.futures.wait([chart_future],
+                                    timeout=self.settings.get("pipeline", {}).get("timeouts", {}).get("chart", 30))
+            
+            # Replace the raw stream with the final text
+            self.post(run, lambda: self.summary_text.delete("1.0", tk.END))
+            self.post(run, lambda: self.summary_text.insert(tk.END, summary))
             
             # Update status
-            self.root.after(0, lambda: self.status_var.set("Ready"))
-            
+            self.post(run, lambda: self.status_var.set("Ready"))
+            
+        except QueryCancelled:
+            status = "cancelled"
+            if run is self.current_run:
+                self.root.after(0, lambda: self.status_var.set("Cancelled"))
+        except QueryRejected as e:
+            status, error = "rejected", str(e)
+            message = "\n".join(item["message"] for item in e.reasons)
+            self.post(run, lambda: messagebox.showerror("Query Rejected", message))
+            self.post(run, lambda: self.status_var.set("Rejected"))
         except Exception as e:
             error_msg = str(e)
-            self.root.after(0, lambda: messagebox.showerror("Error", f"An error occurred: {error_msg}"))
-            self.root.after(0, lambda: self.status_var.set("Error"))
+            status, error = "error", error_msg
+            self.post(run, lambda: messagebox.showerror("Error", f"An error occurred: {error_msg}"))
+            self.post(run, lambda: self.status_var.set("Error"))
+        finally:
+            # Queued behind the display and chart drawing so their spans are included
+            self.root.after(0, lambda: self.finish_trace(run, status, error))
     
-    def nl_to_sql(self, natural_language_query):
-        """Convert natural language to SQL using GPT-4o-mini"""
-        try:
-            # Get database schema information
-            schema_info = self.get_db_schema()
-            
-            # Set up the prompt for GPT-4o-mini
-            prompt = f"""
-            You are an SQL expert that converts natural language queries to valid MySQL SQL statements.
-            
-            DATABASE SCHEMA:
-            {schema_info}
-            
-            INSTRUCTIONS:
-            - Generate a valid MySQL SELECT query only (no data modification queries)
-            - Include appropriate JOINs if needed
-            - Add a LIMIT clause if not specified in the question
-            - Return ONLY the SQL query without any explanation or additional text
-            
-            USER QUERY: {natural_language_query}
-            
-            SQL:
-            """
-            
-            # Call GPT-4o-mini
-            client = openai.OpenAI(api_key=self.openai_api_key)
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You generate SQL queries from natural language. Reply with ONLY the SQL query."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0,
-                max_tokens=500
-            )
-            
-            # Extract SQL from response
-            generated_sql = response.choices[0].message.content.strip()
-            
-            # Clean up the response (remove backticks, etc.)
-            generated_sql = re.sub(r'^```sql\s*', '', generated_sql)
-            generated_sql = re.sub(r'\s*```$', '', generated_sql)
-            
-            return generated_sql
-            
-        except Exception as e:
-            raise Exception(f"Failed to convert natural language to SQL: {str(e)}")
+    def run_stage(self, run, name, func, *args, **kwargs):
+        """Run one pipeline stage on the executor, honouring its timeout and cancellation of the run"""
+        if run.cancelled.is_set():
+            raise QueryCancelled("Query cancelled")
+        
+        timeout = self.settings.get("pipeline", {}).get("timeouts", {}).get(name, 120)
+        deadline = time.monotonic() + timeout
+        
+        # The span covers the work on the executor thread, not the wait for a free worker
+        def traced_stage():
+            with run.trace.span(name):
+                return func(*args, **kwargs)
+        
+        future = self.executor.submit(traced_stage)
+        run.futures.append(future)
+        
+        # Poll so that a newer question or the Cancel button can interrupt the wait
+        while True:
+            try:
+                return future.result(timeout=0.1)
+            except concurrent.futures.TimeoutError:
+                if run.cancelled.is_set():
+                    raise QueryCancelled("Query cancelled")
+                if time.monotonic() >= deadline:
+                    future.cancel()
+                    if name == "execute":
+                        self.pipeline.cancel_active_queries()
+                    raise Exception(f"The {name} stage timed out after {timeout} seconds")
     
-    def get_db_schema(self):
-        """Get database schema information for context"""
-        try:
-            conn = mysql.connector.connect(**self.db_config)
-            cursor = conn.cursor()
-            
-            # Get list of tables
-            cursor.execute("SHOW TABLES")
-            tables = cursor.fetchall()
-            
-            schema_info = []
-            
-            # Get columns for each table
-            for table in tables:
-                table_name = table[0]
-                cursor.execute(f"DESCRIBE {table_name}")
-                columns = cursor.fetchall()
-                
-                column_info = []
-                for col in columns:
-                    col_name = col[0]
-                    col_type = col[1]
-                    column_info.append(f"{col_name} ({col_type})")
-                
-                schema_info.append(f"Table: {table_name}\nColumns: {', '.join(column_info)}\n")
-            
-            cursor.close()
-            conn.close()
-            
-            return "\n".join(schema_info)
-            
-        except Exception as e:
-            raise Exception(f"Failed to get database schema: {str(e)}")
+    def traced(self, run, name, func, *args):
+        """Run a UI-thread step of a question as a span of its trace"""
+        with run.trace.span(name):
+            return func(*args)
+    
+    def finish_trace(self, run, status, error):
+        """Close a question's trace and redraw the Performance tab"""
+        self.tracer.finish(run.trace, status, error)
+        self.waterfall.set_traces(self.tracer.traces())
     
-    def validate_sql(self, sql_query):
-        """Validate SQL for safety"""
-        sql_upper = sql_query.upper()
-        
-        # Check for blacklisted commands
-        for cmd in self.sql_blacklist:
-            if cmd in sql_upper and not f"'{cmd}" in sql_upper and not f'"{cmd}' in sql_upper:
-                messagebox.showerror("Security Error", 
-                                    f"For security reasons, {cmd} commands are not allowed.")
-                return False
-        
-        # Ensure the query is a SELECT statement
-        if not sql_upper.strip().startswith("SELECT"):
-            messagebox.showerror("Security Error", 
-                                "Only SELECT queries are allowed for security reasons.")
-            return False
-        
-        # Ensure no multiple statements (no semicolons except at the end)
-        if ";" in sql_query[:-1]:
-            messagebox.showerror("Security Error", 
-                                "Multiple SQL statements are not allowed.")
-            return False
-        
-        return True
+    def post(self, run, callback):
+        """Schedule a UI update on the Tk thread, dropping it if the run has been superseded"""
+        def guarded():
+            if run is self.current_run and not run.cancelled.is_set():
+                callback()
+        self.root.after(0, guarded)
     
-    def execute_sql(self, sql_query):
-        """Execute SQL query on MySQL database"""
+    def cancel_run(self, run):
+        """Cancel a submitted question: pending stages, the running SQL statement and later UI updates"""
+        run.cancelled.set()
+        for future in run.futures:
+            future.cancel()
+        self.pipeline.cancel_active_queries()
+    
+    def cancel_query(self):
+        """Cancel the question currently being processed"""
+        run = self.current_run
+        if run is None or run.cancelled.is_set():
+            return
+        self.status_var.set("Cancelled")
+        self.cancel_run(run)
+    
+    def set_metric(self, key, text):
+        """Update one entry of the metrics shown in the status area (safe from worker threads)"""
+        self.metrics[key] = text
+        line = " | ".join(value for value in self.metrics.values() if value)
+        self.root.after(0, lambda: self.metrics_var.set(line))
+    
+    def refresh_schema(self):
+        """Reload the schema catalog from the database in the background"""
+        if not self.db_config["host"] or not self.db_config["user"]:
+            messagebox.showwarning("Warning", "Please configure database settings first.")
+            return
+        
+        self.status_var.set("Refreshing schema...")
+        
+        def worker():
+            try:
+                self.pipeline.get_db_schema(force=True)
+                self.root.after(0, lambda: self.status_var.set("Ready"))
+            except Exception as e:
+                error_msg = str(e)
+                self.root.after(0, lambda: messagebox.showerror("Error", error_msg))
+                self.root.after(0, lambda: self.status_var.set("Error"))
+        
+        threading.Thread(target=worker, daemon=True).start()
+    
+    def export_results(self):
+        """Stream the full result of the last query from the database to a CSV, Parquet or Excel file"""
+        if not self.last_sql:
+            messagebox.showwarning("Warning", "Run a query before exporting its results.")
+            return
+        
+        path = filedialog.asksaveasfilename(
+            parent=self.root,
+            title="Export Results",
+            defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("CSV (gzip)", "*.csv.gz"), ("CSV (zstd)", "*.csv.zst"),
+                       ("Parquet", "*.parquet"), ("Excel", "*.xlsx")]
+        )
+        if not path:
+            return
+        
+        # Progress window; the total is unknown until the cursor runs dry, so the bar only shows activity
+        window = tk.Toplevel(self.root)
+        window.title("Export Results")
+        window.transient(self.root)
+        frame = ttk.Frame(window, padding="20")
+        frame.pack(fill=tk.BOTH, expand=True)
+        ttk.Label(frame, text=f"Exporting to {os.path.basename(path)}").pack(anchor=tk.W)
+        progress_bar = ttk.Progressbar(frame, mode="indeterminate", length=320)
+        progress_bar.pack(fill=tk.X, pady=10)
+        progress_bar.start(10)
+        progress_var = tk.StringVar(value="Running query...")
+        ttk.Label(frame, textvariable=progress_var).pack(anchor=tk.W)
+        
+        def show_progress(rows, size, seconds):
+            text = progress_text(rows, size, seconds)
+            self.root.after(0, lambda: progress_var.set(text))
+        
         try:
-            conn = mysql.connector.connect(**self.db_config)
-            
-            # Execute query and convert to pandas DataFrame
-            df = pd.read_sql_query(sql_query, conn)
-            conn.close()
-            
-            return df
-            
+            export = ResultExport(self.pipeline, self.last_sql, path, on_progress=show_progress)
         except Exception as e:
-            raise Exception(f"Failed to execute SQL query: {str(e)}")
+            window.destroy()
+            messagebox.showerror("Export Error", f"Failed to export results: {str(e)}")
+            return
+        
+        def cancel():
+            progress_var.set("Cancelling...")
+            threading.Thread(target=export.cancel, daemon=True).start()
+        
+        ttk.Button(frame, text="Cancel", command=cancel).pack(pady=5)
+        window.protocol("WM_DELETE_WINDOW", cancel)
+        
+        def worker():
+            try:
+                rows = export.run()
+                message = f"Exported {rows:,} rows to {path}"
+                self.root.after(0, lambda: messagebox.showinfo("Export Complete", message))
+            except QueryCancelled:
+                pass
+            except Exception as e:
+                error_msg = str(e)
+                self.root.after(0, lambda: messagebox.showerror("Export Error", f"Failed to export results: {error_msg}"))
+            finally:
+                self.root.after(0, window.destroy)
+        
+        threading.Thread(target=worker, daemon=True).start()
     
     def display_results(self, df):
-        """Display results in the treeview"""
-        # Clear existing data
-        for item in self.result_tree.get_children():
-            self.result_tree.delete(item)
-        
-        # Configure columns
-        columns = list(df.columns)
-        self.result_tree["columns"] = columns
-        
-        # Configure headings
-        self.result_tree["show"] = "headings"
-        for col in columns:
-            self.result_tree.heading(col, text=col)
-            self.result_tree.column(col, width=100)
-        
-        # Add data rows
-        for _, row in df.iterrows():
-            values = list(row)
-            self.result_tree.insert("", tk.END, values=values)
+        """Display results in the data grid"""
+        self.result_grid.set_data(df)
     
-    def generate_chart(self, df):
-        """Generate appropriate chart for the data"""
-        # Clear current chart
-        for widget in self.chart_frame.winfo_children():
-            widget.destroy()
-        
-        # Check if we have data and it's suitable for visualization
-        if df.empty or len(df.columns) < 2:
-            ttk.Label(self.chart_frame, text="No data available for visualization").pack(expand=True)
-            return
-        
+    def append_results(self, df):
+        """Add rows to the data grid below the ones already shown"""
+        self.result_grid.append(df)
+    
+    def prepare_chart(self, run, df, sql_query):
+        """Work out the chart on a worker thread, then queue its drawing on the UI thread"""
         try:
-            # Create figure and axis
-            fig, ax = plt.subplots(figsize=(10, 6))
-            
-            # Create a default chart based on the data
-            if len(df) <= 10:  # Small number of rows - bar chart
-                if df.shape[1] == 2:  # Two columns (category and value)
-                    x_col = df.columns[0]
-                    y_col = df.columns[1]
-                    df.plot(kind='bar', x=x_col, y=y_col, ax=ax, legend=False)
-                    ax.set_ylabel(y_col)
-                else:  # More than two columns - select numeric columns for multi-bar
-                    numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
-                    if numeric_cols:
-                        non_numeric_cols = [col for col in df.columns if col not in numeric_cols]
-                        if non_numeric_cols:
-                            x_col = non_numeric_cols[0]
-                            df.plot(kind='bar', x=x_col, y=numeric_cols[:3], ax=ax)
-                        else:
-                            df.plot(kind='bar', ax=ax)
-            else:  # More rows - line chart if there seems to be a trend
-                numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
-                if df.shape[1] >= 2 and numeric_cols:
-                    # Check if first column might be a date or category for x-axis
-                    x_col = df.columns[0]
-                    y_cols = numeric_cols
-                    df.plot(kind='line', x=x_col, y=y_cols[:3], ax=ax, marker='o')
-            
-            ax.set_title("Query Results Visualization")
-            plt.tight_layout()
-            
-            # Embed the plot in the chart frame
-            canvas = FigureCanvasTkAgg(fig, master=self.chart_frame)
-            canvas.draw()
-            canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
-            
+            with run.trace.span("chart"):
+                # By default keep about one point per pixel of the chart's width
+                spec = self.pipeline.chart_spec(sql_query, df, self.chart_width)
+        except QueryCancelled:
+            return
         except Exception as e:
-            ttk.Label(self.chart_frame, text=f"Failed to generate chart: {str(e)}").pack(expand=True)
+            spec = {"kind": None, "message": f"Failed to generate chart: {str(e)}"}
+        self.post(run, lambda: self.traced(run, "draw", self.show_chart, spec))
     
-    def generate_summary(self, query, sql_query, df):
-        """Generate summary of the query results using GPT-4o-mini"""
+    def show_chart(self, spec):
+        """Draw a prepared chart on the chart tab's figure"""
         try:
-            # If we don't have any data, return a simple message
-            if df.empty:
-                return "No data found for your query."
-            
-            # Get data statistics
-            row_count = len(df)
-            col_count = len(df.columns)
-            
-            # Create a summary of the data
-            data_sample = df.head(5).to_string()
-            data_stats = df.describe().to_string() if not df.empty else "No data"
-            
-            # Set up the prompt for GPT-4o-mini
-            prompt = f"""
-            Analyze the following database query and results:
-            
-            Natural Language Query: {query}
-            SQL Query: {sql_query}
-            
-            Data sample (first 5 rows):
-            {data_sample}
-            
-            Data statistics:
-            {data_stats}
-            
-            Total rows returned: {row_count}
-            
-            Please provide a concise, meaningful summary of these results in 3-4 sentences. 
-            Focus on key insights, patterns, or notable findings in the data.
-            """
-            
-            # Call GPT-4o-mini for summary
-            client = openai.OpenAI(api_key=self.openai_api_key)
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You provide concise, insightful summaries of database query results."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.5,
-                max_tokens=200
-            )
-            
-            # Extract summary from response
-            summary = response.choices[0].message.content.strip()
-            
-            return summary
-            
+            draw_chart(self.chart_figure, spec)
         except Exception as e:
-            return f"Failed to generate summary: {str(e)}"
+            draw_chart(self.chart_figure, {"kind": None, "message": f"Failed to generate chart: {str(e)}"})
+        self.chart_canvas.draw()
     
     def use_example(self, event):
         """Fill the query text box with the selected example"""
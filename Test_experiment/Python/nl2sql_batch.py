@@ -0,0 +1,171 @@
+import argparse
+import concurrent.futures
+import csv
+import json
+import os
+import sys
+import time
+
+from nl2sql_pipeline import NL2SQLPipeline, read_config, CONFIG_FILE
+
+
+def read_questions(path):
+    """Read (id, question) pairs from a JSONL, CSV or plain text file"""
+    questions = []
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if extension in (".jsonl", ".json"):
+            for line in f:
+                if line.strip():
+                    item = json.loads(line)
+                    questions.append((item.get("id"), item["question"]))
+        elif extension == ".csv":
+            for row in csv.DictReader(f):
+                questions.append((row.get("id"), row["question"]))
+        else:
+            # One question per line
+            questions.extend((None, line.strip()) for line in f if line.strip())
+
+    # Number the questions that have no id of their own
+    questions = [(str(qid) if qid not in (None, "") else str(index + 1), question)
+                 for index, (qid, question) in enumerate(questions)]
+
+    # Each id names a result file, so two questions sharing one would overwrite each other's results
+    seen = {}
+    for index, (qid, question) in enumerate(questions):
+        name = file_id(qid)
+        if name in seen:
+            raise ValueError(f"Questions {seen[name] + 1} and {index + 1} in {path} share the id '{qid}' "
+                             f"(result file {name}); give every question a unique id")
+        seen[name] = index
+    return questions
+
+
+def file_id(qid):
+    """A question id as a file name (letters, digits, '-' and '_')"""
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in qid)
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def write_result(result, output_dir, qid, file_format):
+    """Write one result set to the output directory and return its file name"""
+    name = f"{file_id(qid)}.{file_format}"
+    path = os.path.join(output_dir, name)
+    if file_format == "parquet":
+        result["df"].to_parquet(path, index=False)
+    else:
+        result["df"].to_csv(path, index=False)
+    return name
+
+
+def run_batch(pipeline, questions, output_dir, workers=4, file_format="csv", summarize=False):
+    """Answer every question on a thread pool sharing one pipeline; returns the result records"""
+    os.makedirs(output_dir, exist_ok=True)
+    records = []
+
+    def answer(qid, question):
+        result = pipeline.answer(question, summarize=summarize)
+        record = {
+            "id": qid,
+            "question": question,
+            "sql": result["sql"],
+            "row_count": result["row_count"],
+            "truncated": result["truncated"],
+            "summary": result["summary"],
+            "timings": {stage: round(seconds, 4) for stage, seconds in result["timings"].items()},
+            "error": result["error"],
+            "rejected": [item["code"] for item in result["rejected"]],
+            "notes": result["notes"],
+            "repairs": result["repairs"],
+            "file": None
+        }
+        if result["df"] is not None:
+            try:
+                record["file"] = write_result(result, output_dir, qid, file_format)
+            except Exception as e:
+                record["error"] = f"Failed to write results: {str(e)}"
+        return record
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="nl2sql-batch")
+    try:
+        futures = [executor.submit(answer, qid, question) for qid, question in questions]
+        with open(os.path.join(output_dir, "results.jsonl"), "w", encoding="utf-8") as out:
+            for future in concurrent.futures.as_completed(futures):
+                record = future.result()
+                records.append(record)
+                out.write(json.dumps(record, default=str) + "\n")
+                out.flush()
+                status = "error: " + record["error"] if record["error"] else f"{record['row_count']} rows"
+                print(f"[{len(records)}/{len(questions)}] {record['id']}: {status}", file=sys.stderr)
+    except KeyboardInterrupt:
+        # Drop the questions not started yet and stop the statements that are running
+        executor.shutdown(wait=False, cancel_futures=True)
+        pipeline.cancel_active_queries()
+        raise
+    finally:
+        executor.shutdown(wait=True)
+    return records
+
+
+def print_stats(records, wall_time):
+    """Print throughput and latency figures for a finished batch"""
+    failed = [record for record in records if record["error"]]
+    totals = [record["timings"].get("total", 0.0) for record in records]
+    repaired = [record for record in records if record["repairs"] and not record["error"]]
+    print(f"Questions: {len(records)} ({len(records) - len(failed)} ok, {len(failed)} failed, "
+          f"{len(repaired)} succeeded after repair)")
+    print(f"Wall time: {wall_time:.2f}s ({len(records) / wall_time if wall_time else 0:.2f} questions/s)")
+    print(f"Latency: p50 {percentile(totals, 0.5):.2f}s, p95 {percentile(totals, 0.95):.2f}s")
+    for stage in ("schema", "generate", "validate", "preflight", "execute", "repair", "summary"):
+        values = [record["timings"][stage] for record in records if stage in record["timings"]]
+        if values:
+            print(f"  {stage}: p50 {percentile(values, 0.5):.2f}s, p95 {percentile(values, 0.95):.2f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer a file of natural language questions without the GUI")
+    parser.add_argument("questions", help="JSONL (id, question), CSV (id, question) or text file with one question per line")
+    parser.add_argument("--config", default=CONFIG_FILE, help="configuration file (default: %(default)s)")
+    parser.add_argument("--output", default="batch_results", help="output directory (default: %(default)s)")
+    parser.add_argument("--workers", type=int, help="questions answered in parallel (default: batch.workers or 4)")
+    parser.add_argument("--format", choices=("csv", "parquet"), default="csv", help="result file format")
+    parser.add_argument("--summary", action="store_true", help="also generate a text summary for each result")
+    args = parser.parse_args(argv)
+
+    db_config, openai_api_key, settings = read_config(args.config)
+    workers = args.workers or settings.get("batch", {}).get("workers", 4)
+    try:
+        questions = read_questions(args.questions)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    if not questions:
+        print("No questions found in " + args.questions, file=sys.stderr)
+        return 1
+
+    # Give every worker its own pooled connection
+    pool_settings = settings.setdefault("connection_pool", {})
+    pool_settings["size"] = max(pool_settings.get("size", 5), workers)
+
+    pipeline = NL2SQLPipeline(db_config, openai_api_key, settings)
+    start = time.perf_counter()
+    try:
+        records = run_batch(pipeline, questions, args.output, workers, args.format, args.summary)
+    except KeyboardInterrupt:
+        print("Cancelled", file=sys.stderr)
+        return 130
+    finally:
+        pipeline.close()
+    print_stats(records, time.perf_counter() - start)
+    return 0 if not any(record["error"] for record in records) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,476 @@
+import argparse
+import collections
+import contextlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+from nl2sql_pipeline import NL2SQLPipeline, read_config, CONFIG_FILE
+from nl2sql_schema import SchemaCatalog
+from nl2sql_llm import LLMClient
+from nl2sql_validator import tokenize_sql
+from nl2sql_batch import percentile
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+GOLD_FILE = os.path.join(BENCH_DIR, "nl2sql_bench_gold.jsonl")
+
+# Database name -> bundled setup script
+FIXTURES = {
+    "nl2sql_test": "mysql_setup.sql",
+    "nl2sql_test2": "nl2sql_test2.sql"
+}
+
+STAGES = ("schema", "llm", "validate", "preflight", "execute", "render", "total")
+
+# MySQL string escapes (the fixtures use \' inside single-quoted values)
+MYSQL_ESCAPES = {"0": "\0", "b": "\b", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a"}
+
+
+def unquote_mysql(value):
+    """Text of a MySQL string literal, resolving backslash escapes and doubled quotes"""
+    quote = value[0]
+    body = value[1:-1].replace(quote + quote, quote)
+    return re.sub(r"\\(.)", lambda m: MYSQL_ESCAPES.get(m.group(1), m.group(1)), body, flags=re.DOTALL)
+
+
+def translate_mysql_script(script):
+    """Translate a MySQL setup script into SQLite statements
+
+    Keeps CREATE TABLE, CREATE INDEX, DROP TABLE and INSERT; database, user, grant,
+    ALTER and view statements have no SQLite counterpart here and are skipped.
+    """
+    statements = []
+    current = []
+    for token in tokenize_sql(script) + [("punct", ";", len(script))]:
+        if token[1] != ";":
+            current.append(token)
+            continue
+        words = [value.upper() for kind, value, position in current[:3] if kind == "word"]
+        keep = (words[:2] in (["CREATE", "TABLE"], ["CREATE", "INDEX"], ["DROP", "TABLE"])
+                or words[:1] == ["INSERT"])
+        if current and keep:
+            statements.append(translate_statement(current))
+        current = []
+    return statements
+
+
+def translate_statement(tokens):
+    """Rebuild one tokenized MySQL statement as SQLite text"""
+    parts = []
+    index = 0
+    while index < len(tokens):
+        kind, value, position = tokens[index]
+        word = value.upper() if kind == "word" else None
+        if kind == "string":
+            parts.append("'" + unquote_mysql(value).replace("'", "''") + "'")
+        elif word == "AUTO_INCREMENT":
+            # Only INTEGER PRIMARY KEY columns are filled in automatically by SQLite
+            if parts and parts[-1].upper() == "INT":
+                parts[-1] = "INTEGER"
+        elif word == "ENUM":
+            # The allowed values are not carried over; the column becomes plain text
+            parts.append("TEXT")
+            depth = 0
+            while index + 1 < len(tokens):
+                index += 1
+                if tokens[index][1] == "(":
+                    depth += 1
+                elif tokens[index][1] == ")":
+                    depth -= 1
+                    if depth == 0:
+                        break
+        else:
+            parts.append(value)
+        index += 1
+    return " ".join(parts)
+
+
+def load_fixture(database, directory):
+    """Create a SQLite copy of a bundled fixture database and return its path"""
+    with open(os.path.join(BENCH_DIR, FIXTURES[database]), "r", encoding="utf-8") as f:
+        script = f.read()
+    path = os.path.join(directory, f"{database}.sqlite")
+    conn = sqlite3.connect(path)
+    try:
+        for statement in translate_mysql_script(script):
+            conn.execute(statement)
+        conn.commit()
+    finally:
+        conn.close()
+    return path
+
+
+class SQLitePool:
+    """Stand-in for ConnectionPool over one SQLite file (the benchmark runs one question at a time)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = None
+
+    @contextlib.contextmanager
+    def connection(self, timeout=None):
+        """Context manager that lends the shared connection"""
+        with self.lock:
+            if self.conn is None:
+                self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            yield self.conn
+
+    def close(self):
+        """Close the shared connection"""
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+class SQLiteCatalog(SchemaCatalog):
+    """Schema catalog that reads table definitions from sqlite_master instead of information_schema"""
+
+    def refresh(self, force=False):
+        """Reload every table's columns and foreign keys"""
+        tables = {}
+        foreign_keys = {}
+        with self.connection() as conn:
+            names = [row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+            for name in names:
+                quoted = name.replace('"', '""')
+                tables[name] = [(row[1], row[2]) for row in conn.execute(f'PRAGMA table_info("{quoted}")')]
+                # foreign_key_list rows: id, seq, table, from, to, ...
+                fks = [(row[3], row[2], row[4]) for row in conn.execute(f'PRAGMA foreign_key_list("{quoted}")')]
+                if fks:
+                    foreign_keys[name] = fks
+
+        modified = tables != self.tables or foreign_keys != self.foreign_keys
+        self.tables = tables
+        self.foreign_keys = foreign_keys
+        self.last_checked = time.monotonic()
+        if modified:
+            self.rebuild()
+
+
+class ReplayLLM(LLMClient):
+    """Deterministic LLM stand-in that answers with recorded responses keyed by question
+
+    Repair requests get the failed statement back unchanged, which ends the repair loop.
+    """
+
+    def __init__(self, responses, model="replay", delay=0.0):
+        # No HTTP client: only the usage accounting of LLMClient is reused
+        self.model = model
+        self.responses = responses
+        # Seconds added to every call to stand in for model latency
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.usage = collections.deque(maxlen=500)
+        self.totals = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "retries": 0}
+
+    def complete(self, messages, purpose="", stream=False, on_token=None, stop_when=None,
+                 timeout=None, **kwargs):
+        """Return the recorded response for the question in the prompt; returns (text, usage record)"""
+        start = time.perf_counter()
+        prompt = messages[-1]["content"]
+        if purpose == "repair":
+            match = re.search(r"FAILED SQL:\s*(.*?)\s*PROBLEM:", prompt, re.DOTALL)
+            text = match.group(1) if match else ""
+        else:
+            match = re.search(r"^\s*USER QUERY:\s*(.*)$", prompt, re.MULTILINE)
+            text = self.responses.get(match.group(1).strip(), "") if match else ""
+        if self.delay:
+            time.sleep(self.delay)
+        if stream and on_token is not None and text:
+            on_token(text)
+        # Token counts are estimated from the text, as for servers that do not report usage
+        return text, self.record(purpose, messages, text, None, start, None, 0)
+
+    def close(self):
+        """Nothing to release"""
+        pass
+
+
+class BenchPipeline(NL2SQLPipeline):
+    """Pipeline that times each stage, optionally against a SQLite fixture and a given LLM client"""
+
+    def __init__(self, db_config, openai_api_key, settings=None, sqlite_path=None, llm_client=None):
+        super().__init__(db_config, openai_api_key, settings)
+        self.sqlite_path = sqlite_path
+        # None means the real client from the llm settings
+        self.llm_client = llm_client
+        self.timings = {}
+        self.generated_sql = None
+
+    def timed(self, name, func, *args, **kwargs):
+        """Run func and add its duration to the stage timings"""
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def get_connection_pool(self):
+        """Return the SQLite stand-in when benchmarking a fixture copy"""
+        if self.sqlite_path is None:
+            return super().get_connection_pool()
+        with self.lock:
+            if self.connection_pool is None:
+                self.connection_pool = SQLitePool(self.sqlite_path)
+            return self.connection_pool
+
+    def get_schema_catalog(self):
+        """Return a catalog that understands SQLite when benchmarking a fixture copy"""
+        if self.sqlite_path is None:
+            return super().get_schema_catalog()
+        pool = self.get_connection_pool()
+        with self.lock:
+            if self.schema_catalog is None:
+                self.schema_catalog = SQLiteCatalog(
+                    self.db_config,
+                    pool.connection,
+                    cache_dir=os.path.dirname(self.sqlite_path)
+                )
+            return self.schema_catalog
+
+    def get_prompt_schema(self, natural_language_query):
+        return self.timed("schema", super().get_prompt_schema, natural_language_query)
+
+    def nl_to_sql(self, natural_language_query, on_token=None, schema_info=None):
+        self.generated_sql = super().nl_to_sql(natural_language_query, on_token, schema_info)
+        return self.generated_sql
+
+    def check_sql(self, sql_query):
+        return self.timed("validate", super().check_sql, sql_query)
+
+    def preflight(self, sql_query):
+        return self.timed("preflight", super().preflight, sql_query)
+
+    def execute_sql(self, sql_query, on_chunk=None):
+        return self.timed("execute", super().execute_sql, sql_query, on_chunk)
+
+
+def render_rows(df, rows=25, sample_size=200):
+    """Do the formatting work the results grid does for one screen of rows"""
+    sample = df.head(sample_size)
+    for position in range(len(df.columns)):
+        values = sample.iloc[:, position]
+        if len(values):
+            int(values.astype(str).str.len().max())
+    window = df.iloc[:rows]
+    cells = window.astype(object).where(window.notna(), "")
+    for position in range(window.shape[1]):
+        column = window.iloc[:, position]
+        if pd.api.types.is_datetime64_any_dtype(column):
+            cells.isetitem(position, column.astype(str).where(column.notna(), ""))
+    return list(cells.itertuples(index=False, name=None))
+
+
+def normalize_value(value):
+    """Comparable form of a result cell: numbers rounded, everything else as text"""
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    try:
+        return round(float(value), 2)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def result_rows(df, ordered=False):
+    """Rows of a result as tuples of normalized values, sorted unless the order matters"""
+    rows = [tuple(normalize_value(value) for value in row) for row in df.itertuples(index=False, name=None)]
+    if not ordered:
+        rows.sort(key=repr)
+    return rows
+
+
+def read_gold(path):
+    """Read the gold questions (database, question, sql, optional recorded response)"""
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                items.append(json.loads(line))
+    return items
+
+
+def bench_settings(settings, sqlite):
+    """Settings for a benchmark run: caches off so every question pays for every stage
+
+    The few-shot history is off too, so earlier questions cannot hand later ones their answers,
+    and so is the schema profiler, so that prompts do not change while it works through the tables.
+    """
+    settings = json.loads(json.dumps(settings))
+    settings["sql_cache"] = {"enabled": False}
+    settings["result_cache"] = {"enabled": False}
+    settings["few_shot"] = {"enabled": False}
+    settings["schema_profile"] = {"enabled": False}
+    if sqlite:
+        # EXPLAIN FORMAT=JSON and the streaming cursor are MySQL-only
+        settings["cost_guard"] = {"enabled": False}
+        settings.setdefault("query_limits", {})["streaming"] = False
+    return settings
+
+
+def run_question(pipeline, item):
+    """Answer one gold question and compare its result with the gold SQL's"""
+    client = pipeline.get_llm_client()
+    requests_before = client.totals["requests"]
+    pipeline.timings = {}
+    pipeline.generated_sql = None
+
+    result = pipeline.answer(item["question"])
+    timings = {stage: seconds for stage, seconds in pipeline.timings.items()}
+    timings["total"] = result["timings"]["total"]
+
+    # Usage records added while answering this question
+    calls = client.totals["requests"] - requests_before
+    usage = list(client.usage)[-calls:] if calls else []
+    timings["llm"] = sum(entry["latency"] for entry in usage)
+
+    record = {
+        "id": item.get("id"),
+        "database": item["database"],
+        "question": item["question"],
+        "sql": result["sql"],
+        "generated_sql": pipeline.generated_sql,
+        "error": result["error"],
+        "correct": False,
+        "repairs": len(result["repairs"]),
+        "prompt_tokens": sum(entry["prompt_tokens"] for entry in usage),
+        "completion_tokens": sum(entry["completion_tokens"] for entry in usage),
+        "timings": timings
+    }
+    if result["df"] is None:
+        return record
+
+    pipeline.timed("render", render_rows, result["df"])
+    timings["render"] = pipeline.timings["render"]
+    timings["total"] += timings["render"]
+    try:
+        with pipeline.get_connection_pool().connection() as conn:
+            expected = pd.read_sql_query(item["sql"], conn)
+    except Exception as e:
+        record["error"] = f"Failed to run gold SQL: {str(e)}"
+        return record
+    ordered = item.get("ordered", False)
+    record["correct"] = result_rows(result["df"], ordered) == result_rows(expected, ordered)
+    return record
+
+
+def run_bench(items, db_config, openai_api_key, settings, live=False, mysql=False):
+    """Run every gold question, one database at a time; returns the per-question records"""
+    records = []
+    with tempfile.TemporaryDirectory(prefix="nl2sql_bench_") as directory:
+        for database in sorted({item["database"] for item in items}):
+            questions = [item for item in items if item["database"] == database]
+            llm_client = None
+            if not live:
+                llm_client = ReplayLLM({item["question"]: item["response"] for item in questions if "response" in item})
+            config = dict(db_config, database=database)
+            sqlite_path = None if mysql else load_fixture(database, directory)
+            pipeline = BenchPipeline(config, openai_api_key, bench_settings(settings, not mysql),
+                                     sqlite_path=sqlite_path, llm_client=llm_client)
+            try:
+                for item in questions:
+                    if not live and "response" not in item:
+                        # Replaying the gold SQL as the answer would only score the gold SQL against itself
+                        records.append({"id": item.get("id"), "database": item["database"],
+                                        "question": item["question"], "skipped": True})
+                        print(f"[{len(records)}/{len(items)}] {item.get('id')}: skipped (no recorded response)",
+                              file=sys.stderr)
+                        continue
+                    record = run_question(pipeline, item)
+                    records.append(record)
+                    status = "error: " + record["error"] if record["error"] else (
+                        "ok" if record["correct"] else "wrong result")
+                    print(f"[{len(records)}/{len(items)}] {record['id']}: {status}", file=sys.stderr)
+            finally:
+                pipeline.close()
+    return records
+
+
+def report(records):
+    """Accuracy, per-stage latency percentiles and token use for a finished run
+
+    Questions skipped for want of a recorded response are counted apart and left out of every figure.
+    """
+    skipped = sum(1 for record in records if record.get("skipped"))
+    records = [record for record in records if not record.get("skipped")]
+    correct = sum(1 for record in records if record["correct"])
+    tokens = [record["prompt_tokens"] + record["completion_tokens"] for record in records]
+    stages = {}
+    for stage in STAGES:
+        values = [record["timings"][stage] for record in records if stage in record["timings"]]
+        if values:
+            stages[stage] = {"p50": percentile(values, 0.5), "p95": percentile(values, 0.95)}
+    return {
+        "questions": len(records),
+        "skipped": skipped,
+        "correct": correct,
+        "errors": sum(1 for record in records if record["error"]),
+        "accuracy": correct / len(records) if records else 0.0,
+        "stages": stages,
+        "tokens_per_question": sum(tokens) / len(tokens) if tokens else 0.0,
+        "tokens_p95": percentile(tokens, 0.95)
+    }
+
+
+def print_report(summary):
+    """Print the benchmark summary"""
+    print(f"Execution accuracy: {summary['correct']}/{summary['questions']} ({summary['accuracy']:.1%}), "
+          f"{summary['errors']} errors")
+    if summary["skipped"]:
+        print(f"Skipped: {summary['skipped']} questions without a recorded response (record them with --live --record)")
+    print(f"Tokens per question: {summary['tokens_per_question']:.0f} mean, {summary['tokens_p95']:.0f} p95")
+    for stage, figures in summary["stages"].items():
+        print(f"  {stage}: p50 {figures['p50'] * 1000:.2f}ms, p95 {figures['p95'] * 1000:.2f}ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure accuracy and latency of the pipeline on the bundled sample databases")
+    parser.add_argument("--gold", default=GOLD_FILE, help="gold questions (default: %(default)s)")
+    parser.add_argument("--config", default=CONFIG_FILE, help="configuration file (default: %(default)s)")
+    parser.add_argument("--live", action="store_true", help="ask the configured model instead of replaying recorded responses")
+    parser.add_argument("--mysql", action="store_true",
+                        help="run against the fixture databases on the configured MySQL server instead of SQLite copies")
+    parser.add_argument("--database", action="append", help="only benchmark this fixture database (repeatable)")
+    parser.add_argument("--report", help="write the summary and per-question records to this JSON file")
+    parser.add_argument("--record", help="write the gold file with the live model's responses recorded for replay")
+    parser.add_argument("--min-accuracy", type=float, default=0.0, help="exit with status 2 below this accuracy (0-1)")
+    args = parser.parse_args(argv)
+
+    db_config, openai_api_key, settings = read_config(args.config)
+    items = read_gold(args.gold)
+    if args.database:
+        items = [item for item in items if item["database"] in args.database]
+    if not items:
+        print("No gold questions found in " + args.gold, file=sys.stderr)
+        return 1
+
+    records = run_bench(items, db_config, openai_api_key, settings, live=args.live, mysql=args.mysql)
+    summary = report(records)
+    print_report(summary)
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "records": records}, f, indent=2, default=str)
+    if args.record:
+        generated = {(record["database"], record["question"]): record.get("generated_sql") for record in records}
+        with open(args.record, "w", encoding="utf-8") as f:
+            for item in items:
+                response = generated.get((item["database"], item["question"]))
+                if response is not None:
+                    item = dict(item, response=response)
+                f.write(json.dumps(item) + "\n")
+    return 0 if summary["accuracy"] >= args.min_accuracy else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,323 @@
+import collections
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from nl2sql_validator import canonical_sql
+
+# pyarrow is optional: without it results are cached as DataFrames and never spilled to disk
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+
+def normalize_question(question):
+    """Canonical form of a question so trivial rewording variants share a cache entry"""
+    text = unicodedata.normalize("NFKC", question).lower()
+    text = text.replace("’", "'").replace("‘", "'")
+    # Drop punctuation that does not change meaning, keep quotes, digits and operators
+    text = re.sub(r"[?!.,;:]+(\s|$)", r"\1", text)
+    return " ".join(text.split())
+
+
+class QuestionCache:
+    """LRU + TTL cache of generated SQL keyed by question, schema fingerprint and model"""
+
+    def __init__(self, max_entries=500, ttl=86400, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # key -> (sql, created)
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.db = None
+        if path:
+            self.open_store(path)
+
+    def open_store(self, path):
+        """Open (or create) the SQLite file that keeps entries across restarts"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS sql_cache ("
+            "key TEXT PRIMARY KEY, question TEXT, sql TEXT, created REAL, last_used REAL)"
+        )
+        self.db.execute("DELETE FROM sql_cache WHERE created < ?", (time.time() - self.ttl,))
+        self.db.commit()
+
+    def make_key(self, question, fingerprint, model):
+        """Cache key for a question against a particular schema and model"""
+        raw = "\x1f".join([normalize_question(question), fingerprint or "", model or ""])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, question, fingerprint, model):
+        """Return the cached SQL for a question, or None"""
+        key = self.make_key(question, fingerprint, model)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None and self.db is not None:
+                row = self.db.execute("SELECT sql, created FROM sql_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    entry = (row[0], row[1])
+                    self.remember(key, entry)
+
+            if entry is not None and now - entry[1] > self.ttl:
+                self.forget(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            if self.db is not None:
+                self.db.execute("UPDATE sql_cache SET last_used = ? WHERE key = ?", (now, key))
+                self.db.commit()
+            self.hits += 1
+            return entry[0]
+
+    def put(self, question, fingerprint, model, sql):
+        """Store generated SQL for a question"""
+        key = self.make_key(question, fingerprint, model)
+        now = time.time()
+        with self.lock:
+            self.remember(key, (sql, now))
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO sql_cache (key, question, sql, created, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, question, sql, now, now)
+                )
+                # Keep the file bounded by dropping the least recently used rows
+                self.db.execute(
+                    "DELETE FROM sql_cache WHERE key NOT IN "
+                    "(SELECT key FROM sql_cache ORDER BY last_used DESC LIMIT ?)",
+                    (self.max_entries,)
+                )
+                self.db.commit()
+
+    def discard(self, question, fingerprint, model):
+        """Remove an entry, e.g. when its SQL failed to run"""
+        with self.lock:
+            self.forget(self.make_key(question, fingerprint, model))
+
+    def remember(self, key, entry):
+        """Insert into the in-memory LRU, evicting the oldest entry when full"""
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def forget(self, key):
+        """Drop a key from memory and disk"""
+        self.entries.pop(key, None)
+        if self.db is not None:
+            self.db.execute("DELETE FROM sql_cache WHERE key = ?", (key,))
+            self.db.commit()
+
+    def stats_text(self):
+        """Short hit/miss summary for the status area"""
+        return f"SQL cache: {self.hits} hits / {self.misses} misses"
+
+    def close(self):
+        """Close the SQLite store"""
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+
+def format_bytes(size):
+    """Human-readable byte count"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024.0
+
+
+class ResultCache:
+    """Memory-bounded LRU of query results keyed by canonical SQL, invalidated per referenced table
+
+    Results are held as compressed Arrow IPC buffers when pyarrow is available; entries evicted
+    from memory can spill to Parquet files in spill_dir.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, ttl=300, spill_dir=None,
+                 max_disk_bytes=1024 * 1024 * 1024, max_entry_fraction=0.25):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_disk_bytes = max_disk_bytes
+        # A single result may not take more than this share of the memory budget
+        self.max_entry_bytes = int(max_bytes * max_entry_fraction)
+        self.lock = threading.Lock()
+        # key -> entry dict; "data" in memory, "path" on disk
+        self.entries = collections.OrderedDict()
+        self.spilled = collections.OrderedDict()
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        # Bytes that did not have to come from MySQL thanks to hits
+        self.bytes_saved = 0
+
+        self.compression = None
+        if pa is not None and pa.Codec.is_available("zstd"):
+            self.compression = "zstd"
+
+        self.spill_dir = spill_dir if pa is not None else None
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            # Spilled files are only indexed in memory, so earlier ones are unreachable
+            for name in os.listdir(self.spill_dir):
+                if name.startswith("result_") and name.endswith(".parquet"):
+                    os.remove(os.path.join(self.spill_dir, name))
+
+    def make_key(self, sql, database):
+        """Cache key for a statement against a particular database"""
+        raw = "\x1f".join([database or "", canonical_sql(sql)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, sql, database, versions=None):
+        """Return the cached DataFrame for a statement, or None
+
+        versions, if given, is called with the entry's tables and returns their current versions;
+        any difference from the versions stored with the entry invalidates it.
+        """
+        key = self.make_key(sql, database)
+        with self.lock:
+            entry = self.entries.get(key) or self.spilled.get(key)
+            if entry is not None and time.time() - entry["created"] > self.ttl:
+                self.forget(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+
+        # Checking the tables needs a database round trip; keep it outside the lock
+        if versions is not None and entry["tables"]:
+            current = versions(entry["tables"])
+            if any(current.get(table) != version for table, version in entry["versions"].items()):
+                with self.lock:
+                    self.forget(key)
+                    self.misses += 1
+                return None
+
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                df = self.load(entry)
+            elif key in self.spilled:
+                df = self.load(entry)
+                # Bring a spilled result back into memory
+                self.forget(key)
+                promoted = {name: value for name, value in entry.items() if name != "path"}
+                promoted.update(self.serialize(df))
+                self.remember(key, promoted)
+            else:
+                # Evicted while the versions were checked
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.bytes_saved += entry["source_bytes"]
+
+        df.attrs["truncated"] = entry["truncated"]
+        return df
+
+    def put(self, sql, database, df, tables, versions, source_bytes=0, truncated=False):
+        """Store a result with the versions its tables had before the query ran"""
+        try:
+            stored = self.serialize(df)
+        except Exception:
+            # Columns Arrow cannot represent (mixed Python objects); just don't cache them
+            return
+        if stored["size"] > self.max_entry_bytes:
+            return
+
+        entry = dict(stored, tables=sorted(tables), versions=dict(versions), created=time.time(),
+                     source_bytes=int(source_bytes or stored["size"]), truncated=truncated)
+        key = self.make_key(sql, database)
+        with self.lock:
+            self.forget(key)
+            self.remember(key, entry)
+
+    def serialize(self, df):
+        """Compact in-memory form of a DataFrame: {"data", "size"}"""
+        if pa is None:
+            return {"data": df.copy(), "size": int(df.memory_usage(deep=True).sum())}
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        options = pa.ipc.IpcWriteOptions(compression=self.compression)
+        with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+        buffer = sink.getvalue()
+        return {"data": buffer, "size": buffer.size}
+
+    def load(self, entry):
+        """DataFrame for a memory or disk entry"""
+        if "path" in entry:
+            return pq.read_table(entry["path"]).to_pandas()
+        if pa is None:
+            return entry["data"].copy()
+        return pa.ipc.open_stream(entry["data"]).read_all().to_pandas()
+
+    def remember(self, key, entry):
+        """Insert into memory, evicting (or spilling) the least recently used entries over budget"""
+        self.entries[key] = entry
+        self.memory_bytes += entry["size"]
+        while self.memory_bytes > self.max_bytes and len(self.entries) > 1:
+            old_key, old_entry = self.entries.popitem(last=False)
+            self.memory_bytes -= old_entry["size"]
+            if self.spill_dir:
+                self.spill(old_key, old_entry)
+
+    def spill(self, key, entry):
+        """Write an evicted entry to a Parquet file, keeping the disk within its budget"""
+        path = os.path.join(self.spill_dir, f"result_{key}.parquet")
+        table = pa.ipc.open_stream(entry["data"]).read_all()
+        pq.write_table(table, path, compression=self.compression or "snappy")
+        size = os.path.getsize(path)
+        spilled = {name: value for name, value in entry.items() if name != "data"}
+        spilled.update(path=path, size=size)
+        self.spilled[key] = spilled
+        self.disk_bytes += size
+        while self.disk_bytes > self.max_disk_bytes and self.spilled:
+            old_key, old_entry = self.spilled.popitem(last=False)
+            self.disk_bytes -= old_entry["size"]
+            self.remove_file(old_entry["path"])
+
+    def forget(self, key):
+        """Drop a key from memory and disk"""
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.memory_bytes -= entry["size"]
+        entry = self.spilled.pop(key, None)
+        if entry is not None:
+            self.disk_bytes -= entry["size"]
+            self.remove_file(entry["path"])
+
+    def remove_file(self, path):
+        """Delete a spilled file, ignoring one that is already gone"""
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats_text(self):
+        """Short hit/miss summary for the status area"""
+        return f"Result cache: {self.hits} hits / {self.misses} misses, {format_bytes(self.bytes_saved)} saved"
+
+    def close(self):
+        """Drop all entries and spilled files"""
+        with self.lock:
+            for key in list(self.entries) + list(self.spilled):
+                self.forget(key)
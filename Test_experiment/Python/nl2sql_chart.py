@@ -0,0 +1,480 @@
+import numpy as np
+import pandas as pd
+
+from nl2sql_insights import is_id_column, is_text_column, infer_kind, convert_column
+from nl2sql_validator import quote_identifier
+
+
+# Rows inspected, evenly spaced over the result, when profiling its columns
+PROFILE_SAMPLE_SIZE = 1000
+
+# Bars drawn at most; more categories are summed and the largest kept
+BAR_LIMIT = 30
+
+# Second category columns with at most this many values are stacked inside the bars
+STACK_LIMIT = 8
+
+# Measures plotted at most in one chart
+MAX_SERIES = 3
+
+# Histograms never use more bins than this
+MAX_BINS = 100
+
+# Line charts show markers only when the points are few enough to tell apart
+MARKER_LIMIT = 100
+
+# (category, stack) groups fetched at most for a stacked chart aggregated in MySQL
+PUSHDOWN_GROUP_LIMIT = 10000
+
+# Per-bucket aggregate of line charts computed in MySQL
+AGGREGATES = {"avg": "AVG", "sum": "SUM", "min": "MIN", "max": "MAX"}
+
+
+def lttb_indices(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: indices of threshold points that keep the visual shape of (x, y)"""
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # threshold - 2 buckets between the fixed first and last points
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    indices = np.empty(threshold, dtype=int)
+    indices[0] = 0
+    indices[-1] = n - 1
+    selected = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        # The point of this bucket forming the largest triangle with the previous pick and the next bucket's mean
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        areas = np.abs((x[selected] - next_x) * (y[start:end] - y[selected])
+                       - (x[selected] - x[start:end]) * (next_y - y[selected]))
+        selected = start + int(np.argmax(areas))
+        indices[bucket + 1] = selected
+    return indices
+
+
+def minmax_indices(y, threshold):
+    """Indices of the minimum and maximum of each of threshold / 2 equal buckets, in order"""
+    n = len(y)
+    if threshold >= n or threshold < 2:
+        return np.arange(n)
+    size = -(-n // (threshold // 2))
+    buckets = -(-n // size)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    rows = padded.reshape(buckets, size)
+    missing = np.isnan(rows)
+    offsets = np.arange(buckets) * size
+    lows = offsets + np.argmin(np.where(missing, np.inf, rows), axis=1)
+    highs = offsets + np.argmax(np.where(missing, -np.inf, rows), axis=1)
+    return np.unique(np.concatenate([[0, n - 1], lows, highs]))
+
+
+def downsample(x, y, max_points, method="lttb"):
+    """Indices of at most about max_points points of a series (all of them when it is short)"""
+    if not max_points or len(y) <= max_points:
+        return np.arange(len(y))
+    if method == "minmax":
+        return minmax_indices(y, max_points)
+    return lttb_indices(x, y, max_points)
+
+
+def profile_columns(df):
+    """Profile every column on an evenly spaced sample of rows
+
+    Each profile holds the column's position and name, its kind ("datetime", "numeric", "key" or
+    "category"), the conversion its text values need, the number of distinct values in the sample,
+    whether the sample is all distinct and whether it is sorted.
+    """
+    step = max(1, len(df) // PROFILE_SAMPLE_SIZE)
+    sample = df.iloc[::step]
+    profiles = []
+    for position, name in enumerate(df.columns):
+        column = sample.iloc[:, position]
+        conversion = None
+        if is_text_column(column):
+            # MySQL DECIMAL, DATE and DATETIME values arrive as Python objects or strings
+            conversion = infer_kind(column)
+            column = convert_column(column, conversion)
+        values = column.dropna()
+
+        if pd.api.types.is_datetime64_any_dtype(column):
+            kind = "datetime"
+        elif pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column):
+            kind = "key" if is_id_column(name) else "numeric"
+        else:
+            kind = "category"
+        try:
+            distinct = int(values.nunique())
+        except TypeError:
+            # Unhashable values (e.g. JSON documents) are never grouped on
+            distinct = len(values)
+        profiles.append({
+            "position": position,
+            "name": str(name),
+            "kind": kind,
+            "conversion": conversion,
+            "distinct": distinct,
+            "unique": distinct == len(values),
+            "monotonic": kind != "category" and len(values) > 1
+                         and (values.is_monotonic_increasing or values.is_monotonic_decreasing)
+        })
+    return profiles
+
+
+def choose_chart(profiles):
+    """Pick a chart kind and the profiles of the columns it plots
+
+    Dates with measures make a time series; a category with measures makes bars (stacked by a
+    second, small category); two measures make a line when the first is sorted and a scatter plot
+    otherwise; a single measure makes a histogram and a lone category a bar chart of its counts.
+    """
+    dates = [p for p in profiles if p["kind"] == "datetime"]
+    measures = [p for p in profiles if p["kind"] == "numeric"]
+    categories = [p for p in profiles if p["kind"] == "category" and p["distinct"] > 0]
+    keys = [p for p in profiles if p["kind"] == "key" and p["monotonic"]]
+
+    if not measures:
+        if categories:
+            return {"kind": "count", "x": categories[0]}
+        return None
+    if dates:
+        return {"kind": "timeseries", "x": dates[0], "y": measures[:MAX_SERIES]}
+    if categories:
+        x = categories[0]
+        stacks = [p for p in categories[1:] if 1 < p["distinct"] <= STACK_LIMIT]
+        if stacks and not x["unique"]:
+            return {"kind": "stacked", "x": x, "stack": stacks[0], "y": measures[:1]}
+        return {"kind": "bar", "x": x, "y": measures[:MAX_SERIES]}
+    if len(measures) > 1:
+        x = measures[0]
+        if x["monotonic"]:
+            return {"kind": "line", "x": x, "y": measures[1:MAX_SERIES + 1]}
+        return {"kind": "scatter", "x": x, "y": measures[1:2]}
+    if keys:
+        return {"kind": "line", "x": keys[0], "y": measures}
+    return {"kind": "histogram", "y": measures}
+
+
+def numeric_values(column):
+    """A converted column as floats (datetimes as nanoseconds), with NaN for missing values"""
+    if pd.api.types.is_datetime64_any_dtype(column):
+        values = column.to_numpy(dtype="datetime64[ns]")
+        numbers = values.astype("int64").astype(float)
+        numbers[np.isnat(values)] = np.nan
+        return numbers
+    return column.to_numpy(dtype=float, na_value=np.nan)
+
+
+def bincount_sums(codes, size, values):
+    """Sum of values per group code (0 to size - 1); missing codes and values are skipped"""
+    mask = (codes >= 0) & ~np.isnan(values)
+    return np.bincount(codes[mask], weights=values[mask], minlength=size)
+
+
+def line_chart(kind, x_label, x, ys, max_points, method):
+    """Lines against a numeric or date axis, each reduced to about max_points points"""
+    x_numeric = numeric_values(x)
+    x_values = x.to_numpy(dtype="datetime64[ns]") if kind == "timeseries" else x_numeric
+    # Results without ORDER BY are sorted on the x axis first
+    order = None
+    if not pd.Series(x_numeric).dropna().is_monotonic_increasing:
+        order = np.argsort(x_numeric, kind="stable")
+        x_numeric, x_values = x_numeric[order], x_values[order]
+
+    series = []
+    for name, column in ys:
+        y = numeric_values(column)
+        if order is not None:
+            y = y[order]
+        positions = np.flatnonzero(~np.isnan(y) & ~np.isnan(x_numeric))
+        indices = positions[downsample(x_numeric[positions], y[positions], max_points, method)]
+        series.append({"name": name, "x": x_values[indices], "y": y[indices]})
+    points = max(len(item["y"]) for item in series)
+    spec = {"kind": kind, "x_label": x_label, "series": series, "points": points}
+    if points < len(x):
+        spec["note"] = f"{points:,} of {len(x):,} points shown"
+    return spec
+
+
+def scatter_chart(x_label, x, y_label, y, max_points):
+    """Scatter plot of two measures, thinned to an even random sample of max_points points"""
+    x = numeric_values(x)
+    y = numeric_values(y)
+    positions = np.flatnonzero(~np.isnan(x) & ~np.isnan(y))
+    total = len(positions)
+    if max_points and total > max_points:
+        # Fixed seed so the same result always looks the same
+        positions = np.sort(np.random.default_rng(0).choice(positions, max_points, replace=False))
+    spec = {
+        "kind": "scatter",
+        "x_label": x_label,
+        "series": [{"name": y_label, "x": x[positions], "y": y[positions]}],
+        "points": len(positions)
+    }
+    if len(positions) < total:
+        spec["note"] = f"{len(positions):,} of {total:,} points shown"
+    return spec
+
+
+def bar_chart(x_label, labels, ys):
+    """Bars per category; repeated or too many categories are summed and the largest BAR_LIMIT kept"""
+    if len(labels) <= BAR_LIMIT and labels.is_unique:
+        # Typically a GROUP BY result: keep the rows in the order the SQL returned them
+        return {
+            "kind": "bar",
+            "x_label": x_label,
+            "categories": [str(label) for label in labels],
+            "series": [{"name": name, "y": numeric_values(column)} for name, column in ys]
+        }
+
+    codes, uniques = pd.factorize(labels)
+    sums = [bincount_sums(codes, len(uniques), numeric_values(column)) for _, column in ys]
+    order = np.argsort(-sums[0], kind="stable")[:BAR_LIMIT]
+    suffix = "" if len(uniques) == len(labels) else " (sum)"
+    spec = {
+        "kind": "bar",
+        "x_label": x_label,
+        "categories": [str(uniques[index]) for index in order],
+        "series": [{"name": name + suffix, "y": values[order]} for (name, _), values in zip(ys, sums)]
+    }
+    if len(uniques) > BAR_LIMIT:
+        spec["note"] = f"top {BAR_LIMIT} of {len(uniques):,} {x_label} values"
+    return spec
+
+
+def stacked_chart(x_label, labels, stack_label, stacks, y_label, y):
+    """Bars per category split by a second category, summing the measure over repeated pairs"""
+    x_codes, x_uniques = pd.factorize(labels)
+    stack_codes, stack_uniques = pd.factorize(stacks)
+    width = len(stack_uniques)
+    # One combined code per (category, stack) pair
+    codes = np.where((x_codes >= 0) & (stack_codes >= 0), x_codes * width + stack_codes, -1)
+    sums = bincount_sums(codes, len(x_uniques) * width, numeric_values(y)).reshape(len(x_uniques), width)
+    order = np.arange(len(x_uniques))
+    if len(x_uniques) > BAR_LIMIT:
+        order = np.argsort(-sums.sum(axis=1), kind="stable")[:BAR_LIMIT]
+    spec = {
+        "kind": "stacked",
+        "x_label": x_label,
+        "y_label": y_label,
+        "legend_title": stack_label,
+        "categories": [str(x_uniques[index]) for index in order],
+        "series": [{"name": str(stack_uniques[index]), "y": sums[order, index]} for index in range(width)]
+    }
+    if len(x_uniques) > BAR_LIMIT:
+        spec["note"] = f"top {BAR_LIMIT} of {len(x_uniques):,} {x_label} values"
+    return spec
+
+
+def count_chart(x_label, labels):
+    """Bars of how often the most frequent values of a category occur"""
+    counts = labels.value_counts()
+    spec = {
+        "kind": "bar",
+        "x_label": x_label,
+        "y_label": "rows",
+        "categories": [str(label) for label in counts.index[:BAR_LIMIT]],
+        "series": [{"name": "rows", "y": counts.to_numpy(dtype=float)[:BAR_LIMIT]}]
+    }
+    if len(counts) > BAR_LIMIT:
+        spec["note"] = f"top {BAR_LIMIT} of {len(counts):,} {x_label} values"
+    return spec
+
+
+def histogram_chart(y_label, y):
+    """Distribution of one measure"""
+    values = numeric_values(y)
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return {"kind": None, "message": "No numeric values to visualize"}
+    edges = np.histogram_bin_edges(values, bins="auto")
+    if len(edges) > MAX_BINS + 1:
+        edges = np.histogram_bin_edges(values, bins=MAX_BINS)
+    counts, edges = np.histogram(values, bins=edges)
+    return {"kind": "histogram", "x_label": y_label, "y_label": "rows", "edges": edges, "counts": counts}
+
+
+def prepare_chart(df, max_points=1000, method="lttb"):
+    """Work out what to plot for a result set from its column profiles; safe to run off the UI thread
+
+    Returns a plain dict for draw_chart: kind ("bar", "stacked", "line", "timeseries", "scatter",
+    "histogram" or None with a message), axis labels, the data to draw and an optional note for
+    the title when rows were summed, sampled or downsampled.
+    """
+    # Check if we have data and it's suitable for visualization
+    if df.empty:
+        return {"kind": None, "message": "No data available for visualization"}
+
+    choice = choose_chart(profile_columns(df))
+    if choice is None:
+        return {"kind": None, "message": "No numeric columns to visualize"}
+
+    # Only the plotted columns are converted, using what the profile found in the sample
+    def column(profile):
+        return convert_column(df.iloc[:, profile["position"]], profile["conversion"])
+
+    kind = choice["kind"]
+    if kind == "count":
+        return count_chart(choice["x"]["name"], column(choice["x"]))
+    if kind == "histogram":
+        return histogram_chart(choice["y"][0]["name"], column(choice["y"][0]))
+    ys = [(profile["name"], column(profile)) for profile in choice["y"]]
+    if kind == "scatter":
+        return scatter_chart(choice["x"]["name"], column(choice["x"]), ys[0][0], ys[0][1], max_points)
+    if kind == "stacked":
+        return stacked_chart(choice["x"]["name"], column(choice["x"]),
+                             choice["stack"]["name"], column(choice["stack"]), ys[0][0], ys[0][1])
+    if kind == "bar":
+        return bar_chart(choice["x"]["name"], column(choice["x"]), ys)
+    return line_chart(kind, choice["x"]["name"], column(choice["x"]), ys, max_points, method)
+
+
+def sql_number(value):
+    """A bucket bound as a SQL literal (parenthesised, so that a minus sign never forms a comment)"""
+    return f"({float(value)!r})"
+
+
+def pushdown_chart(sql_query, df, run_query, max_points=1000, aggregate="avg"):
+    """Compute the chart in MySQL by wrapping the result's SQL in aggregating queries
+
+    The chart type is chosen from a profile of df as in prepare_chart; run_query(sql) runs one
+    wrapper query and returns a DataFrame. Lines are averaged (or summed, ...) per bucket, bars and
+    stacked bars summed per category and histograms counted per bin, so only a few hundred rows come
+    back. Returns a spec for draw_chart, or None for charts that cannot be aggregated (scatter plots).
+    """
+    choice = choose_chart(profile_columns(df))
+    if choice is None or choice["kind"] == "scatter":
+        return None
+
+    sql_query = sql_query.strip()
+    if sql_query.endswith(";"):
+        sql_query = sql_query[:-1].rstrip()
+    source = f"({sql_query}) AS nl2sql_result"
+    kind = choice["kind"]
+
+    if kind in ("count", "bar"):
+        x_name = choice["x"]["name"]
+        x = quote_identifier(x_name)
+        if kind == "count":
+            columns = [("rows", "COUNT(*)")]
+        else:
+            columns = [(f"{p['name']} (sum)", f"SUM({quote_identifier(p['name'])})") for p in choice["y"]]
+        # One row more than is drawn tells whether there were more categories
+        result = run_query(f"SELECT {x}, {', '.join(expression for _, expression in columns)} FROM {source} "
+                           f"GROUP BY {x} ORDER BY {columns[0][1]} DESC LIMIT {BAR_LIMIT + 1}")
+        more = len(result) > BAR_LIMIT
+        result = result.head(BAR_LIMIT)
+        spec = bar_chart(x_name, result.iloc[:, 0],
+                         [(name, convert_column(result.iloc[:, index + 1], "numeric"))
+                          for index, (name, _) in enumerate(columns)])
+        if kind == "count":
+            spec["y_label"] = "rows"
+        verb = "counted" if kind == "count" else "summed"
+        spec["note"] = f"top {BAR_LIMIT} {x_name} values, {verb} in MySQL" if more else f"{verb} in MySQL"
+        return spec
+
+    if kind == "stacked":
+        x, stack, y = choice["x"]["name"], choice["stack"]["name"], choice["y"][0]["name"]
+        result = run_query(f"SELECT {quote_identifier(x)}, {quote_identifier(stack)}, SUM({quote_identifier(y)}) "
+                           f"FROM {source} GROUP BY {quote_identifier(x)}, {quote_identifier(stack)} "
+                           f"LIMIT {PUSHDOWN_GROUP_LIMIT}")
+        spec = stacked_chart(x, result.iloc[:, 0], stack, result.iloc[:, 1],
+                             y, convert_column(result.iloc[:, 2], "numeric"))
+        spec["note"] = (spec["note"] + ", " if "note" in spec else "") + "summed in MySQL"
+        return spec
+
+    if kind == "histogram":
+        y_name = choice["y"][0]["name"]
+        y = quote_identifier(y_name)
+        stats = run_query(f"SELECT MIN({y}), MAX({y}), COUNT({y}) FROM {source}")
+        low, high, rows = stats.iloc[0]
+        if not rows:
+            return {"kind": None, "message": "No numeric values to visualize"}
+        low, high = float(low), float(high)
+        bins = MAX_BINS if high > low else 1
+        width = (high - low) / bins or 1.0
+        result = run_query(f"SELECT LEAST(FLOOR(({y} - {sql_number(low)}) / {sql_number(width)}), {bins - 1}), "
+                           f"COUNT(*) FROM {source} WHERE {y} IS NOT NULL GROUP BY 1")
+        counts = np.zeros(bins, dtype=int)
+        counts[result.iloc[:, 0].to_numpy(dtype=int)] = result.iloc[:, 1].to_numpy(dtype=int)
+        return {
+            "kind": "histogram",
+            "x_label": y_name,
+            "y_label": "rows",
+            "edges": low + width * np.arange(bins + 1),
+            "counts": counts,
+            "note": f"{int(rows):,} rows binned in MySQL"
+        }
+
+    # Time series and lines: split the x range into max_points equal buckets
+    x_name = choice["x"]["name"]
+    x = quote_identifier(x_name)
+    position = f"UNIX_TIMESTAMP({x})" if kind == "timeseries" else x
+    stats = run_query(f"SELECT MIN({position}), MAX({position}), COUNT(*) FROM {source} WHERE {x} IS NOT NULL")
+    low, high, rows = stats.iloc[0]
+    if not rows:
+        return {"kind": None, "message": "No data available for visualization"}
+    low, high = float(low), float(high)
+    width = (high - low) / (max_points or 1000) or 1.0
+    bucket = f"FLOOR(({position} - {sql_number(low)}) / {sql_number(width)})"
+    function = AGGREGATES.get(aggregate, "AVG")
+    columns = ", ".join(f"{function}({quote_identifier(p['name'])})" for p in choice["y"])
+    result = run_query(f"SELECT MIN({x}), {columns} FROM {source} WHERE {x} IS NOT NULL "
+                       f"GROUP BY {bucket} ORDER BY {bucket}")
+    x_values = result.iloc[:, 0]
+    x_values = convert_column(x_values, "datetime" if kind == "timeseries" else "numeric")
+    ys = [(p["name"], convert_column(result.iloc[:, index + 1], "numeric")) for index, p in enumerate(choice["y"])]
+    spec = line_chart(kind, x_name, x_values, ys, 0, "lttb")
+    spec["note"] = f"{int(rows):,} rows as {len(result):,} points, {aggregate} per bucket in MySQL"
+    return spec
+
+
+def draw_chart(figure, spec):
+    """Draw a prepared chart on a matplotlib Figure, replacing what was there (UI thread)"""
+    figure.clear()
+    if spec["kind"] is None:
+        figure.text(0.5, 0.5, spec["message"], ha="center", va="center")
+        return
+
+    ax = figure.add_subplot(111)
+    kind = spec["kind"]
+    series = spec.get("series", [])
+    if kind in ("bar", "stacked"):
+        positions = np.arange(len(spec["categories"]))
+        if kind == "stacked":
+            bottom = np.zeros(len(positions))
+            for item in series:
+                ax.bar(positions, item["y"], 0.8, bottom=bottom, label=item["name"])
+                bottom += item["y"]
+        else:
+            width = 0.8 / len(series)
+            for index, item in enumerate(series):
+                ax.bar(positions + (index - (len(series) - 1) / 2) * width, item["y"], width, label=item["name"])
+        ax.set_xticks(positions)
+        ax.set_xticklabels(spec["categories"], rotation=45, ha="right")
+    elif kind == "histogram":
+        ax.stairs(spec["counts"], spec["edges"], fill=True)
+    elif kind == "scatter":
+        item = series[0]
+        ax.scatter(item["x"], item["y"], s=8, alpha=0.5)
+        spec = dict(spec, y_label=item["name"])
+    else:
+        marker = "o" if spec["points"] <= MARKER_LIMIT else None
+        for item in series:
+            ax.plot(item["x"], item["y"], marker=marker, label=item["name"])
+
+    if "y_label" in spec:
+        ax.set_ylabel(spec["y_label"])
+    elif len(series) == 1:
+        ax.set_ylabel(series[0]["name"])
+    if len(series) > 1:
+        ax.legend(title=spec.get("legend_title"))
+    ax.set_xlabel(spec["x_label"])
+    title = "Query Results Visualization"
+    if spec.get("note"):
+        title += f" ({spec['note']})"
+    ax.set_title(title)
+    figure.tight_layout()
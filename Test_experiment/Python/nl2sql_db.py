@@ -0,0 +1,314 @@
+import collections
+import contextlib
+import threading
+import time
+
+import mysql.connector
+from mysql.connector import FieldType
+import pandas as pd
+
+# pyarrow is optional: without it rows are converted by the connector and read with from_records
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+
+# Arrow types MySQL text-protocol values are parsed into; other columns stay text (or bytes)
+if pa is not None:
+    ARROW_TYPES = {
+        FieldType.TINY: pa.int64(),
+        FieldType.SHORT: pa.int64(),
+        FieldType.INT24: pa.int64(),
+        FieldType.LONG: pa.int64(),
+        FieldType.LONGLONG: pa.int64(),
+        FieldType.YEAR: pa.int64(),
+        FieldType.FLOAT: pa.float64(),
+        FieldType.DOUBLE: pa.float64(),
+        # Exact decimals become doubles, as coerce_types would make them anyway
+        FieldType.DECIMAL: pa.float64(),
+        FieldType.NEWDECIMAL: pa.float64(),
+        FieldType.DATE: pa.date32(),
+        FieldType.NEWDATE: pa.date32(),
+        FieldType.DATETIME: pa.timestamp("us"),
+        FieldType.TIMESTAMP: pa.timestamp("us")
+    }
+
+# Column types whose values are bytes rather than text when their character set is binary
+STRING_TYPES = {
+    FieldType.VARCHAR, FieldType.VAR_STRING, FieldType.STRING, FieldType.ENUM, FieldType.SET,
+    FieldType.TINY_BLOB, FieldType.MEDIUM_BLOB, FieldType.LONG_BLOB, FieldType.BLOB
+}
+
+# Character set number of binary strings (BINARY, VARBINARY, BLOB)
+BINARY_CHARSET = 63
+
+
+def decode_column(values, field):
+    """Parse one column of raw text-protocol values (bytes or None) into an Arrow array
+
+    Numbers, decimals and dates are parsed by Arrow's vectorised casts; a column that does not
+    parse (out-of-range integers, odd dates) is kept as text rather than failing the query.
+    """
+    type_code = field[1]
+    charset = field[8] if len(field) > 8 else None
+    if type_code in (FieldType.BIT, FieldType.GEOMETRY) or (type_code in STRING_TYPES and charset == BINARY_CHARSET):
+        return values
+    text = values.cast(pa.string())
+    target = ARROW_TYPES.get(type_code)
+    if target is None:
+        return text
+    if pa.types.is_date(target) or pa.types.is_timestamp(target):
+        # The connector reads MySQL's zero dates as NULL too
+        text = pc.if_else(pc.starts_with(text, "0000-00-00"), pa.scalar(None, pa.string()), text)
+    fallbacks = [target, pa.uint64(), pa.float64()] if pa.types.is_integer(target) else [target]
+    for arrow_type in fallbacks:
+        try:
+            return text.cast(arrow_type)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            continue
+    return text
+
+
+def decode_rows(rows, description):
+    """Build an Arrow record batch from rows fetched by a raw cursor, one vectorised parse per column"""
+    names = [str(field[0]) for field in description]
+    # Transposing through a struct array keeps the per-value work inside Arrow
+    struct_type = pa.struct([pa.field(f"c{position}", pa.binary()) for position in range(len(names))])
+    columns = pa.array(rows, type=struct_type).flatten()
+    arrays = [decode_column(values, field) for values, field in zip(columns, description)]
+    return pa.RecordBatch.from_arrays(arrays, names=names)
+
+
+def batch_to_frame(batch):
+    """DataFrame over an Arrow record batch; numeric columns without NULLs share Arrow's memory"""
+    return batch.to_pandas(
+        date_as_object=False,
+        # Text stays in Arrow buffers instead of becoming Python str objects
+        types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get
+    )
+
+
+class ConnectionPool:
+    """Bounded pool of health-checked MySQL connections shared by the whole application"""
+
+    def __init__(self, db_config, size=5, idle_timeout=300, acquire_timeout=30):
+        self.db_config = dict(db_config)
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(size)
+        # (connection, last used) pairs, most recently used on the right
+        self.idle = collections.deque()
+        self.closed = False
+
+    def new_connection(self):
+        """Open a fresh connection to the configured database"""
+        # Autocommit keeps pooled connections from reading a stale snapshot,
+        # consume_results discards rows a caller left unread
+        return mysql.connector.connect(autocommit=True, consume_results=True, **self.db_config)
+
+    def acquire(self, timeout=None):
+        """Take a live connection from the pool, opening one if none is idle"""
+        if timeout is None:
+            timeout = self.acquire_timeout
+        if self.closed:
+            raise Exception("Connection pool is closed")
+        if not self.slots.acquire(timeout=timeout):
+            raise Exception(f"Timed out after {timeout}s waiting for a database connection")
+
+        try:
+            while True:
+                with self.lock:
+                    conn, last_used = self.idle.pop() if self.idle else (None, None)
+
+                if conn is None:
+                    return self.new_connection()
+
+                if time.monotonic() - last_used > self.idle_timeout:
+                    self.discard(conn)
+                    continue
+
+                try:
+                    conn.ping(reconnect=True, attempts=1, delay=0)
+                    return conn
+                except mysql.connector.Error:
+                    self.discard(conn)
+        except Exception:
+            self.slots.release()
+            raise
+
+    def release(self, conn, broken=False):
+        """Return a connection to the pool"""
+        try:
+            if broken or self.closed or not conn.is_connected():
+                self.discard(conn)
+                return
+
+            now = time.monotonic()
+            expired = []
+            with self.lock:
+                self.idle.append((conn, now))
+                # Oldest connections sit on the left; drop any that idled too long
+                while self.idle and now - self.idle[0][1] > self.idle_timeout:
+                    expired.append(self.idle.popleft()[0])
+            for old in expired:
+                self.discard(old)
+        finally:
+            self.slots.release()
+
+    @contextlib.contextmanager
+    def connection(self, timeout=None):
+        """Context manager that borrows a connection and always gives it back"""
+        conn = self.acquire(timeout)
+        broken = False
+        try:
+            yield conn
+        except (mysql.connector.OperationalError, mysql.connector.InterfaceError):
+            # Lost or unusable connection; errors such as bad SQL leave it reusable
+            broken = True
+            raise
+        finally:
+            self.release(conn, broken)
+
+    def discard(self, conn):
+        """Close a connection without returning it to the pool"""
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """Close every idle connection; borrowed ones are closed when returned"""
+        with self.lock:
+            self.closed = True
+            idle = [conn for conn, _ in self.idle]
+            self.idle.clear()
+        for conn in idle:
+            self.discard(conn)
+
+
+class QueryCancelled(Exception):
+    """Raised when the user cancels a running query"""
+
+
+class StreamingQuery:
+    """One SELECT read through an unbuffered cursor in DataFrame chunks, with row and byte caps"""
+
+    def __init__(self, pool, sql_query, chunk_size=1000, max_rows=100000, max_bytes=256 * 1024 * 1024,
+                 columnar=True):
+        self.pool = pool
+        self.sql_query = sql_query
+        self.chunk_size = chunk_size
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        # Read raw values and parse them column by column in Arrow (needs pyarrow)
+        self.columnar = columnar and pa is not None
+        self.connection_id = None
+        self.cancelled = False
+        self.killed = False
+        self.finished = False
+        # Set when a cap stopped the fetch before the server ran out of rows
+        self.truncated = False
+        self.row_count = 0
+        self.byte_count = 0
+
+    def chunks(self, arrow=False):
+        """Yield DataFrames of at most chunk_size rows until the result or a cap is exhausted
+
+        With arrow=True a columnar query yields the Arrow record batches themselves.
+        """
+        conn = self.pool.acquire()
+        # Leftover rows on an unbuffered cursor would have to be drained before reuse
+        broken = True
+        try:
+            self.connection_id = conn.connection_id
+            cursor = conn.cursor(buffered=False, raw=self.columnar)
+            try:
+                cursor.execute(self.sql_query)
+                columns = [desc[0] for desc in cursor.description]
+
+                while not self.cancelled:
+                    rows = cursor.fetchmany(self.chunk_size)
+                    if not rows:
+                        broken = False
+                        if self.row_count == 0:
+                            # Keep the column names of an empty result
+                            yield pd.DataFrame(columns=columns)
+                        break
+
+                    # A cap of zero (or None) means no cap
+                    remaining = self.max_rows - self.row_count if self.max_rows else None
+                    at_cap = remaining is not None and len(rows) >= remaining
+                    if at_cap:
+                        # One more row tells a capped result from one that holds exactly max_rows rows
+                        self.truncated = len(rows) > remaining or bool(cursor.fetchmany(1))
+                        if not self.truncated:
+                            broken = False
+                        rows = rows[:remaining]
+
+                    if self.columnar and arrow:
+                        chunk = decode_rows(rows, cursor.description)
+                        self.byte_count += chunk.nbytes
+                    else:
+                        if self.columnar:
+                            chunk = batch_to_frame(decode_rows(rows, cursor.description))
+                        else:
+                            chunk = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+                        self.byte_count += int(chunk.memory_usage(deep=True).sum())
+                    self.row_count += len(chunk)
+                    if self.max_bytes and self.byte_count >= self.max_bytes:
+                        self.truncated = True
+
+                    yield chunk
+
+                    if self.truncated or at_cap:
+                        break
+            except mysql.connector.Error:
+                if self.cancelled:
+                    raise QueryCancelled("Query cancelled")
+                raise
+
+            if self.cancelled:
+                raise QueryCancelled("Query cancelled")
+        finally:
+            self.finished = True
+            if broken and self.connection_id is not None and not self.killed:
+                # Stop the server from producing rows nobody will read
+                self.kill()
+            self.pool.release(conn, broken)
+
+    def fetch_all(self, on_chunk=None):
+        """Collect every chunk into one DataFrame, passing each chunk to on_chunk as it arrives"""
+        frames = []
+        for chunk in self.chunks():
+            frames.append(chunk)
+            if on_chunk is not None:
+                on_chunk(chunk)
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    def cancel(self):
+        """Stop fetching and kill the statement on the server"""
+        self.cancelled = True
+        if self.connection_id is not None and not self.finished:
+            self.kill()
+
+    def kill(self):
+        """Issue KILL QUERY for this statement from a separate connection"""
+        self.killed = True
+        try:
+            # Not taken from the pool: every pooled slot may be busy, including ours
+            conn = self.pool.new_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(f"KILL QUERY {int(self.connection_id)}")
+                cursor.close()
+            finally:
+                conn.close()
+        except Exception:
+            # The statement may already have finished
+            pass
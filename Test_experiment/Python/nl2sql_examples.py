@@ -0,0 +1,177 @@
+import collections
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from nl2sql_cache import normalize_question
+from nl2sql_schema import tokenize, estimate_tokens
+from nl2sql_validator import referenced_tables
+
+
+class ExampleStore:
+    """History of questions whose SQL ran and returned rows, with a TF-IDF index to find similar ones
+
+    Examples are kept per database in a SQLite file so they survive restarts; the index lives in
+    memory and is updated as each example is added or dropped.
+    """
+
+    def __init__(self, database, path=None, max_examples=2000):
+        # host:port/database the examples were verified against
+        self.database = database
+        self.max_examples = max_examples
+        self.lock = threading.Lock()
+        # normalised question -> example dict, oldest first
+        self.examples = collections.OrderedDict()
+        # Inverted index: token -> keys of the examples whose question contains it
+        self.postings = collections.defaultdict(set)
+        self.db = None
+        if path:
+            self.open_store(path)
+
+    def open_store(self, path):
+        """Open (or create) the SQLite file and index the examples already in it"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS examples ("
+            "database TEXT, key TEXT, question TEXT, sql TEXT, tables TEXT, row_count INTEGER, created REAL, "
+            "PRIMARY KEY (database, key))"
+        )
+        self.db.commit()
+        rows = self.db.execute(
+            "SELECT key, question, sql, tables, row_count, created FROM examples "
+            "WHERE database = ? ORDER BY created DESC LIMIT ?",
+            (self.database, self.max_examples)
+        ).fetchall()
+        for key, question, sql, tables, row_count, created in reversed(rows):
+            self.index(key, {"question": question, "sql": sql, "tables": json.loads(tables),
+                             "row_count": row_count, "created": created})
+
+    def index(self, key, example):
+        """Add an example to the in-memory index, replacing any earlier one for the same question"""
+        self.unindex(key)
+        example["tokens"] = tokenize(example["question"])
+        self.examples[key] = example
+        for token in example["tokens"]:
+            self.postings[token].add(key)
+
+    def unindex(self, key):
+        """Remove an example from the in-memory index"""
+        example = self.examples.pop(key, None)
+        if example is None:
+            return
+        for token in example["tokens"]:
+            self.postings[token].discard(key)
+            if not self.postings[token]:
+                del self.postings[token]
+
+    def add(self, question, sql, row_count):
+        """Record a question whose SQL ran and returned rows"""
+        key = normalize_question(question)
+        example = {
+            "question": question,
+            "sql": sql.strip(),
+            "tables": sorted(referenced_tables(sql)),
+            "row_count": int(row_count),
+            "created": time.time()
+        }
+        with self.lock:
+            self.index(key, example)
+            while len(self.examples) > self.max_examples:
+                self.unindex(next(iter(self.examples)))
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO examples (database, key, question, sql, tables, row_count, created) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (self.database, key, question, example["sql"], json.dumps(example["tables"]),
+                     example["row_count"], example["created"])
+                )
+                # Keep the file bounded by dropping the oldest examples
+                self.db.execute(
+                    "DELETE FROM examples WHERE database = ? AND key NOT IN "
+                    "(SELECT key FROM examples WHERE database = ? ORDER BY created DESC LIMIT ?)",
+                    (self.database, self.database, self.max_examples)
+                )
+                self.db.commit()
+
+    def discard(self, question):
+        """Drop the example for a question, e.g. when its SQL stopped working"""
+        key = normalize_question(question)
+        with self.lock:
+            if key not in self.examples:
+                return
+            self.unindex(key)
+            if self.db is not None:
+                self.db.execute("DELETE FROM examples WHERE database = ? AND key = ?", (self.database, key))
+                self.db.commit()
+
+    def search(self, question, top_k=3, min_similarity=0.3, known_tables=None):
+        """Most similar examples as (cosine similarity, example) pairs, best first
+
+        Weights are computed at query time from the current document frequencies, so adding an
+        example never requires re-weighting the others. Examples that read tables missing from
+        known_tables (the schema's table names) are skipped.
+        """
+        words = tokenize(question)
+        if known_tables is not None:
+            known_tables = {name.lower() for name in known_tables}
+        with self.lock:
+            count = len(self.examples)
+            if not words or not count:
+                return []
+
+            def weight(token):
+                # Words no example contains count as rarest, lowering every similarity
+                return math.log(1 + count / max(len(self.postings.get(token, ())), 1))
+
+            query_weights = {word: weight(word) for word in words}
+            query_norm = math.sqrt(sum(value * value for value in query_weights.values()))
+            dots = collections.defaultdict(float)
+            for word, value in query_weights.items():
+                for key in self.postings.get(word, ()):
+                    dots[key] += value * value
+
+            matches = []
+            for key, dot in dots.items():
+                example = self.examples[key]
+                if known_tables is not None and not set(example["tables"]) <= known_tables:
+                    continue
+                norm = math.sqrt(sum(weight(token) ** 2 for token in example["tokens"]))
+                similarity = dot / (query_norm * norm)
+                if similarity >= min_similarity:
+                    matches.append((similarity, example))
+        matches.sort(key=lambda item: (-item[0], -item[1]["created"]))
+        return matches[:top_k]
+
+    def stats_text(self):
+        """Short size summary for the status area"""
+        return f"{len(self.examples)} in history"
+
+    def close(self):
+        """Close the SQLite store"""
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+
+def format_examples(matches, token_budget=600):
+    """Prompt text for retrieved examples, most similar first, within the token budget"""
+    lines = []
+    used_tokens = 0
+    for similarity, example in matches:
+        # One line per statement keeps the examples compact
+        sql = re.sub(r"\s*\n\s*", " ", example["sql"])
+        text = f"Question: {example['question']}\nSQL: {sql}\n"
+        cost = estimate_tokens(text)
+        if used_tokens + cost > token_budget:
+            break
+        lines.append(text)
+        used_tokens += cost
+    return "\n".join(lines)
@@ -0,0 +1,359 @@
+import argparse
+import datetime
+import decimal
+import gzip
+import os
+import sys
+import threading
+import time
+
+from nl2sql_pipeline import NL2SQLPipeline, read_config, CONFIG_FILE
+from nl2sql_db import StreamingQuery, QueryCancelled
+from nl2sql_guard import QueryRejected
+from nl2sql_cache import format_bytes
+
+# pyarrow is optional: without it CSV is written by pandas (gzip only) and Parquet is unavailable
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# XlsxWriter is optional: without it Excel export is unavailable
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+
+EXPORT_FORMATS = ("csv", "parquet", "xlsx")
+
+COMPRESSIONS = ("gzip", "zstd")
+
+# File name endings that ask for a compressed CSV
+COMPRESSED_EXTENSIONS = {".gz": "gzip", ".zst": "zstd"}
+
+# Values XlsxWriter writes as they are; anything else goes through excel_cell
+EXCEL_TYPES = (str, int, float, bool, type(None), decimal.Decimal, datetime.date, datetime.time, datetime.timedelta)
+
+# Data rows per Excel worksheet (the format's row limit less the header row); longer results continue on a new sheet
+XLSX_SHEET_ROWS = 1048575
+
+
+def export_target(path, file_format=None, compression=None):
+    """(format, compression) for an output file, taken from its extension unless given"""
+    base, extension = os.path.splitext(path.lower())
+    if extension in COMPRESSED_EXTENSIONS:
+        compression = compression or COMPRESSED_EXTENSIONS[extension]
+        base, extension = os.path.splitext(base)
+    file_format = file_format or extension.lstrip(".")
+    if file_format not in EXPORT_FORMATS:
+        raise Exception(f"Unsupported export format '{file_format}' (use {', '.join(EXPORT_FORMATS)})")
+    if compression not in (None, *COMPRESSIONS):
+        raise Exception(f"Unsupported compression '{compression}' (use {', '.join(COMPRESSIONS)})")
+    if file_format == "xlsx":
+        # XLSX files are zip archives already
+        compression = None
+    return file_format, compression
+
+
+def unique_names(names):
+    """Column names with duplicates (the same name selected twice) made unique"""
+    unique = []
+    for name in (str(name) for name in names):
+        candidate = name
+        suffix = 2
+        while candidate in unique:
+            candidate = f"{name}_{suffix}"
+            suffix += 1
+        unique.append(candidate)
+    return unique
+
+
+def arrow_batch(chunk, names):
+    """Arrow record batch for a chunk, which is either a record batch already or a DataFrame"""
+    if isinstance(chunk, pa.RecordBatch):
+        return pa.RecordBatch.from_arrays(chunk.columns, names=names)
+    chunk = chunk.set_axis(names, axis=1)
+    try:
+        return pa.RecordBatch.from_pandas(chunk, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Columns of mixed Python objects are written as text
+        chunk = chunk.copy()
+        for name in chunk.columns:
+            if chunk[name].dtype == object:
+                chunk[name] = chunk[name].map(lambda value: value if value is None else str(value))
+        return pa.RecordBatch.from_pandas(chunk, preserve_index=False)
+
+
+def excel_cell(value):
+    """A value XlsxWriter cannot write as it is, as text (bytes as hex)"""
+    if isinstance(value, (bytes, bytearray)):
+        return "0x" + bytes(value).hex()
+    if isinstance(value, (set, frozenset)):
+        # MySQL SET columns
+        return ",".join(sorted(value))
+    return str(value)
+
+
+class CsvWriter:
+    """CSV file written chunk by chunk, by Arrow when pyarrow is installed and by pandas otherwise"""
+
+    def __init__(self, path, compression=None):
+        self.header = True
+        if pa is not None:
+            self.sink = pa.CompressedOutputStream(path, compression) if compression else pa.OSFile(path, "wb")
+        elif compression == "gzip":
+            self.sink = gzip.open(path, "wt", encoding="utf-8", newline="")
+        elif compression:
+            raise Exception(f"{compression} compression needs pyarrow")
+        else:
+            self.sink = open(path, "w", encoding="utf-8", newline="")
+
+    def write(self, chunk, names):
+        """Append one chunk of rows, with the header before the first"""
+        if pa is not None:
+            options = pa_csv.WriteOptions(include_header=self.header)
+            pa_csv.write_csv(arrow_batch(chunk, names), self.sink, options)
+        else:
+            chunk.set_axis(names, axis=1).to_csv(self.sink, index=False, header=self.header)
+        self.header = False
+
+    def close(self):
+        """Flush and close the file"""
+        self.sink.close()
+
+
+class ParquetWriter:
+    """Parquet file written one row group per chunk"""
+
+    def __init__(self, path, compression=None):
+        if pa is None:
+            raise Exception("Parquet export needs pyarrow (pip install pyarrow)")
+        self.path = path
+        self.compression = compression
+        self.schema = None
+        self.writer = None
+
+    def write(self, chunk, names):
+        """Append one chunk of rows as a row group"""
+        batch = arrow_batch(chunk, names)
+        if self.writer is None:
+            # A column that is all NULL in the first chunk is written as text
+            self.schema = pa.schema([pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field
+                                     for field in batch.schema])
+            self.writer = pq.ParquetWriter(self.path, self.schema, compression=self.compression or "snappy")
+        if not batch.schema.equals(self.schema):
+            try:
+                batch = batch.cast(self.schema)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+                raise Exception(f"Column types changed part way through the result: {str(e)}")
+        self.writer.write_batch(batch)
+
+    def close(self):
+        """Write the footer and close the file"""
+        if self.writer is None:
+            # Nothing was written: still leave a valid, empty file
+            pq.write_table(pa.table({}), self.path)
+        else:
+            self.writer.close()
+
+
+class XlsxWriter:
+    """Excel workbook written row by row without keeping earlier rows in memory"""
+
+    def __init__(self, path, compression=None):
+        if xlsxwriter is None:
+            raise Exception("Excel export needs XlsxWriter (pip install xlsxwriter)")
+        # constant_memory flushes each row to a temporary file once the next one starts
+        self.workbook = xlsxwriter.Workbook(path, {
+            "constant_memory": True,
+            "remove_timezone": True,
+            "default_date_format": "yyyy-mm-dd hh:mm:ss"
+        })
+        self.sheet = None
+        self.row = 0
+        self.names = None
+
+    def new_sheet(self):
+        """Start a worksheet with the header row"""
+        self.sheet = self.workbook.add_worksheet()
+        self.sheet.write_row(0, 0, self.names)
+        self.row = 1
+
+    def write(self, chunk, names):
+        """Append one chunk of rows, continuing on a new worksheet when one is full"""
+        self.names = names
+        if self.sheet is None:
+            self.new_sheet()
+        if pa is not None and isinstance(chunk, pa.RecordBatch):
+            rows = zip(*(column.to_pylist() for column in chunk.columns))
+        else:
+            rows = chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None)
+        for values in rows:
+            if self.row > XLSX_SHEET_ROWS:
+                self.new_sheet()
+            values = [value if isinstance(value, EXCEL_TYPES) else excel_cell(value) for value in values]
+            self.sheet.write_row(self.row, 0, values)
+            self.row += 1
+
+    def close(self):
+        """Write the workbook's remaining parts and close it"""
+        if self.sheet is None:
+            self.workbook.add_worksheet()
+        self.workbook.close()
+
+
+WRITERS = {"csv": CsvWriter, "parquet": ParquetWriter, "xlsx": XlsxWriter}
+
+
+class ResultExport:
+    """One validated SELECT streamed from an unbuffered cursor into a CSV, Parquet or XLSX file
+
+    Rows are written in chunks of export.chunk_size as they arrive, so the whole result never sits in
+    memory. The file appears under its name only once it is complete.
+    """
+
+    def __init__(self, pipeline, sql_query, path, file_format=None, compression=None, on_progress=None):
+        self.pipeline = pipeline
+        self.settings = pipeline.settings.get("export", {})
+        self.sql_query = sql_query.strip().rstrip(";")
+        self.path = path
+        self.file_format, self.compression = export_target(
+            path, file_format, compression or self.settings.get("compression"))
+        # on_progress(rows, bytes written or None, seconds) after every chunk
+        self.on_progress = on_progress
+        self.query = None
+        self.cancelled = False
+        self.row_count = 0
+
+    def run(self):
+        """Validate the SQL and write its whole result; returns the number of rows written"""
+        # The cost guard's LIMIT and time limit are for interactive answers, not extracts
+        reasons = self.pipeline.check_sql(self.sql_query)
+        if reasons:
+            raise QueryRejected(reasons, "validator")
+
+        limits = self.pipeline.settings.get("query_limits", {})
+        self.query = StreamingQuery(
+            self.pipeline.get_connection_pool(),
+            self.sql_query,
+            chunk_size=self.settings.get("chunk_size", 50000),
+            # Zero: no row or memory cap, only one chunk is held at a time
+            max_rows=self.settings.get("max_rows", 0),
+            max_bytes=0,
+            columnar=limits.get("columnar", True)
+        )
+        if self.cancelled:
+            raise QueryCancelled("Export cancelled")
+
+        start = time.perf_counter()
+        partial = self.path + ".part"
+        writer = WRITERS[self.file_format](partial, self.compression)
+        try:
+            names = None
+            for chunk in self.query.chunks(arrow=True):
+                if names is None:
+                    names = unique_names(chunk.schema.names if pa is not None and isinstance(chunk, pa.RecordBatch)
+                                         else chunk.columns)
+                writer.write(chunk, names)
+                self.row_count += len(chunk)
+                if self.on_progress is not None:
+                    # XlsxWriter only creates the file when the workbook is closed
+                    size = os.path.getsize(partial) if os.path.exists(partial) else None
+                    self.on_progress(self.row_count, size, time.perf_counter() - start)
+            writer.close()
+            os.replace(partial, self.path)
+        except BaseException:
+            try:
+                writer.close()
+            except Exception:
+                pass
+            if os.path.exists(partial):
+                os.remove(partial)
+            if self.cancelled:
+                raise QueryCancelled("Export cancelled")
+            raise
+        return self.row_count
+
+    def cancel(self):
+        """Stop the export, killing its statement on the server; run() raises QueryCancelled"""
+        self.cancelled = True
+        if self.query is not None:
+            self.query.cancel()
+
+
+def progress_text(rows, size, seconds):
+    """One line about a running export; size is None while the file has not been created"""
+    rate = rows / seconds if seconds else 0
+    if size is None:
+        return f"{rows:,} rows written ({rate:,.0f} rows/s)"
+    return f"{rows:,} rows, {format_bytes(size)} written ({rate:,.0f} rows/s)"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the full result of a query to CSV, Parquet or XLSX")
+    parser.add_argument("output", help="file to write; .csv, .csv.gz, .csv.zst, .parquet or .xlsx")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--sql", help="SELECT statement to export")
+    source.add_argument("--sql-file", help="file holding the SELECT statement to export")
+    source.add_argument("--question", help="natural language question to turn into SQL and export")
+    parser.add_argument("--config", default=CONFIG_FILE, help="configuration file (default: %(default)s)")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, help="file format (default: from the file name)")
+    parser.add_argument("--compression", choices=COMPRESSIONS,
+                        help="compress a CSV file, or the pages of a Parquet file (default: export.compression)")
+    args = parser.parse_args(argv)
+
+    db_config, openai_api_key, settings = read_config(args.config)
+    pipeline = NL2SQLPipeline(db_config, openai_api_key, settings)
+    export = None
+    thread = None
+    try:
+        if args.question:
+            sql_query = pipeline.nl_to_sql(args.question, schema_info=pipeline.get_prompt_schema(args.question))
+            print(sql_query, file=sys.stderr)
+        elif args.sql_file:
+            with open(args.sql_file, "r", encoding="utf-8") as f:
+                sql_query = f.read()
+        else:
+            sql_query = args.sql
+
+        def show_progress(rows, size, seconds):
+            print("\r" + progress_text(rows, size, seconds), end="", file=sys.stderr, flush=True)
+
+        export = ResultExport(pipeline, sql_query, args.output, args.format, args.compression, show_progress)
+        # Run in a worker thread so Ctrl+C can cancel the statement while rows are streaming
+        outcome = {}
+
+        def worker():
+            try:
+                outcome["rows"] = export.run()
+            except BaseException as e:
+                outcome["error"] = e
+
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        while thread.is_alive():
+            thread.join(0.2)
+        print(file=sys.stderr)
+        if "error" in outcome:
+            raise outcome["error"]
+        print(f"Wrote {outcome['rows']:,} rows to {args.output}", file=sys.stderr)
+        return 0
+    except KeyboardInterrupt:
+        if export is not None:
+            export.cancel()
+        if thread is not None:
+            thread.join()
+        print("\nCancelled", file=sys.stderr)
+        return 130
+    except Exception as e:
+        print(f"Export failed: {str(e)}", file=sys.stderr)
+        return 1
+    finally:
+        pipeline.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+import tkinter as tk
+from tkinter import ttk, font
+
+import numpy as np
+import pandas as pd
+
+
+class VirtualTable(ttk.Frame):
+    """Treeview-based grid that only creates items for the rows currently on screen"""
+
+    def __init__(self, master, row_height=20, sample_size=200, max_column_width=400):
+        super().__init__(master)
+        self.row_height = row_height
+        self.sample_size = sample_size
+        self.max_column_width = max_column_width
+
+        style = ttk.Style(self)
+        style.configure("Virtual.Treeview", rowheight=row_height)
+
+        self.tree = ttk.Treeview(self, show="headings", style="Virtual.Treeview", selectmode="browse")
+        self.vscroll = ttk.Scrollbar(self, orient="vertical", command=self.on_scroll)
+        self.hscroll = ttk.Scrollbar(self, orient="horizontal", command=self.tree.xview)
+        self.tree.configure(xscrollcommand=self.hscroll.set)
+
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.vscroll.grid(row=0, column=1, sticky="ns")
+        self.hscroll.grid(row=1, column=0, sticky="ew")
+        self.rowconfigure(0, weight=1)
+        self.columnconfigure(0, weight=1)
+
+        self.tree.bind("<Configure>", lambda event: self.render())
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda event: self.scroll_by(-3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll_by(3))
+
+        self.df = pd.DataFrame()
+        self.headings = []
+        # Chunks appended while streaming, merged into df only when rows are needed
+        self.pending = []
+        self.row_count = 0
+        # Row positions in display order (None means natural order)
+        self.order = None
+        self.sort_column = None
+        self.sort_ascending = True
+        self.offset = 0
+        self.items = []
+
+    def set_data(self, df):
+        """Replace the grid contents with a DataFrame"""
+        self.df = df.reset_index(drop=True)
+        self.pending = []
+        self.row_count = len(self.df)
+        self.order = None
+        self.sort_column = None
+        self.offset = 0
+
+        # Positional column ids, since SQL results may repeat a column name
+        self.headings = [str(col) for col in self.df.columns]
+        columns = [f"c{position}" for position in range(len(self.headings))]
+        # Reconfiguring columns invalidates the existing items
+        self.tree.delete(*self.items)
+        self.items = []
+        self.tree["columns"] = columns
+        for position, (col, width) in enumerate(zip(columns, self.column_widths())):
+            self.tree.heading(col, text=self.headings[position], command=lambda p=position: self.sort_by(p))
+            self.tree.column(col, width=width, minwidth=40, stretch=False)
+
+        self.render()
+
+    def append(self, df):
+        """Add rows at the end, re-rendering only if they can be visible"""
+        if len(df) == 0:
+            return
+        self.pending.append(df)
+        self.row_count += len(df)
+        if self.order is not None:
+            # New rows arrive unsorted; keep them after the sorted block
+            self.order = np.concatenate([self.order, np.arange(self.row_count - len(df), self.row_count)])
+        if self.offset + self.visible_rows() > self.row_count - len(df):
+            self.render()
+        else:
+            self.update_scrollbar()
+
+    def clear(self):
+        """Remove all rows and columns"""
+        self.set_data(pd.DataFrame())
+
+    def data(self):
+        """The full DataFrame behind the grid, merging any streamed chunks"""
+        if self.pending:
+            self.df = pd.concat([self.df] + self.pending, ignore_index=True)
+            self.pending = []
+        return self.df
+
+    def column_widths(self):
+        """Pixel widths sized from the header and a sample of the values"""
+        char_width = font.nametofont("TkDefaultFont").measure("0")
+        sample = self.df.head(self.sample_size)
+        widths = []
+        for position, col in enumerate(self.df.columns):
+            values = sample.iloc[:, position]
+            longest = int(values.astype(str).str.len().max()) if len(values) else 0
+            chars = max(len(str(col)), longest)
+            widths.append(min(max(chars * char_width + 16, 60), self.max_column_width))
+        return widths
+
+    def visible_rows(self):
+        """Number of rows that fit in the current widget height (minus the heading)"""
+        height = self.tree.winfo_height()
+        if height <= 1:
+            # Not mapped yet; assume a typical viewport
+            return 25
+        return max(1, height // self.row_height - 1)
+
+    def render(self):
+        """Fill the on-screen items with the rows at the current offset"""
+        count = min(self.visible_rows(), self.row_count)
+        self.offset = max(0, min(self.offset, self.row_count - count))
+
+        # Grow or shrink the fixed set of items to the viewport size
+        while len(self.items) < count:
+            self.items.append(self.tree.insert("", tk.END, values=()))
+        if len(self.items) > count:
+            self.tree.delete(*self.items[count:])
+            del self.items[count:]
+
+        if count:
+            df = self.data()
+            if self.order is None:
+                window = df.iloc[self.offset:self.offset + count]
+            else:
+                window = df.iloc[self.order[self.offset:self.offset + count]]
+            # Blank out missing values instead of showing None/NaN
+            cells = window.astype(object).where(window.notna(), "")
+            for position in range(window.shape[1]):
+                column = window.iloc[:, position]
+                if pd.api.types.is_datetime64_any_dtype(column):
+                    # DATE columns arrive as datetimes; show them without a midnight time
+                    cells.isetitem(position, column.astype(str).where(column.notna(), ""))
+            window = cells
+            for item, values in zip(self.items, window.itertuples(index=False, name=None)):
+                self.tree.item(item, values=values)
+
+        self.update_scrollbar()
+
+    def update_scrollbar(self):
+        """Reflect the visible window in the vertical scrollbar"""
+        if self.row_count == 0:
+            self.vscroll.set(0, 1)
+            return
+        first = self.offset / self.row_count
+        last = min(1.0, (self.offset + self.visible_rows()) / self.row_count)
+        self.vscroll.set(first, last)
+
+    def on_scroll(self, action, amount, unit=None):
+        """Scrollbar callback ('moveto' fraction or 'scroll' units/pages)"""
+        if action == "moveto":
+            self.offset = int(float(amount) * self.row_count)
+            self.render()
+        elif action == "scroll":
+            step = self.visible_rows() if unit == "pages" else 1
+            self.scroll_by(int(amount) * step)
+
+    def on_mousewheel(self, event):
+        """Mouse wheel scrolling on Windows and macOS"""
+        self.scroll_by(-3 if event.delta > 0 else 3)
+
+    def scroll_by(self, rows):
+        """Move the viewport by a number of rows"""
+        self.offset += rows
+        self.render()
+
+    def sort_by(self, position):
+        """Sort the view by a column without touching the Treeview items"""
+        df = self.data()
+        ascending = not self.sort_ascending if self.sort_column == position else True
+        values = df.iloc[:, position]
+        try:
+            ordered = values.sort_values(ascending=ascending, kind="stable", na_position="last")
+        except TypeError:
+            # Mixed types in an object column; fall back to text order
+            ordered = values.astype(str).sort_values(ascending=ascending, kind="stable")
+        self.order = ordered.index.to_numpy()
+        self.sort_column = position
+        self.sort_ascending = ascending
+
+        for index, heading in enumerate(self.headings):
+            arrow = (" ▲" if ascending else " ▼") if index == position else ""
+            self.tree.heading(f"c{index}", text=heading + arrow)
+        self.offset = 0
+        self.render()
@@ -0,0 +1,175 @@
+import json
+
+from nl2sql_validator import tokenize_sql
+
+
+class QueryRejected(Exception):
+    """Raised when generated SQL is refused by the validator or the cost guard"""
+
+    def __init__(self, reasons, source="cost guard"):
+        super().__init__(f"Query rejected by the {source}: " + " ".join(item["message"] for item in reasons))
+        self.reasons = reasons
+
+
+class CostGuard:
+    """Pre-flight check of generated SQL: EXPLAIN-based budget, LIMIT injection and a server-side time limit"""
+
+    def __init__(self, max_rows=1000000, max_cost=1000000, full_scan_rows=100000, action="reject",
+                 default_limit=10000, max_limit=100000, max_execution_time=300):
+        # Zero disables a check
+        self.max_rows = max_rows
+        self.max_cost = max_cost
+        self.full_scan_rows = full_scan_rows
+        # "reject" stops over-budget queries, "warn" only reports them
+        self.action = action
+        self.default_limit = default_limit
+        self.max_limit = max_limit
+        # Seconds; applied as a MAX_EXECUTION_TIME optimizer hint
+        self.max_execution_time = max_execution_time
+
+    def explainable(self, sql):
+        """True for statements EXPLAIN accepts (SELECT and WITH, not SHOW), whatever comments precede them"""
+        try:
+            tokens = tokenize_sql(sql)
+        except ValueError:
+            return False
+        for kind, value, position in tokens:
+            if value != "(":
+                return kind == "word" and value.upper() in ("SELECT", "WITH")
+        return False
+
+    def rewrite(self, sql):
+        """Add or tighten the outer LIMIT and add a MAX_EXECUTION_TIME hint; returns (sql, notes)"""
+        notes = []
+        sql = sql.strip()
+        tokens = tokenize_sql(sql)
+        # Cut after the last real token: a trailing "-- ..." or "# ..." comment would swallow the
+        # appended LIMIT, and a final ';' would end the statement before it
+        while tokens and tokens[-1][1] == ";":
+            tokens.pop()
+        if tokens:
+            # Leading comments go too, so the statement is recognised and the hint lands in it
+            start = tokens[0][2]
+            kind, value, position = tokens[-1]
+            sql = sql[start:position + len(value)]
+            tokens = [(kind, value, position - start) for kind, value, position in tokens]
+        if not self.explainable(sql):
+            return sql, notes
+
+        # Find the outermost SELECT keyword, LIMIT clause and locking clause (parentheses depth 0)
+        depth = 0
+        select_end = None
+        limit_index = None
+        lock_start = None
+        for index, (kind, value, position) in enumerate(tokens):
+            following = tokens[index + 1][1].upper() if index + 1 < len(tokens) else ""
+            if value == "(":
+                depth += 1
+            elif value == ")":
+                depth -= 1
+            elif depth == 0 and kind == "word":
+                word = value.upper()
+                if word == "SELECT" and select_end is None:
+                    select_end = position + len(value)
+                elif word == "LIMIT":
+                    limit_index = index
+                elif lock_start is None and ((word == "FOR" and following in ("UPDATE", "SHARE"))
+                                             or (word == "LOCK" and following == "IN")):
+                    lock_start = position
+
+        # Edit from the end of the text backwards so earlier positions stay valid
+        if limit_index is None:
+            if self.default_limit:
+                # MySQL wants LIMIT before FOR UPDATE / FOR SHARE / LOCK IN SHARE MODE
+                if lock_start is None:
+                    sql = f"{sql} LIMIT {self.default_limit}"
+                else:
+                    sql = f"{sql[:lock_start].rstrip()} LIMIT {self.default_limit} {sql[lock_start:]}"
+                notes.append(f"LIMIT {self.default_limit} added")
+        elif self.max_limit:
+            # LIMIT count | LIMIT offset, count | LIMIT count OFFSET offset
+            count_index = limit_index + 1
+            if count_index + 1 < len(tokens) and tokens[count_index + 1][1] == ",":
+                count_index += 2
+            if count_index < len(tokens) and tokens[count_index][0] == "number":
+                kind, value, position = tokens[count_index]
+                if float(value) > self.max_limit:
+                    sql = sql[:position] + str(self.max_limit) + sql[position + len(value):]
+                    notes.append(f"LIMIT {value} lowered to {self.max_limit}")
+
+        if select_end is not None and self.max_execution_time and "MAX_EXECUTION_TIME" not in sql.upper():
+            milliseconds = int(self.max_execution_time * 1000)
+            sql = sql[:select_end] + f" /*+ MAX_EXECUTION_TIME({milliseconds}) */" + sql[select_end:]
+
+        return sql, notes
+
+    def explain(self, conn, sql):
+        """Run EXPLAIN FORMAT=JSON and return the plan summary"""
+        cursor = conn.cursor()
+        try:
+            cursor.execute("EXPLAIN FORMAT=JSON " + sql)
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+        document = row[0]
+        if isinstance(document, (bytes, bytearray)):
+            document = document.decode("utf-8")
+        return self.summarize_plan(json.loads(document))
+
+    def summarize_plan(self, plan):
+        """Estimated cost, largest row estimate and large full scans from an EXPLAIN JSON document"""
+        summary = {"cost": 0.0, "rows": 0, "full_scans": []}
+        block_costs = []
+        stack = [plan]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, list):
+                stack.extend(node)
+                continue
+            if not isinstance(node, dict):
+                continue
+
+            query_block = node.get("query_block")
+            if isinstance(query_block, dict) and "query_cost" in query_block.get("cost_info", {}):
+                block_costs.append(float(query_block["cost_info"]["query_cost"]))
+
+            if "table_name" in node and "access_type" in node:
+                examined = int(node.get("rows_examined_per_scan", 0) or 0)
+                # rows_produced_per_join already multiplies in the rows of earlier tables in the join
+                produced = int(node.get("rows_produced_per_join", examined) or 0)
+                summary["rows"] = max(summary["rows"], produced, examined)
+                if node["access_type"] == "ALL" and self.full_scan_rows and examined >= self.full_scan_rows:
+                    summary["full_scans"].append((node["table_name"], examined))
+
+            stack.extend(value for value in node.values() if isinstance(value, (dict, list)))
+
+        # The outermost block's cost covers the whole statement; UNIONs only report per-branch costs
+        top_block = plan.get("query_block", {})
+        if "query_cost" in top_block.get("cost_info", {}):
+            summary["cost"] = float(top_block["cost_info"]["query_cost"])
+        else:
+            summary["cost"] = sum(block_costs)
+        return summary
+
+    def check(self, summary):
+        """Reasons the plan is over budget, in the validator's reason format"""
+        reasons = []
+        if self.max_rows and summary["rows"] > self.max_rows:
+            reasons.append({
+                "code": "rows",
+                "message": f"The plan reads about {summary['rows']:,} rows (budget {self.max_rows:,}).",
+                "position": None
+            })
+        if self.max_cost and summary["cost"] > self.max_cost:
+            reasons.append({
+                "code": "cost",
+                "message": f"The estimated cost is {summary['cost']:,.0f} (budget {self.max_cost:,}).",
+                "position": None
+            })
+        for table, rows in summary["full_scans"]:
+            reasons.append({
+                "code": "full_scan",
+                "message": f"Full scan of {table} ({rows:,} rows).",
+                "position": None
+            })
+        return reasons
@@ -0,0 +1,271 @@
+import numpy as np
+import pandas as pd
+
+
+# Values checked when deciding what an object column really holds
+TYPE_SAMPLE_SIZE = 200
+
+ISO_DATE_PATTERN = r"^\d{4}-\d{2}(-\d{2})?([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?$"
+
+
+def format_number(value):
+    """Readable number: thousands separators, two decimals only for small fractional values"""
+    if pd.isna(value):
+        return "n/a"
+    value = float(value)
+    if abs(value) >= 1000 or value == int(value):
+        return f"{value:,.0f}"
+    return f"{value:,.2f}"
+
+
+def is_id_column(name):
+    """True for key columns whose values are labels rather than measures"""
+    name = str(name).lower()
+    return name == "id" or name.endswith("_id")
+
+
+def format_value(value):
+    """A single cell for a sentence"""
+    if isinstance(value, (int, float, np.number)) and not isinstance(value, (bool, np.bool_)):
+        return format_number(value)
+    return str(value)
+
+
+def is_text_column(column):
+    """True for columns that may hold numbers or dates as Python objects or strings"""
+    # Text columns are object or, from pandas 3 on, string dtype
+    return pd.api.types.is_object_dtype(column) or pd.api.types.is_string_dtype(column)
+
+
+def infer_kind(sample):
+    """What a sample of a text column really holds: "numeric", "datetime", "iso-date" or None"""
+    sample = sample.dropna()
+    if sample.empty:
+        return None
+    kind = pd.api.types.infer_dtype(sample, skipna=True)
+    if kind in ("decimal", "integer", "floating", "mixed-integer-float"):
+        return "numeric"
+    if kind in ("mixed", "mixed-integer"):
+        # e.g. Decimal values next to ints
+        return "numeric" if pd.to_numeric(sample, errors="coerce").notna().all() else None
+    if kind in ("date", "datetime", "datetime64"):
+        return "datetime"
+    if kind == "string" and sample.str.match(ISO_DATE_PATTERN).all():
+        return "iso-date"
+    return None
+
+
+def convert_column(column, kind):
+    """Convert a whole column to the kind infer_kind found in its sample (vectorised)"""
+    if kind == "numeric":
+        try:
+            # Several times faster than to_numeric for Decimal objects
+            return column.astype(float)
+        except (TypeError, ValueError):
+            return pd.to_numeric(column, errors="coerce")
+    if kind == "datetime":
+        return pd.to_datetime(column, errors="coerce")
+    if kind == "iso-date":
+        return pd.to_datetime(column, errors="coerce", format="mixed")
+    return column
+
+
+def coerce_types(df):
+    """Convert object columns that hold numbers (MySQL DECIMAL) or dates to numeric and datetime dtypes
+
+    Only a sample of each column is inspected; the conversion itself is vectorised.
+    """
+    converted = {}
+    for position in range(len(df.columns)):
+        column = df.iloc[:, position]
+        if not is_text_column(column):
+            continue
+        kind = infer_kind(column.dropna().head(TYPE_SAMPLE_SIZE))
+        if kind is not None:
+            converted[position] = convert_column(column, kind)
+    if not converted:
+        return df
+    df = df.copy()
+    for position, values in converted.items():
+        df.isetitem(position, values)
+    return df
+
+
+def pick_columns(df):
+    """Choose (label column, date column, measure columns) for the insights"""
+    label = None
+    date = None
+    measures = []
+    for name in df.columns:
+        column = df[name]
+        if pd.api.types.is_datetime64_any_dtype(column):
+            if date is None:
+                date = name
+        elif pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column):
+            if is_id_column(name):
+                continue
+            measures.append(name)
+        elif label is None and column.nunique(dropna=True) > 1:
+            label = name
+    return label, date, measures
+
+
+def group_sums(groups, values):
+    """Sum of values per group from (codes, labels) as made by pd.factorize; groups with no values are dropped"""
+    codes, labels = groups
+    values = values.to_numpy(dtype=float, na_value=np.nan)
+    mask = (codes >= 0) & ~np.isnan(values)
+    sums = np.bincount(codes[mask], weights=values[mask], minlength=len(labels))
+    present = np.bincount(codes[mask], minlength=len(labels)) > 0
+    return pd.Series(sums[present], index=np.asarray(labels)[present])
+
+
+def top_contributors(label, label_groups, df, measure, top_k):
+    """Largest label values by measure, with their share of the total when shares make sense"""
+    totals = group_sums(label_groups, df[measure])
+    if len(totals) < 2:
+        return None
+
+    top = totals.nlargest(top_k)
+    total = totals.sum()
+    if (totals >= 0).all() and total > 0:
+        parts = [f"{name} ({format_number(value)}, {value / total:.0%})" for name, value in top.items()]
+        share = top.sum() / total
+        text = f"By {measure}, the top {label} values are {', '.join(parts)}"
+        if len(totals) > len(top):
+            text += f"; together {share:.0%} of the total {format_number(total)}"
+        return text + "."
+    parts = [f"{name} ({format_number(value)})" for name, value in top.items()]
+    return f"By {measure}, the highest {label} values are {', '.join(parts)}."
+
+
+def period_groups(dates):
+    """Group a datetime column into years, months, weeks or days depending on its span
+
+    Returns ((codes, period starts), period name, strftime format), or None for fewer than two dates.
+    """
+    valid = dates.dropna()
+    if len(valid) < 2:
+        return None
+    span = valid.max() - valid.min()
+    if span >= pd.Timedelta(days=3 * 365):
+        unit, name, label_format = "Y", "year", "%Y"
+    elif span >= pd.Timedelta(days=60):
+        unit, name, label_format = "M", "month", "%Y-%m"
+    elif span >= pd.Timedelta(days=14):
+        unit, name, label_format = "W", "week", "week of %Y-%m-%d"
+    else:
+        unit, name, label_format = "D", "day", "%Y-%m-%d"
+    # Truncating datetime64 values in numpy is much faster than Series.dt.to_period
+    periods = dates.to_numpy(dtype="datetime64[ns]").astype(f"datetime64[{unit}]")
+    return pd.factorize(periods, sort=True), name, label_format
+
+
+def period_change(periods, measure, values):
+    """Latest period against the one before, summing the measure per period"""
+    groups, name, label_format = periods
+    totals = group_sums(groups, values)
+    if len(totals) < 2:
+        return None
+    (previous_period, previous), (last_period, last) = list(totals.iloc[-2:].items())
+    previous_label = pd.Timestamp(previous_period).strftime(label_format)
+    last_label = pd.Timestamp(last_period).strftime(label_format)
+    text = f"{measure} was {format_number(last)} in {last_label}"
+    if previous:
+        change = (last - previous) / abs(previous)
+        direction = "up" if change >= 0 else "down"
+        text += f", {direction} {abs(change):.1%} from {format_number(previous)} in {previous_label}"
+    else:
+        text += f" against {format_number(previous)} in {previous_label}"
+    return f"{text} (per {name}, {len(totals)} {name}s in the result)."
+
+
+def outliers(df, label, measure, z_threshold=3.0):
+    """Values beyond 1.5 IQR of the quartiles, reporting the most extreme one and its z-score"""
+    values = df[measure].dropna()
+    if len(values) < 8:
+        return None
+    q1, q3 = np.percentile(values.to_numpy(dtype=float), [25, 75])
+    iqr = q3 - q1
+    low, high = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+    outside = values[(values < low) | (values > high)]
+    std = values.std()
+    if outside.empty or not std:
+        return None
+
+    extreme_index = (outside - values.median()).abs().idxmax()
+    extreme = values[extreme_index]
+    z_score = (extreme - values.mean()) / std
+    where = f" ({df.at[extreme_index, label]})" if label is not None else ""
+    count = len(outside)
+    noun = "outlier" if count == 1 else "outliers"
+    if (outside > high).all():
+        bounds = f"above {format_number(high)}"
+    elif (outside < low).all():
+        bounds = f"below {format_number(low)}"
+    else:
+        bounds = f"outside {format_number(low)} to {format_number(high)}"
+    text = (f"{measure} has {count:,} {noun} {bounds}; "
+            f"the most extreme is {format_number(extreme)}{where}, z-score {z_score:.1f}")
+    strong = int((((values - values.mean()) / std).abs() > z_threshold).sum())
+    if strong:
+        text += f", with {strong:,} beyond {z_threshold:g} standard deviations"
+    return text + "."
+
+
+def null_rates(df, limit=3):
+    """Columns with missing values, worst first"""
+    rates = df.isna().mean()
+    rates = rates[rates > 0].sort_values(ascending=False)
+    if rates.empty:
+        return None
+    parts = [f"{name} {rate:.0%}" for name, rate in rates.head(limit).items()]
+    return "Missing values: " + ", ".join(parts) + "."
+
+
+def measure_totals(df, measure):
+    """Total, mean and range of one measure column"""
+    values = df[measure].dropna()
+    if values.empty:
+        return None
+    return (f"{measure}: total {format_number(values.sum())}, average {format_number(values.mean())}, "
+            f"range {format_number(values.min())} to {format_number(values.max())}.")
+
+
+def compute_insights(df, top_k=3, max_measures=3):
+    """Deterministic facts about a result set, as short sentences"""
+    if df.empty:
+        return ["The query returned no rows."]
+    df = coerce_types(df.reset_index(drop=True))
+    # Positional copies avoid ambiguity when SQL returns the same column name twice
+    df.columns = [str(name) for name in df.columns]
+    df = df.loc[:, ~df.columns.duplicated()]
+    label, date, measures = pick_columns(df)
+    measures = measures[:max_measures]
+
+    if len(df) == 1:
+        values = ", ".join(f"{name} = {format_value(value)}" for name, value in df.iloc[0].items())
+        return [f"The query returned one row: {values}."]
+
+    # Group codes are computed once and shared by every measure
+    label_groups = pd.factorize(df[label]) if label is not None else None
+    periods = period_groups(df[date]) if date is not None else None
+
+    facts = [f"{len(df):,} rows and {len(df.columns)} columns were returned."]
+    for measure in measures:
+        for fact in (
+            measure_totals(df, measure),
+            top_contributors(label, label_groups, df, measure, top_k) if label_groups is not None else None,
+            period_change(periods, measure, df[measure]) if periods is not None else None,
+            outliers(df, label, measure)
+        ):
+            if fact:
+                facts.append(fact)
+    if not measures and label is not None:
+        counts = df[label].value_counts().head(top_k)
+        parts = [f"{name} ({count})" for name, count in counts.items()]
+        facts.append(f"Most frequent {label} values: {', '.join(parts)}.")
+    nulls = null_rates(df)
+    if nulls:
+        facts.append(nulls)
+    return facts
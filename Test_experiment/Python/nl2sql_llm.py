@@ -0,0 +1,175 @@
+import collections
+import random
+import threading
+import time
+
+import openai
+
+
+class TokenBucket:
+    """Blocking token-bucket rate limiter (rate tokens per second, up to capacity in a burst)"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        """Wait until amount tokens are available and take them"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class LLMClient:
+    """Long-lived OpenAI-compatible client with retries, rate limiting and usage accounting"""
+
+    # Errors worth another attempt: throttling, server faults and network trouble
+    RETRYABLE = (
+        openai.RateLimitError,
+        openai.APIConnectionError,
+        openai.APITimeoutError,
+        openai.InternalServerError
+    )
+
+    def __init__(self, api_key, model="gpt-4o-mini", base_url=None, timeout=60, max_retries=3,
+                 backoff_base=0.5, backoff_max=8.0, requests_per_minute=0, stream_usage=True):
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stream_usage = stream_usage
+        # One client for the whole session keeps its HTTP connections alive between calls;
+        # retries are handled here so the SDK's own retry loop is turned off
+        self.client = openai.OpenAI(
+            api_key=api_key or "not-needed",
+            base_url=base_url or None,
+            timeout=timeout,
+            max_retries=0
+        )
+        self.limiter = None
+        if requests_per_minute:
+            self.limiter = TokenBucket(requests_per_minute / 60.0, max(1, requests_per_minute // 10))
+
+        self.lock = threading.Lock()
+        # Most recent per-request records and running totals
+        self.usage = collections.deque(maxlen=500)
+        self.totals = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "retries": 0}
+
+    def complete(self, messages, purpose="", stream=False, on_token=None, stop_when=None,
+                 timeout=None, **kwargs):
+        """Run a chat completion; returns (text, usage record)"""
+        # Latency covers rate-limit waits and retries, as the caller experiences it
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                self.limiter.acquire()
+            state = {"start": start, "first_token": None, "streamed": False}
+            try:
+                if stream:
+                    text, usage = self.stream(messages, state, on_token, stop_when, timeout, **kwargs)
+                else:
+                    response = self.client.chat.completions.create(
+                        model=self.model, messages=messages, timeout=timeout or self.timeout, **kwargs)
+                    text = response.choices[0].message.content or ""
+                    usage = response.usage
+                break
+            except self.RETRYABLE as e:
+                # A stream that already produced text cannot be replayed transparently
+                if attempt >= self.max_retries or state["streamed"]:
+                    raise
+                attempt += 1
+                time.sleep(self.backoff_delay(attempt, e))
+
+        return text, self.record(purpose, messages, text, usage, start, state["first_token"], attempt)
+
+    def stream(self, messages, state, on_token, stop_when, timeout, **kwargs):
+        """Stream a completion, passing each piece of text to on_token and stopping early if asked"""
+        if self.stream_usage:
+            kwargs.setdefault("stream_options", {"include_usage": True})
+        parts = []
+        usage = None
+        response = self.client.chat.completions.create(
+            model=self.model, messages=messages, stream=True, timeout=timeout or self.timeout, **kwargs)
+        try:
+            for event in response:
+                if getattr(event, "usage", None) is not None:
+                    usage = event.usage
+                if not event.choices:
+                    continue
+                delta = event.choices[0].delta.content
+                if not delta:
+                    continue
+                if state["first_token"] is None:
+                    state["first_token"] = time.perf_counter() - state["start"]
+                state["streamed"] = True
+                parts.append(delta)
+                if on_token is not None:
+                    on_token(delta)
+                if stop_when is not None and stop_when("".join(parts)):
+                    break
+        finally:
+            # Closing early drops the rest of the response (trailing prose after the SQL)
+            response.close()
+        return "".join(parts), usage
+
+    def backoff_delay(self, attempt, error):
+        """Full-jitter exponential backoff, honouring Retry-After when the server sends one"""
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        try:
+            if retry_after is not None:
+                return min(float(retry_after), self.backoff_max)
+        except ValueError:
+            pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def record(self, purpose, messages, text, usage, start, first_token, retries):
+        """Store a usage record for one request and add it to the totals"""
+        latency = time.perf_counter() - start
+        if usage is not None:
+            prompt_tokens, completion_tokens, estimated = usage.prompt_tokens, usage.completion_tokens, False
+        else:
+            # Servers that do not report usage (or streams cut short) get a character-based estimate
+            prompt_chars = sum(len(message["content"]) for message in messages)
+            prompt_tokens, completion_tokens, estimated = prompt_chars // 4, len(text) // 4, True
+
+        entry = {
+            "purpose": purpose,
+            "model": self.model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "estimated": estimated,
+            "latency": latency,
+            "first_token": first_token if first_token is not None else latency,
+            "retries": retries,
+            "time": time.time()
+        }
+        with self.lock:
+            self.usage.append(entry)
+            self.totals["requests"] += 1
+            self.totals["prompt_tokens"] += prompt_tokens
+            self.totals["completion_tokens"] += completion_tokens
+            self.totals["retries"] += retries
+        return entry
+
+    def usage_text(self):
+        """Short token summary for the status area"""
+        with self.lock:
+            return "Tokens: {} in / {} out ({} calls)".format(
+                self.totals["prompt_tokens"], self.totals["completion_tokens"], self.totals["requests"])
+
+    def close(self):
+        """Release the HTTP connection pool"""
+        self.client.close()
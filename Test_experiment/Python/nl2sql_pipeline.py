@@ -0,0 +1,842 @@
+import json
+import os
+import re
+import threading
+import time
+
+import pandas as pd
+
+from nl2sql_schema import SchemaCatalog
+from nl2sql_db import ConnectionPool, StreamingQuery, QueryCancelled
+from nl2sql_cache import QuestionCache, ResultCache
+from nl2sql_examples import ExampleStore, format_examples
+from nl2sql_profiler import SchemaProfiler
+from nl2sql_llm import LLMClient
+from nl2sql_validator import SQLValidator, referenced_tables, canonical_sql, tokenize_sql
+from nl2sql_guard import CostGuard, QueryRejected
+from nl2sql_insights import compute_insights
+from nl2sql_chart import prepare_chart, pushdown_chart
+
+
+CONFIG_FILE = "nl2sql_config.json"
+
+# MySQL errors a corrected statement can fix (unknown column/table/function, syntax, grouping, ...)
+REPAIRABLE_ERRORS = {
+    1052, 1054, 1055, 1056, 1060, 1064, 1066, 1111, 1140, 1146, 1221, 1235, 1242,
+    1247, 1248, 1305, 1582, 1583, 1630, 3065
+}
+
+
+def mysql_errno(error):
+    """MySQL error number behind an exception (following 'raise ... from'), or None"""
+    while error is not None:
+        errno = getattr(error, "errno", None)
+        if isinstance(errno, int) and errno > 0:
+            return errno
+        error = error.__cause__ or error.__context__
+    return None
+
+
+def same_statement(first, second):
+    """True when two statements differ only in comments, spacing and keyword case"""
+    try:
+        return canonical_sql(first) == canonical_sql(second)
+    except ValueError:
+        # Text the tokenizer cannot read (an unterminated quote) can only be compared as written
+        return first.strip() == second.strip()
+
+
+def read_config(path=CONFIG_FILE):
+    """Read (db_config, openai_api_key, settings) from the JSON config file"""
+    db_config = {
+        "host": "",
+        "port": "3306",
+        "user": "",
+        "password": "",
+        "database": ""
+    }
+    openai_api_key = os.getenv("OPENAI_API_KEY", "")
+    settings = {}
+
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            config_data = json.load(f)
+        db_config = config_data.get("database", db_config)
+        openai_api_key = config_data.get("openai_api_key", "") or openai_api_key
+        settings = {k: v for k, v in config_data.items() if k not in ("database", "openai_api_key")}
+
+    return db_config, openai_api_key, settings
+
+
+class NL2SQLPipeline:
+    """Question -> SQL -> results pipeline shared by the desktop app and the headless tools"""
+
+    def __init__(self, db_config, openai_api_key, settings=None, on_metric=None):
+        self.db_config = db_config
+        self.openai_api_key = openai_api_key
+        self.settings = settings or {}
+        # Called with (key, text) whenever a performance figure changes
+        self.on_metric = on_metric
+
+        # Shared resources, built lazily so that constructing a pipeline never touches the network
+        self.lock = threading.Lock()
+        self.connection_pool = None
+        self.schema_catalog = None
+        self.schema_profiler = None
+        self.replica_pool = None
+        self.question_cache = None
+        self.result_cache = None
+        self.example_store = None
+        self.llm_client = None
+        validator_settings = self.settings.get("sql_validator", {})
+        self.validator = SQLValidator(
+            extra_functions=validator_settings.get("extra_functions", []),
+            denied_functions=validator_settings.get("denied_functions", []),
+            check_tables=validator_settings.get("check_tables", True)
+        )
+        guard_settings = self.settings.get("cost_guard", {})
+        self.guard = None
+        if guard_settings.get("enabled", True):
+            self.guard = CostGuard(
+                max_rows=guard_settings.get("max_rows", 1000000),
+                max_cost=guard_settings.get("max_cost", 1000000),
+                full_scan_rows=guard_settings.get("full_scan_rows", 100000),
+                action=guard_settings.get("action", "reject"),
+                default_limit=guard_settings.get("default_limit", 10000),
+                max_limit=guard_settings.get("max_limit", 100000),
+                max_execution_time=guard_settings.get("max_execution_time", 300)
+            )
+
+        # Statements currently streaming from the database, for cancellation
+        self.active_queries = set()
+
+    def set_metric(self, key, text):
+        """Report a performance figure to whoever is listening"""
+        if self.on_metric is not None:
+            self.on_metric(key, text)
+
+    def get_connection_pool(self):
+        """Return the shared connection pool, creating it on first use"""
+        with self.lock:
+            if self.connection_pool is None:
+                pool_settings = self.settings.get("connection_pool", {})
+                self.connection_pool = ConnectionPool(
+                    self.db_config,
+                    size=pool_settings.get("size", 5),
+                    idle_timeout=pool_settings.get("idle_timeout", 300),
+                    acquire_timeout=pool_settings.get("acquire_timeout", 30)
+                )
+            return self.connection_pool
+
+    def get_schema_catalog(self):
+        """Return the schema catalog for the configured database, creating it on first use"""
+        pool = self.get_connection_pool()
+        with self.lock:
+            if self.schema_catalog is None:
+                cache_settings = self.settings.get("schema_cache", {})
+                profile_settings = self.settings.get("schema_profile", {})
+                self.schema_catalog = SchemaCatalog(
+                    self.db_config,
+                    pool.connection,
+                    cache_dir=cache_settings.get("directory", ".nl2sql_cache"),
+                    refresh_interval=cache_settings.get("refresh_interval", 60),
+                    profile_budget=profile_settings.get("token_budget", 400)
+                )
+                if profile_settings.get("enabled", True):
+                    self.start_profiler(pool, profile_settings)
+            return self.schema_catalog
+
+    def start_profiler(self, pool, profile_settings):
+        """Start sampling column statistics in the background, on a replica when one is configured"""
+        connection = pool.connection
+        replica = profile_settings.get("replica")
+        if replica:
+            # Only the keys that differ from the primary (usually host) need to be given
+            self.replica_pool = ConnectionPool(dict(self.db_config, **replica), size=1)
+            connection = self.replica_pool.connection
+        self.schema_profiler = SchemaProfiler(
+            self.schema_catalog,
+            connection,
+            self.db_config["database"],
+            interval=profile_settings.get("interval", 3600),
+            pause=profile_settings.get("pause", 1.0),
+            sample_rows=profile_settings.get("sample_rows", 10000),
+            max_values=profile_settings.get("max_values", 20),
+            max_execution_time=profile_settings.get("max_execution_time", 5)
+        )
+        self.schema_profiler.start()
+
+    def get_question_cache(self):
+        """Return the generated-SQL cache, or None when disabled in the settings"""
+        cache_settings = self.settings.get("sql_cache", {})
+        if not cache_settings.get("enabled", True):
+            return None
+        with self.lock:
+            if self.question_cache is None:
+                path = None
+                if cache_settings.get("persist", True):
+                    path = cache_settings.get("path", os.path.join(".nl2sql_cache", "sql_cache.sqlite"))
+                self.question_cache = QuestionCache(
+                    max_entries=cache_settings.get("max_entries", 500),
+                    ttl=cache_settings.get("ttl", 86400),
+                    path=path
+                )
+            return self.question_cache
+
+    def get_result_cache(self):
+        """Return the query result cache, or None when disabled in the settings"""
+        cache_settings = self.settings.get("result_cache", {})
+        if not cache_settings.get("enabled", True):
+            return None
+        with self.lock:
+            if self.result_cache is None:
+                spill_dir = None
+                if cache_settings.get("spill", True):
+                    spill_dir = cache_settings.get("directory", os.path.join(".nl2sql_cache", "results"))
+                self.result_cache = ResultCache(
+                    max_bytes=cache_settings.get("max_bytes", 256 * 1024 * 1024),
+                    ttl=cache_settings.get("ttl", 300),
+                    spill_dir=spill_dir,
+                    max_disk_bytes=cache_settings.get("max_disk_bytes", 1024 * 1024 * 1024)
+                )
+            return self.result_cache
+
+    def get_example_store(self):
+        """Return the history of verified question/SQL examples, or None when few-shot prompting is disabled"""
+        few_shot = self.settings.get("few_shot", {})
+        if not few_shot.get("enabled", True):
+            return None
+        with self.lock:
+            if self.example_store is None:
+                database = "{}:{}/{}".format(self.db_config.get("host", ""), self.db_config.get("port", ""),
+                                             self.db_config.get("database", ""))
+                self.example_store = ExampleStore(
+                    database,
+                    path=few_shot.get("path", os.path.join(".nl2sql_cache", "examples.sqlite")),
+                    max_examples=few_shot.get("max_examples", 2000)
+                )
+            return self.example_store
+
+    def query_tables(self, sql_query):
+        """Tables a statement reads, using the schema's own spelling of their names"""
+        known = self.schema_catalog.tables if self.schema_catalog is not None else {}
+        spelling = {name.lower(): name for name in known}
+        try:
+            tables = referenced_tables(sql_query, known or None)
+        except ValueError:
+            # Unreadable SQL (e.g. an unterminated quote) names no tables we can trust
+            return set()
+        return {spelling.get(name, name) for name in tables}
+
+    def table_versions(self, tables):
+        """UPDATE_TIME of each table (None where MySQL does not track it), used to invalidate cached results"""
+        versions = {table: None for table in tables}
+        if not tables:
+            return versions
+        database = self.db_config.get("database", "")
+        with self.get_connection_pool().connection() as conn:
+            cursor = conn.cursor()
+            try:
+                # MySQL 8 otherwise serves table statistics cached for up to a day
+                try:
+                    cursor.execute("SET SESSION information_schema_stats_expiry = 0")
+                except Exception:
+                    pass
+                placeholders = ", ".join(["%s"] * len(versions))
+                cursor.execute(
+                    "SELECT TABLE_NAME, UPDATE_TIME FROM information_schema.TABLES "
+                    f"WHERE TABLE_SCHEMA = %s AND TABLE_NAME IN ({placeholders})",
+                    (database, *versions)
+                )
+                for name, update_time in cursor.fetchall():
+                    if isinstance(name, (bytes, bytearray)):
+                        name = name.decode("utf-8")
+                    versions[name] = str(update_time) if update_time is not None else None
+            finally:
+                cursor.close()
+        return versions
+
+    def get_llm_client(self):
+        """Return the shared LLM client, creating it on first use"""
+        with self.lock:
+            if self.llm_client is None:
+                llm_settings = self.settings.get("llm", {})
+                self.llm_client = LLMClient(
+                    self.openai_api_key,
+                    model=llm_settings.get("model", "gpt-4o-mini"),
+                    base_url=llm_settings.get("base_url"),
+                    timeout=llm_settings.get("timeout", 60),
+                    max_retries=llm_settings.get("max_retries", 3),
+                    requests_per_minute=llm_settings.get("requests_per_minute", 0),
+                    stream_usage=llm_settings.get("stream_usage", True)
+                )
+            return self.llm_client
+
+    def get_db_schema(self, force=False):
+        """Get database schema information for context"""
+        try:
+            return self.get_schema_catalog().get_schema(force)
+        except Exception as e:
+            raise Exception(f"Failed to get database schema: {str(e)}")
+
+    def get_prompt_schema(self, natural_language_query):
+        """Get the schema context for a question, keeping only relevant tables when pruning is enabled"""
+        pruning = self.settings.get("schema_pruning", {})
+        if not pruning.get("enabled", True):
+            return self.get_db_schema()
+
+        try:
+            schema_info, stats = self.get_schema_catalog().get_relevant_schema(
+                natural_language_query,
+                top_k=pruning.get("top_k", 8),
+                token_budget=pruning.get("token_budget", 2000)
+            )
+        except Exception as e:
+            raise Exception(f"Failed to get database schema: {str(e)}")
+
+        self.set_metric("schema", "Schema: {}/{} tables, ~{} tokens saved".format(
+            stats["tables"], stats["total_tables"], stats["tokens_saved"]))
+        if self.schema_profiler is not None:
+            self.set_metric("profile", self.schema_profiler.stats_text())
+        return schema_info
+
+    def forget_cached_sql(self, natural_language_query):
+        """Drop the cached SQL and the stored example for a question whose SQL turned out to be unusable"""
+        cache = self.get_question_cache()
+        if cache is not None and self.schema_catalog is not None:
+            cache.discard(natural_language_query, self.schema_catalog.fingerprint, self.get_llm_client().model)
+        examples = self.get_example_store()
+        if examples is not None:
+            examples.discard(natural_language_query)
+
+    def get_prompt_examples(self, natural_language_query):
+        """Verified question/SQL pairs most similar to the question, as prompt text ("" when there are none)"""
+        examples = self.get_example_store()
+        if examples is None:
+            return ""
+        few_shot = self.settings.get("few_shot", {})
+        known = self.schema_catalog.tables if self.schema_catalog is not None else None
+        matches = examples.search(
+            natural_language_query,
+            top_k=few_shot.get("top_k", 3),
+            min_similarity=few_shot.get("min_similarity", 0.3),
+            known_tables=known
+        )
+        if matches:
+            self.set_metric("examples", "Examples: {} (best {:.2f}, {})".format(
+                len(matches), matches[0][0], examples.stats_text()))
+        else:
+            self.set_metric("examples", "")
+        return format_examples(matches, few_shot.get("token_budget", 600))
+
+    def remember_example(self, natural_language_query, sql_query, df):
+        """Add a question whose SQL ran and returned rows to the few-shot history"""
+        examples = self.get_example_store()
+        if examples is not None and not df.empty:
+            examples.add(natural_language_query, sql_query, len(df))
+
+    def nl_to_sql(self, natural_language_query, on_token=None, schema_info=None):
+        """Convert natural language to SQL using GPT-4o-mini, passing streamed text to on_token
+
+        schema_info is the prompt schema when the caller has already fetched it as a separate stage.
+        """
+        try:
+            # Get database schema information, pruned to the relevant tables
+            if schema_info is None:
+                schema_info = self.get_prompt_schema(natural_language_query)
+
+            # Reuse SQL generated earlier for the same question and schema
+            cache = self.get_question_cache()
+            fingerprint = self.get_schema_catalog().fingerprint
+            client = self.get_llm_client()
+            if cache is not None:
+                cached_sql = cache.get(natural_language_query, fingerprint, client.model)
+                self.set_metric("sql_cache", cache.stats_text())
+                if cached_sql is not None:
+                    return cached_sql
+
+            # Verified queries for similar questions show the model this database's join conventions
+            examples = self.get_prompt_examples(natural_language_query)
+            if examples:
+                examples = f"\nEXAMPLES (questions answered correctly on this database):\n{examples}"
+
+            # Set up the prompt for GPT-4o-mini
+            prompt = f"""
+            You are an SQL expert that converts natural language queries to valid MySQL SQL statements.
+
+            DATABASE SCHEMA:
+            {schema_info}
+            {examples}
+            INSTRUCTIONS:
+            - Generate a valid MySQL SELECT query only (no data modification queries)
+            - Include appropriate JOINs if needed
+            - Add a LIMIT clause if not specified in the question
+            - Return ONLY the SQL query without any explanation or additional text
+
+            USER QUERY: {natural_language_query}
+
+            SQL:
+            """
+
+            # Call GPT-4o-mini
+            messages = [
+                {"role": "system", "content": "You generate SQL queries from natural language. Reply with ONLY the SQL query."},
+                {"role": "user", "content": prompt}
+            ]
+            # When streaming, stop reading as soon as the statement is complete so validation can start
+            generated_sql, usage = client.complete(
+                messages,
+                purpose="sql",
+                stream=self.settings.get("llm", {}).get("stream", True),
+                on_token=on_token,
+                stop_when=self.sql_statement_complete,
+                temperature=0,
+                max_tokens=500
+            )
+            self.set_metric("llm", "SQL: first token {:.2f}s, total {:.2f}s".format(usage["first_token"], usage["latency"]))
+            self.set_metric("tokens", client.usage_text())
+
+            # Extract SQL from response
+            generated_sql = generated_sql.strip()
+
+            # Clean up the response (remove backticks, etc.)
+            generated_sql = re.sub(r'^```sql\s*', '', generated_sql)
+            generated_sql = re.sub(r'\s*```.*$', '', generated_sql, flags=re.DOTALL)
+
+            if cache is not None:
+                cache.put(natural_language_query, fingerprint, client.model, generated_sql)
+
+            return generated_sql
+
+        except Exception as e:
+            raise Exception(f"Failed to convert natural language to SQL: {str(e)}")
+
+    def sql_statement_complete(self, text):
+        """True once streamed text holds a full statement: a ';' outside quotes, or a closing code fence"""
+        body = re.sub(r'^\s*```(sql)?', '', text)
+        if "```" in body:
+            return True
+        quote = None
+        escaped = False
+        for char in body:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif quote:
+                if char == quote:
+                    quote = None
+            elif char in ("'", '"', "`"):
+                quote = char
+            elif char == ";":
+                return True
+        return False
+
+    def check_sql(self, sql_query):
+        """Return the reasons the SQL is unsafe to run (an empty list if it passes)"""
+        # Table names are checked against the catalog once the schema has been loaded
+        tables = self.schema_catalog.tables if self.schema_catalog is not None else None
+        return self.validator.validate(sql_query, tables)
+
+    def preflight(self, sql_query):
+        """Rewrite validated SQL with a LIMIT and time limit, then check its plan; returns (sql, notes)
+
+        Raises QueryRejected when the plan is over budget and the guard is set to reject.
+        """
+        if self.guard is None:
+            return sql_query, []
+
+        sql_query, notes = self.guard.rewrite(sql_query)
+        if not self.guard.explainable(sql_query):
+            return sql_query, notes
+
+        try:
+            with self.get_connection_pool().connection() as conn:
+                plan = self.guard.explain(conn, sql_query)
+        except Exception as e:
+            raise Exception(f"Failed to explain SQL query: {str(e)}") from e
+
+        self.set_metric("plan", "Plan: ~{:,} rows, cost {:,.0f}".format(plan["rows"], plan["cost"]))
+        reasons = self.guard.check(plan)
+        if reasons and self.guard.action == "reject":
+            raise QueryRejected(reasons)
+        return sql_query, notes + [item["message"] for item in reasons]
+
+    def execute_sql(self, sql_query, on_chunk=None):
+        """Execute SQL query on MySQL database, streaming rows in chunks up to the configured caps"""
+        limits = self.settings.get("query_limits", {})
+        query = None
+        try:
+            # Serve repeated statements from the result cache while their tables are unchanged
+            cache = self.get_result_cache()
+            if cache is not None:
+                database = "{}:{}/{}".format(self.db_config.get("host", ""), self.db_config.get("port", ""),
+                                             self.db_config.get("database", ""))
+                check = self.settings.get("result_cache", {}).get("check_update_time", True)
+                df = cache.get(sql_query, database, self.table_versions if check else None)
+                self.set_metric("result_cache", cache.stats_text())
+                if df is not None:
+                    self.set_metric("rows", f"Rows: {len(df)} (cached)")
+                    if on_chunk is not None:
+                        on_chunk(df)
+                    return df
+                # Versions are read before the query runs, so a concurrent write invalidates the entry
+                tables = self.query_tables(sql_query)
+                versions = self.table_versions(tables) if check else {}
+
+            if not limits.get("streaming", True):
+                with self.get_connection_pool().connection() as conn:
+                    # Execute query and convert to pandas DataFrame
+                    df = pd.read_sql_query(sql_query, conn)
+                if on_chunk is not None:
+                    on_chunk(df)
+                if cache is not None:
+                    cache.put(sql_query, database, df, tables, versions)
+                return df
+
+            query = StreamingQuery(
+                self.get_connection_pool(),
+                sql_query,
+                chunk_size=limits.get("chunk_size", 1000),
+                max_rows=limits.get("max_rows", 100000),
+                max_bytes=limits.get("max_bytes", 256 * 1024 * 1024),
+                columnar=limits.get("columnar", True)
+            )
+            self.active_queries.add(query)
+            df = query.fetch_all(on_chunk)
+            df.attrs["truncated"] = query.truncated
+
+            if query.truncated:
+                self.set_metric("rows", f"Rows: first {query.row_count} (limit reached)")
+            else:
+                self.set_metric("rows", f"Rows: {query.row_count}")
+            if cache is not None:
+                cache.put(sql_query, database, df, tables, versions, query.byte_count, query.truncated)
+            return df
+
+        except QueryCancelled:
+            raise
+        except Exception as e:
+            raise Exception(f"Failed to execute SQL query: {str(e)}") from e
+        finally:
+            self.active_queries.discard(query)
+
+    def cancel_active_queries(self):
+        """Kill every statement currently streaming from the database"""
+        for query in list(self.active_queries):
+            # KILL QUERY needs its own connection; keep that off the caller's thread
+            threading.Thread(target=query.cancel, daemon=True).start()
+
+    def execute_with_repair(self, question, sql_query, stage=None, on_chunk=None, on_repair=None):
+        """Validate, cost-check and run SQL, asking the model to repair it after a fixable failure
+
+        stage(name, func, *args, **kwargs) runs each step (the app passes one that applies timeouts
+        and cancellation); on_repair(sql) is called with every repaired statement before it runs.
+        Returns a dict with the final sql, the statement actually run, df, notes and attempts.
+        """
+        if stage is None:
+            stage = lambda name, func, *args, **kwargs: func(*args, **kwargs)
+        repair_settings = self.settings.get("repair", {})
+        max_attempts = repair_settings.get("max_attempts", 2) if repair_settings.get("enabled", True) else 0
+        attempts = []
+        self.set_metric("repair", "")
+
+        while True:
+            df = None
+            try:
+                reasons = stage("validate", self.check_sql, sql_query)
+                if reasons:
+                    raise QueryRejected(reasons, "validator")
+                run_sql, notes = stage("preflight", self.preflight, sql_query)
+                df = stage("execute", self.execute_sql, run_sql, on_chunk=on_chunk)
+            except QueryCancelled:
+                raise
+            except Exception as e:
+                if len(attempts) >= max_attempts or not self.repairable(e):
+                    # Don't keep serving SQL that cannot run
+                    self.forget_cached_sql(question)
+                    raise
+                failure = e
+                problem = str(e)
+            else:
+                if len(attempts) >= max_attempts or not self.suspicious_empty(run_sql, df):
+                    if attempts:
+                        self.remember_sql(question, sql_query)
+                    self.remember_example(question, sql_query, df)
+                    return {"sql": sql_query, "run_sql": run_sql, "df": df, "notes": notes, "attempts": attempts}
+                failure = None
+                problem = ("The query ran but returned no rows. Filter values may not match how the data "
+                           "is stored (case, spelling, abbreviations, date format). If the query is correct, "
+                           "return it unchanged.")
+
+            start = time.perf_counter()
+            repaired, usage = stage("repair", self.repair_sql, question, sql_query, problem)
+            attempts.append({
+                "sql": sql_query,
+                "error": problem,
+                "latency": time.perf_counter() - start,
+                "prompt_tokens": usage["prompt_tokens"],
+                "completion_tokens": usage["completion_tokens"]
+            })
+            self.set_metric("repair", "Repairs: {} ({:.2f}s)".format(
+                len(attempts), sum(attempt["latency"] for attempt in attempts)))
+
+            if same_statement(repaired, sql_query):
+                # The model stands by its query: keep the empty result, or report the original error
+                if failure is not None:
+                    self.forget_cached_sql(question)
+                    raise failure
+                return {"sql": sql_query, "run_sql": run_sql, "df": df, "notes": notes, "attempts": attempts}
+
+            self.forget_cached_sql(question)
+            sql_query = repaired
+            if on_repair is not None:
+                on_repair(sql_query)
+
+    def repairable(self, error):
+        """True for failures a corrected statement may avoid: rejections and SQL errors, not outages"""
+        if isinstance(error, QueryRejected):
+            return True
+        return mysql_errno(error) in REPAIRABLE_ERRORS
+
+    def suspicious_empty(self, sql_query, df):
+        """True for an empty result from a query that filters on literal values, which often do not match the data"""
+        if not self.settings.get("repair", {}).get("repair_empty", True) or not df.empty:
+            return False
+        in_filter = False
+        for kind, value, position in tokenize_sql(sql_query):
+            if kind == "word" and value.upper() in ("WHERE", "HAVING"):
+                in_filter = True
+            elif in_filter and kind == "string":
+                return True
+        return False
+
+    def repair_sql(self, natural_language_query, sql_query, problem):
+        """Ask the model to fix a failed statement using a compact prompt; returns (sql, usage)"""
+        try:
+            repair_settings = self.settings.get("repair", {})
+            # Only the tables the failed query used plus the best matches for the question
+            catalog = self.get_schema_catalog()
+            schema_info, stats = catalog.get_relevant_schema(
+                natural_language_query,
+                top_k=repair_settings.get("top_k", 4),
+                token_budget=repair_settings.get("token_budget", 800),
+                include=sorted(self.query_tables(sql_query))
+            )
+
+            prompt = f"""
+            A MySQL query generated for the question below did not work. Fix it.
+
+            DATABASE SCHEMA (relevant tables):
+            {schema_info}
+
+            QUESTION: {natural_language_query}
+
+            FAILED SQL:
+            {sql_query}
+
+            PROBLEM: {problem}
+
+            Return ONLY the corrected MySQL SELECT query without any explanation.
+            """
+
+            client = self.get_llm_client()
+            messages = [
+                {"role": "system", "content": "You fix MySQL queries. Reply with ONLY the SQL query."},
+                {"role": "user", "content": prompt}
+            ]
+            repaired, usage = client.complete(
+                messages,
+                purpose="repair",
+                stop_when=self.sql_statement_complete,
+                temperature=0,
+                max_tokens=500
+            )
+            self.set_metric("tokens", client.usage_text())
+
+            repaired = repaired.strip()
+            repaired = re.sub(r'^```sql\s*', '', repaired)
+            repaired = re.sub(r'\s*```.*$', '', repaired, flags=re.DOTALL)
+            return repaired, usage
+
+        except Exception as e:
+            raise Exception(f"Failed to repair SQL query: {str(e)}")
+
+    def remember_sql(self, natural_language_query, sql_query):
+        """Cache a repaired statement for its question so the repair is not paid for again"""
+        cache = self.get_question_cache()
+        if cache is not None and self.schema_catalog is not None:
+            cache.put(natural_language_query, self.schema_catalog.fingerprint, self.get_llm_client().model, sql_query)
+
+    def chart_query(self, sql_query):
+        """Run one small aggregating query for a chart; it is cancelled along with the main statement"""
+        if self.guard is not None:
+            # Only the LIMIT and the server-side time limit; the wrapped statement was checked already
+            sql_query, _ = self.guard.rewrite(sql_query)
+        query = StreamingQuery(self.get_connection_pool(), sql_query,
+                               columnar=self.settings.get("query_limits", {}).get("columnar", True))
+        self.active_queries.add(query)
+        try:
+            return query.fetch_all()
+        finally:
+            self.active_queries.discard(query)
+
+    def chart_spec(self, sql_query, df, max_points=1000):
+        """Work out the chart for a result, aggregating large results in MySQL when pushdown is enabled"""
+        settings = self.settings.get("chart", {})
+        max_points = settings.get("max_points") or max_points
+        self.set_metric("chart", "")
+        # A result at the row threshold was most likely cut short by a LIMIT or the row cap
+        large = len(df) >= settings.get("pushdown_rows", 10000) or df.attrs.get("truncated", False)
+        if settings.get("pushdown", True) and large:
+            try:
+                spec = pushdown_chart(sql_query, df, self.chart_query, max_points, settings.get("aggregate", "avg"))
+            except QueryCancelled:
+                raise
+            except Exception as e:
+                spec = None
+                self.set_metric("chart", f"Chart drawn locally: {str(e)}")
+            if spec is not None:
+                return spec
+        return prepare_chart(df, max_points, settings.get("downsample", "lttb"))
+
+    def generate_summary(self, query, sql_query, df, on_token=None):
+        """Summarise the results from locally computed insights, optionally phrased by GPT-4o-mini
+
+        Only the computed facts reach the model, never raw rows; streamed text goes to on_token.
+        """
+        try:
+            # If we don't have any data, return a simple message
+            if df.empty:
+                return "No data found for your query."
+
+            # Top contributors, period-over-period change, outliers and null rates, computed locally
+            summary_settings = self.settings.get("summary", {})
+            facts = compute_insights(
+                df,
+                top_k=summary_settings.get("top_k", 3),
+                max_measures=summary_settings.get("max_measures", 3)
+            )
+            local_text = " ".join(facts)
+            if not summary_settings.get("use_llm", False):
+                return local_text
+
+            columns = ", ".join(f"{name} ({dtype})" for name, dtype in df.dtypes.astype(str).items())
+            fact_lines = "\n".join(f"- {fact}" for fact in facts)
+
+            # Set up the prompt for GPT-4o-mini
+            prompt = f"""
+            Question: {query}
+            SQL Query: {sql_query}
+            Result columns: {columns}
+
+            Facts computed from the full result:
+            {fact_lines}
+
+            Write a concise, meaningful summary of these results in 3-4 sentences using only the facts above.
+            """
+
+            # Call GPT-4o-mini for summary
+            client = self.get_llm_client()
+            messages = [
+                {"role": "system", "content": "You provide concise, insightful summaries of database query results."},
+                {"role": "user", "content": prompt}
+            ]
+            try:
+                summary, usage = client.complete(
+                    messages,
+                    purpose="summary",
+                    stream=self.settings.get("llm", {}).get("stream", True),
+                    on_token=on_token,
+                    temperature=0.5,
+                    max_tokens=200
+                )
+            except Exception:
+                # The local insights are a complete summary on their own
+                return local_text
+            self.set_metric("tokens", client.usage_text())
+
+            # Extract summary from response
+            summary = summary.strip()
+
+            return summary or local_text
+
+        except Exception as e:
+            return f"Failed to generate summary: {str(e)}"
+
+    def answer(self, question, summarize=False):
+        """Run the whole pipeline for one question without any UI; errors are reported, not raised"""
+        result = {
+            "question": question,
+            "sql": None,
+            "df": None,
+            "row_count": 0,
+            "truncated": False,
+            "summary": None,
+            "rejected": [],
+            "notes": [],
+            "repairs": [],
+            "error": None,
+            "timings": {}
+        }
+        timings = result["timings"]
+        start = time.perf_counter()
+
+        def timed(name, func, *args, **kwargs):
+            stage_start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings[name] = timings.get(name, 0.0) + time.perf_counter() - stage_start
+
+        try:
+            schema_info = timed("schema", self.get_prompt_schema, question)
+            result["sql"] = timed("generate", self.nl_to_sql, question, schema_info=schema_info)
+
+            try:
+                outcome = self.execute_with_repair(question, result["sql"], stage=timed)
+            except QueryRejected as e:
+                result["rejected"] = e.reasons
+                raise
+            result["sql"] = outcome["run_sql"]
+            result["notes"] = outcome["notes"]
+            result["repairs"] = outcome["attempts"]
+            df = outcome["df"]
+            result["df"] = df
+            result["row_count"] = len(df)
+            result["truncated"] = bool(df.attrs.get("truncated", False))
+
+            if summarize:
+                result["summary"] = timed("summary", self.generate_summary, question, result["sql"], df)
+        except Exception as e:
+            result["error"] = str(e)
+        finally:
+            timings["total"] = time.perf_counter() - start
+        return result
+
+    def close(self):
+        """Release pooled connections, the cache file and the HTTP client"""
+        self.cancel_active_queries()
+        with self.lock:
+            if self.schema_profiler is not None:
+                self.schema_profiler.stop()
+            if self.replica_pool is not None:
+                self.replica_pool.close()
+            if self.connection_pool is not None:
+                self.connection_pool.close()
+            if self.question_cache is not None:
+                self.question_cache.close()
+            if self.result_cache is not None:
+                self.result_cache.close()
+            if self.example_store is not None:
+                self.example_store.close()
+            if self.llm_client is not None:
+                self.llm_client.close()
+            self.connection_pool = None
+            self.schema_catalog = None
+            self.schema_profiler = None
+            self.replica_pool = None
+            self.question_cache = None
+            self.result_cache = None
+            self.example_store = None
+            self.llm_client = None
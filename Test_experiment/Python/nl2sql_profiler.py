@@ -0,0 +1,217 @@
+import collections
+import math
+import re
+import threading
+import time
+
+from nl2sql_validator import quote_identifier
+
+
+# Column types that are profiled; TEXT, BLOB, JSON and spatial columns are skipped, and ENUM/SET
+# columns already list their values in the schema
+NUMERIC_TYPES = {"tinyint", "smallint", "mediumint", "int", "integer", "bigint", "decimal", "numeric",
+                 "float", "double", "real"}
+DATE_TYPES = {"date", "datetime", "timestamp", "year"}
+TEXT_TYPES = {"char", "varchar"}
+
+# Longer values are never listed as a column's value set
+MAX_VALUE_LENGTH = 40
+
+# Seconds between looks for tables that are due for profiling
+CHECK_INTERVAL = 60
+
+
+def column_kind(column_type):
+    """"numeric", "date" or "text" for a MySQL column type worth profiling, else None"""
+    match = re.match(r"\s*([a-z]+)", str(column_type).lower())
+    base = match.group(1) if match else ""
+    if base in NUMERIC_TYPES:
+        return "numeric"
+    if base in DATE_TYPES:
+        return "date"
+    if base in TEXT_TYPES:
+        return "text"
+    return None
+
+
+def estimate_ndv(counts, sampled, total):
+    """Distinct values in a whole column from the value counts of a sample of it (GEE estimator)
+
+    Values seen once in the sample stand for many unseen ones, scaled by sqrt(total / sampled).
+    """
+    if not sampled or sampled >= total:
+        return len(counts)
+    singles = sum(1 for count in counts.values() if count == 1)
+    estimate = math.sqrt(total / sampled) * singles + (len(counts) - singles)
+    return int(min(round(estimate), total))
+
+
+def column_stats(values, kind, total, complete, max_values):
+    """Statistics of one column from its sampled values; total is the table's row count, None if unknown"""
+    present = [value.decode("utf-8", "replace") if isinstance(value, (bytes, bytearray)) else value
+               for value in values if value is not None]
+    counts = collections.Counter(present)
+    stats = {"kind": kind}
+    if total is not None and values:
+        # The NULLs in the sample stand for the same share of the table
+        non_null_total = max(round(total * len(present) / len(values)), len(present))
+        stats["ndv"] = estimate_ndv(counts, len(present), non_null_total)
+    if kind == "text":
+        # List the values only when the sample has most likely seen all of them
+        seen_all = complete or all(count > 1 for count in counts.values())
+        if counts and len(counts) <= max_values and seen_all and \
+                all(len(str(value)) <= MAX_VALUE_LENGTH for value in counts):
+            stats["values"] = [str(value) for value, _ in counts.most_common()]
+    elif present and complete:
+        # The first rows of a larger table usually hold its oldest values, so their range would mislead
+        stats["min"] = str(min(present))
+        stats["max"] = str(max(present))
+    return stats
+
+
+class SchemaProfiler:
+    """Background thread that samples the catalog's tables, one throttled query at a time
+
+    For each table it records approximate distinct counts, the value sets of low-cardinality text
+    columns and the minimum and maximum of numeric and date columns, and stores them in the schema
+    catalog, which condenses them into the prompt. Tables are profiled again after interval seconds,
+    or as soon as their columns change.
+    """
+
+    def __init__(self, catalog, connection, database, interval=3600, pause=1.0, sample_rows=10000,
+                 max_values=20, max_execution_time=5):
+        self.catalog = catalog
+        # Callable returning a context manager that yields a connection (to a replica if configured)
+        self.connection = connection
+        self.database = database
+        self.interval = interval
+        # Seconds to wait before every profiling query, so the profiler never competes with users
+        self.pause = pause
+        self.sample_rows = sample_rows
+        self.max_values = max_values
+        self.max_execution_time = max_execution_time
+        self.stopping = threading.Event()
+        self.thread = None
+        self.profiled = 0
+        self.failed = 0
+
+    def start(self):
+        """Start the background thread"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="nl2sql-profiler", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Ask the background thread to stop after its current query"""
+        self.stopping.set()
+
+    def run(self):
+        """Profile the tables that are due, then look again every CHECK_INTERVAL seconds"""
+        while not self.stopping.is_set():
+            for table_name, columns in self.due_tables():
+                if self.stopping.wait(self.pause):
+                    return
+                try:
+                    profile = self.profile_table(table_name, columns)
+                except Exception as e:
+                    # One bad table must not end profiling for the session
+                    self.failed += 1
+                    profile = {"profiled": time.time(), "column_names": [col_name for col_name, _ in columns],
+                               "columns": {}, "error": str(e)}
+                self.catalog.set_profile(table_name, profile)
+            self.stopping.wait(CHECK_INTERVAL)
+
+    def due_tables(self):
+        """(table, columns) never profiled, profiled too long ago or changed since, oldest profile first"""
+        tables, profiles = self.catalog.profile_state()
+        now = time.time()
+        due = []
+        for table_name, columns in tables.items():
+            profile = profiles.get(table_name)
+            if profile is None or now - profile["profiled"] >= self.interval or \
+                    profile.get("column_names") != [col_name for col_name, _ in columns]:
+                due.append((table_name, columns))
+        due.sort(key=lambda item: (profiles.get(item[0]) or {}).get("profiled", 0))
+        return due
+
+    def hint(self):
+        """Optimizer hint that stops a profiling query running longer than max_execution_time"""
+        if not self.max_execution_time:
+            return ""
+        return f"/*+ MAX_EXECUTION_TIME({int(self.max_execution_time * 1000)}) */ "
+
+    def profile_table(self, table_name, columns):
+        """Sample one table and return its profile; failures are recorded so the table is not retried at once"""
+        kinds = {col_name: column_kind(col_type) for col_name, col_type in columns}
+        sampled = [col_name for col_name, _ in columns if kinds[col_name]]
+        profile = {"profiled": time.time(), "column_names": [col_name for col_name, _ in columns], "columns": {}}
+        if not sampled:
+            return profile
+
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    # The first rows in storage order: cheap, though not a random sample
+                    cursor.execute(
+                        f"SELECT {self.hint()}{', '.join(quote_identifier(name) for name in sampled)} "
+                        f"FROM {quote_identifier(table_name)} LIMIT {int(self.sample_rows)}"
+                    )
+                    rows = cursor.fetchall()
+                    complete = len(rows) < self.sample_rows
+                    exact = {}
+                    if not complete:
+                        ranged = [name for name in self.indexed_columns(cursor, table_name)
+                                  if kinds.get(name) in ("numeric", "date")]
+                        if ranged and not self.stopping.wait(self.pause):
+                            exact = self.index_ranges(cursor, table_name, ranged)
+                finally:
+                    cursor.close()
+        except Exception as e:
+            self.failed += 1
+            profile["error"] = str(e)
+            return profile
+
+        # Beyond the sample, the table's size is only known from information_schema's estimate
+        total = len(rows) if complete else self.catalog.row_counts.get(table_name)
+        profile["rows"] = total
+        profile["sampled"] = len(rows)
+        for position, name in enumerate(sampled):
+            values = [row[position] for row in rows]
+            stats = column_stats(values, kinds[name], total, complete, self.max_values)
+            if name in exact:
+                stats["min"], stats["max"] = exact[name]
+            profile["columns"][name] = stats
+        self.profiled += 1
+        return profile
+
+    def indexed_columns(self, cursor, table_name):
+        """Columns that lead an index, whose minimum and maximum MySQL reads from the index alone"""
+        cursor.execute(
+            "SELECT DISTINCT COLUMN_NAME FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND SEQ_IN_INDEX = 1",
+            (self.database, table_name)
+        )
+        return [name.decode("utf-8") if isinstance(name, (bytes, bytearray)) else name
+                for name, in cursor.fetchall()]
+
+    def index_ranges(self, cursor, table_name, names):
+        """Exact (min, max) text of indexed columns, for tables larger than the sample"""
+        aggregates = ", ".join(f"MIN({quote_identifier(name)}), MAX({quote_identifier(name)})" for name in names)
+        cursor.execute(f"SELECT {self.hint()}{aggregates} FROM {quote_identifier(table_name)}")
+        row = cursor.fetchone()
+        ranges = {}
+        for position, name in enumerate(names):
+            low, high = row[2 * position], row[2 * position + 1]
+            if low is not None:
+                ranges[name] = (str(low), str(high))
+        return ranges
+
+    def stats_text(self):
+        """Short progress summary for the status area"""
+        tables, profiles = self.catalog.profile_state()
+        done = sum(1 for name in tables if name in profiles)
+        text = f"Profiled: {done}/{len(tables)} tables"
+        if self.failed:
+            text += f", {self.failed} failed"
+        return text
@@ -0,0 +1,458 @@
+import collections
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+
+
+# Words that say nothing about which table a question is about
+STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "by", "to", "and", "or", "with", "from",
+    "me", "show", "list", "what", "which", "who", "how", "many", "much", "is", "are",
+    "was", "were", "has", "have", "top", "all", "each", "per", "their", "its", "that",
+    "this", "do", "does", "did", "give", "find", "get", "id", "last", "first", "most"
+}
+
+
+def _text(value):
+    """Decode bytes returned by some connector versions for information_schema columns"""
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8")
+    return value
+
+
+def _stem(word):
+    """Very small plural stripper so 'categories' matches 'category' and 'orders' matches 'order'"""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Split prose and snake_case/CamelCase identifiers into lowercase stems"""
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text)
+    return {_stem(word) for word in re.findall(r"[a-z0-9]+", text.lower())
+            if word not in STOPWORDS and len(word) > 1}
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token for English and SQL)"""
+    return (len(text) + 3) // 4
+
+
+class SchemaCatalog:
+    """Database schema cached in memory and on disk, refreshed only when MySQL reports a change"""
+
+    def __init__(self, db_config, connection, cache_dir=".nl2sql_cache", refresh_interval=60, profile_budget=400):
+        self.db_config = db_config
+        # Callable returning a context manager that yields a connection
+        self.connection = connection
+        self.cache_dir = cache_dir
+        self.refresh_interval = refresh_interval
+        # Estimated prompt tokens for profile notes (value sets, ranges, row counts) per prompt
+        self.profile_budget = profile_budget
+        self.lock = threading.Lock()
+
+        # table name -> list of (column name, column type)
+        self.tables = {}
+        # table name -> list of (column name, referenced table, referenced column)
+        self.foreign_keys = {}
+        # table name -> "CREATE_TIME|UPDATE_TIME" from information_schema.TABLES
+        self.signatures = {}
+        # table name -> estimated row count (TABLE_ROWS) from information_schema.TABLES
+        self.row_counts = {}
+        # table name -> column statistics sampled by the schema profiler
+        self.profiles = {}
+        # Server-side checksum over all column definitions
+        self.checksum = None
+        self.fingerprint = ""
+        self.schema_text = ""
+        self.last_checked = 0.0
+
+        # Derived lookup structures for relevance pruning
+        self.table_blocks = {}
+        self.table_tokens = {}
+        self.token_weights = {}
+        self.neighbours = {}
+        # table name -> list of (column name, referenced table, referenced column), declared or inferred
+        self.join_keys = {}
+
+        self.load_cache()
+
+    def cache_path(self):
+        """Cache file for this host/port/database combination"""
+        key = "{}:{}/{}".format(
+            self.db_config.get("host", ""),
+            self.db_config.get("port", ""),
+            self.db_config.get("database", "")
+        )
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"schema_{digest}.json")
+
+    def load_cache(self):
+        """Load a previously saved catalog from disk if one exists"""
+        try:
+            with open(self.cache_path(), "r") as f:
+                data = json.load(f)
+            self.tables = {name: [tuple(col) for col in cols] for name, cols in data["tables"].items()}
+            self.foreign_keys = {name: [tuple(fk) for fk in fks] for name, fks in data["foreign_keys"].items()}
+            self.signatures = data["signatures"]
+            self.checksum = data["checksum"]
+            self.row_counts = data.get("row_counts", {})
+            self.profiles = data.get("profiles", {})
+            self.rebuild()
+        except (OSError, ValueError, KeyError, TypeError):
+            self.tables, self.foreign_keys, self.signatures, self.checksum = {}, {}, {}, None
+            self.row_counts, self.profiles = {}, {}
+
+    def save_cache(self):
+        """Persist the catalog so the next session starts warm"""
+        data = {
+            "tables": self.tables,
+            "foreign_keys": self.foreign_keys,
+            "signatures": self.signatures,
+            "checksum": self.checksum,
+            "fingerprint": self.fingerprint,
+            "row_counts": self.row_counts,
+            "profiles": self.profiles
+        }
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = self.cache_path() + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.cache_path())
+        except OSError:
+            # The on-disk copy is only an optimisation
+            pass
+
+    def get_schema(self, force=False):
+        """Return the schema description, revalidating at most once per refresh interval"""
+        with self.lock:
+            self.ensure_fresh(force)
+            return self.describe_tables(sorted(self.tables))
+
+    def get_relevant_schema(self, question, top_k=8, token_budget=2000, include=()):
+        """Return (schema text, stats) limited to the tables the question is likely about
+
+        Tables named in include (e.g. those a failed query used) are always part of the result.
+        """
+        with self.lock:
+            self.ensure_fresh()
+            selected = self.select_tables(question, top_k, token_budget)
+            selected += [name for name in include if name in self.table_blocks and name not in selected]
+
+            # What the full schema would cost, profile notes included
+            full_text = self.describe_tables(sorted(self.tables))
+            full_tokens = estimate_tokens(full_text)
+            # Nothing matched; the model needs the whole schema to have a chance
+            text = self.describe_tables(selected) if selected else full_text
+
+            tokens = estimate_tokens(text)
+            stats = {
+                "tables": len(selected) if selected else len(self.tables),
+                "total_tables": len(self.tables),
+                "tokens": tokens,
+                "full_tokens": full_tokens,
+                "tokens_saved": max(full_tokens - tokens, 0)
+            }
+            return text, stats
+
+    def describe_tables(self, table_names):
+        """Prompt text for some tables: their columns, the joins between them and profile notes
+
+        table_names is in order of relevance; profile notes go to the most useful facts of the most
+        relevant tables first, within the profile budget.
+        """
+        chosen = set(table_names)
+        notes = self.profile_notes(table_names)
+        blocks = []
+        for table_name in sorted(table_names):
+            block = self.table_blocks[table_name]
+            joins = [f"{col} -> {ref_table}.{ref_col}"
+                     for col, ref_table, ref_col in self.join_keys.get(table_name, [])
+                     if ref_table in chosen]
+            if joins:
+                block += f"Foreign keys: {', '.join(joins)}\n"
+            block += "".join(line + "\n" for line in notes.get(table_name, []))
+            blocks.append(block)
+        return "\n".join(blocks)
+
+    def table_notes(self, table_name):
+        """(priority, line) notes about a table from its profile; lower priorities are kept first"""
+        notes = []
+        profile = self.profiles.get(table_name) or {}
+        current = {col_name for col_name, _ in self.tables.get(table_name, [])}
+        # Statistics of columns dropped since the table was profiled are left out
+        columns = {name: stats for name, stats in profile.get("columns", {}).items() if name in current}
+
+        values = ["{} = {}".format(name, " | ".join("'" + value.replace("'", "''") + "'" for value in stats["values"]))
+                  for name, stats in columns.items() if stats.get("values")]
+        if values:
+            notes.append((1, "Values: " + "; ".join(values)))
+        ranges = [f"{name} {stats['min']} to {stats['max']}" for name, stats in columns.items() if "min" in stats]
+        if ranges:
+            notes.append((2, "Ranges: " + ", ".join(ranges)))
+        distinct = [f"{name} ~{stats['ndv']:,}" for name, stats in columns.items()
+                    if stats.get("kind") == "text" and not stats.get("values") and stats.get("ndv")]
+        if distinct:
+            notes.append((3, "Distinct values: " + ", ".join(distinct)))
+        rows = self.row_counts.get(table_name, profile.get("rows"))
+        if rows is not None:
+            notes.append((3, f"Rows: ~{rows:,}"))
+        return notes
+
+    def profile_notes(self, table_names):
+        """table name -> note lines, chosen by priority and then table relevance within the profile budget"""
+        candidates = []
+        for rank, table_name in enumerate(table_names):
+            for priority, line in self.table_notes(table_name):
+                candidates.append((priority, rank, table_name, line))
+        candidates.sort(key=lambda item: (item[0], item[1]))
+
+        notes = collections.defaultdict(list)
+        used_tokens = 0
+        for priority, rank, table_name, line in candidates:
+            cost = estimate_tokens(line) + 1
+            if used_tokens + cost > self.profile_budget:
+                # A shorter note further down may still fit
+                continue
+            notes[table_name].append(line)
+            used_tokens += cost
+        return notes
+
+    def profile_state(self):
+        """Snapshot of (tables, profiles) for the profiler thread"""
+        with self.lock:
+            return dict(self.tables), dict(self.profiles)
+
+    def set_profile(self, table_name, profile):
+        """Store the profiler's statistics for a table and persist them"""
+        with self.lock:
+            if table_name not in self.tables:
+                return
+            self.profiles[table_name] = profile
+            self.save_cache()
+
+    def invalidate(self):
+        """Force a revalidation on the next lookup"""
+        with self.lock:
+            self.last_checked = 0.0
+
+    def ensure_fresh(self, force=False):
+        """Refresh the catalog if it is empty, forced or older than the refresh interval"""
+        stale = time.monotonic() - self.last_checked >= self.refresh_interval
+        if force or not self.tables or stale:
+            self.refresh(force)
+
+    def refresh(self, force=False):
+        """Reload column definitions for tables that changed since the last check"""
+        database = self.db_config.get("database", "")
+        with self.connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                "SELECT TABLE_NAME, CREATE_TIME, UPDATE_TIME, TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = %s",
+                (database,)
+            )
+            signatures = {}
+            row_counts = {}
+            for name, created, updated, table_rows in cursor.fetchall():
+                signatures[_text(name)] = f"{created}|{updated}"
+                # An estimate for InnoDB; NULL for views
+                if table_rows is not None:
+                    row_counts[_text(name)] = int(table_rows)
+
+            cursor.execute(
+                "SELECT COUNT(*), SUM(CRC32(CONCAT_WS(',', TABLE_NAME, COLUMN_NAME, COLUMN_TYPE))) "
+                "FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s",
+                (database,)
+            )
+            count, crc = cursor.fetchone()
+            checksum = f"{count}:{crc}"
+
+            # A checksum mismatch catches changes the timestamps miss (e.g. views)
+            if force or checksum != self.checksum:
+                changed = sorted(signatures)
+            else:
+                changed = sorted(name for name, sig in signatures.items() if self.signatures.get(name) != sig)
+
+            tables = {name: cols for name, cols in self.tables.items() if name in signatures}
+            foreign_keys = {name: fks for name, fks in self.foreign_keys.items() if name in signatures}
+            if changed:
+                # One bulk query instead of a DESCRIBE per table
+                placeholders = ", ".join(["%s"] * len(changed))
+                cursor.execute(
+                    "SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE FROM information_schema.COLUMNS "
+                    f"WHERE TABLE_SCHEMA = %s AND TABLE_NAME IN ({placeholders}) "
+                    "ORDER BY TABLE_NAME, ORDINAL_POSITION",
+                    (database, *changed)
+                )
+                for name in changed:
+                    tables[name] = []
+                    foreign_keys.pop(name, None)
+                for table_name, col_name, col_type in cursor.fetchall():
+                    tables.setdefault(_text(table_name), []).append((_text(col_name), _text(col_type)))
+
+                cursor.execute(
+                    "SELECT TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME "
+                    "FROM information_schema.KEY_COLUMN_USAGE "
+                    f"WHERE TABLE_SCHEMA = %s AND TABLE_NAME IN ({placeholders}) "
+                    "AND REFERENCED_TABLE_NAME IS NOT NULL",
+                    (database, *changed)
+                )
+                for table_name, col_name, ref_table, ref_col in cursor.fetchall():
+                    foreign_keys.setdefault(_text(table_name), []).append(
+                        (_text(col_name), _text(ref_table), _text(ref_col)))
+
+            cursor.close()
+
+        modified = changed or tables.keys() != self.tables.keys() or checksum != self.checksum
+        self.tables = tables
+        self.foreign_keys = foreign_keys
+        self.signatures = signatures
+        self.checksum = checksum
+        self.row_counts = row_counts
+        self.profiles = {name: profile for name, profile in self.profiles.items() if name in tables}
+        self.last_checked = time.monotonic()
+
+        if modified:
+            self.rebuild()
+            self.save_cache()
+
+    def rebuild(self):
+        """Recompute the prompt text, fingerprint and lookup structures from the cached tables"""
+        self.table_blocks = {}
+        for table_name in sorted(self.tables):
+            column_info = [f"{col_name} ({col_type})" for col_name, col_type in self.tables[table_name]]
+            self.table_blocks[table_name] = f"Table: {table_name}\nColumns: {', '.join(column_info)}\n"
+        self.schema_text = "\n".join(self.table_blocks.values())
+
+        canonical = json.dumps([self.tables, self.foreign_keys], sort_keys=True)
+        self.fingerprint = hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+        # Tokens per table, weighted by how rare they are across the schema
+        self.table_tokens = {}
+        document_frequency = collections.Counter()
+        for table_name, columns in self.tables.items():
+            name_tokens = tokenize(table_name)
+            column_tokens = set()
+            for col_name, _ in columns:
+                column_tokens |= tokenize(col_name)
+            self.table_tokens[table_name] = (name_tokens, column_tokens)
+            document_frequency.update(name_tokens | column_tokens)
+        table_count = max(len(self.tables), 1)
+        self.token_weights = {token: math.log(1 + table_count / df) for token, df in document_frequency.items()}
+
+        # Join keys: declared foreign keys plus <table>_id columns that match a table's key by name
+        self.join_keys = {name: list(fks) for name, fks in self.foreign_keys.items()}
+        for table_name, ref_table, col_name in self.inferred_joins():
+            self.join_keys.setdefault(table_name, []).append((col_name, ref_table, col_name))
+
+        # Undirected join graph for join path expansion
+        self.neighbours = collections.defaultdict(set)
+        for table_name, keys in self.join_keys.items():
+            for _, ref_table, _ in keys:
+                if ref_table in self.tables and ref_table != table_name:
+                    self.neighbours[table_name].add(ref_table)
+                    self.neighbours[ref_table].add(table_name)
+
+    def inferred_joins(self):
+        """(table, referenced table, column) for undeclared keys such as orders.customer_id -> customers.customer_id
+
+        A column named <name>_id joins the table called <name> (or its plural) when that table has a
+        column of the same name and no foreign key is declared for the column.
+        """
+        by_stem = {_stem(name.lower()): name for name in self.tables}
+        joins = []
+        for table_name, columns in self.tables.items():
+            declared = {col for col, _, _ in self.foreign_keys.get(table_name, [])}
+            for col_name, _ in columns:
+                lowered = col_name.lower()
+                if not lowered.endswith("_id") or col_name in declared:
+                    continue
+                ref_table = by_stem.get(_stem(lowered[:-3]))
+                if ref_table is None or ref_table == table_name:
+                    continue
+                if any(ref_col == col_name for ref_col, _ in self.tables[ref_table]):
+                    joins.append((table_name, ref_table, col_name))
+        return joins
+
+    def score_tables(self, question):
+        """Lexical relevance of every table to the question, best first"""
+        words = tokenize(question)
+        scores = []
+        for table_name, (name_tokens, column_tokens) in self.table_tokens.items():
+            score = 0.0
+            for word in words:
+                if word in name_tokens:
+                    # Matching all of 'orders' beats matching half of 'order_items'
+                    score += 3 * self.token_weights[word] / len(name_tokens)
+                elif word in column_tokens:
+                    score += self.token_weights[word]
+            if score > 0:
+                scores.append((score, table_name))
+        scores.sort(key=lambda item: (-item[0], item[1]))
+        return scores
+
+    def join_path(self, sources, target):
+        """Shortest foreign-key path from any table in sources to target (BFS)"""
+        previous = {source: None for source in sources}
+        queue = collections.deque(sources)
+        while queue:
+            current = queue.popleft()
+            if current == target:
+                path = []
+                while current is not None:
+                    path.append(current)
+                    current = previous[current]
+                return path[::-1]
+            for neighbour in sorted(self.neighbours.get(current, ())):
+                if neighbour not in previous:
+                    previous[neighbour] = current
+                    queue.append(neighbour)
+        return [target]
+
+    def select_tables(self, question, top_k, token_budget):
+        """Pick the best matching tables plus the tables needed to join them, within the budget"""
+        scores = self.score_tables(question)
+        if not scores:
+            return []
+        # Weak partial matches are left to join path expansion
+        cutoff = scores[0][0] * 0.5
+        seeds = [table_name for score, table_name in scores[:top_k] if score >= cutoff]
+
+        selected = []
+        used_tokens = 0
+
+        def add(table_name):
+            nonlocal used_tokens
+            if table_name in selected:
+                return True
+            cost = estimate_tokens(self.table_blocks[table_name])
+            if selected and used_tokens + cost > token_budget:
+                return False
+            selected.append(table_name)
+            used_tokens += cost
+            return True
+
+        # Seeds in relevance order, each pulling in the tables that connect it to the rest
+        for seed in seeds:
+            path = self.join_path(selected, seed) if selected else [seed]
+            for table_name in path:
+                if not add(table_name):
+                    break
+
+        # Spare budget goes to tables the seeds reference, which usually hold lookup data
+        for seed in seeds:
+            for _, ref_table, _ in self.join_keys.get(seed, []):
+                if ref_table in self.table_blocks:
+                    add(ref_table)
+
+        return selected
@@ -0,0 +1,456 @@
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import sys
+import tempfile
+import time
+
+from nl2sql_pipeline import NL2SQLPipeline, read_config, CONFIG_FILE
+from nl2sql_cache import normalize_question
+from nl2sql_insights import coerce_types
+from nl2sql_batch import percentile
+
+# pyarrow is optional: without it results are only served as JSON
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# uvicorn is optional: any ASGI server can run create_app instead
+try:
+    import uvicorn
+except ImportError:
+    uvicorn = None
+
+
+ARROW_TYPE = "application/vnd.apache.arrow.stream"
+
+# Largest request body accepted, in bytes
+MAX_BODY = 64 * 1024
+
+
+def result_meta(result, coalesced):
+    """Everything about an answer except the rows, as JSON-serialisable values"""
+    df = result["df"]
+    return {
+        "question": result["question"],
+        "sql": result["sql"],
+        "columns": [str(name) for name in df.columns] if df is not None else [],
+        "row_count": result["row_count"],
+        "truncated": result["truncated"],
+        "summary": result["summary"],
+        "notes": result["notes"],
+        "repairs": len(result["repairs"]),
+        "rejected": [item["message"] for item in result["rejected"]],
+        "error": result["error"],
+        "timings": result["timings"],
+        "coalesced": coalesced
+    }
+
+
+def json_body(result, coalesced):
+    """JSON response body; rows are written by pandas as a list of lists"""
+    meta = result_meta(result, coalesced)
+    if result["df"] is None:
+        return json.dumps(dict(meta, rows=[])).encode("utf-8")
+    # DECIMAL objects become numbers, dates ISO strings; anything else falls back to str()
+    rows = coerce_types(result["df"]).to_json(orient="values", date_format="iso", double_precision=15,
+                                              default_handler=str)
+    # Splice the rows in rather than parsing and re-encoding pandas' output
+    return (json.dumps(meta)[:-1] + ', "rows": ' + rows + "}").encode("utf-8")
+
+
+def arrow_table(df):
+    """Arrow table for a result, with duplicate column names made unique"""
+    df = coerce_types(df)
+    names = []
+    for name in (str(name) for name in df.columns):
+        unique = name
+        suffix = 2
+        while unique in names:
+            unique = f"{name}_{suffix}"
+            suffix += 1
+        names.append(unique)
+    df = df.set_axis(names, axis=1)
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Columns of mixed Python objects are sent as text
+        df = df.copy()
+        for name in df.columns:
+            if df[name].dtype == object:
+                df[name] = df[name].map(lambda value: value if value is None else str(value))
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def arrow_body(result, coalesced):
+    """Arrow IPC stream body; the answer's metadata travels as JSON in the schema metadata"""
+    meta = result_meta(result, coalesced)
+    table = arrow_table(result["df"]) if result["df"] is not None else pa.table({})
+    table = table.replace_schema_metadata({"nl2sql": json.dumps(meta)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+class QueryServer:
+    """ASGI application answering questions over HTTP with one shared pipeline
+
+    Every user shares the pipeline's connection pool, schema catalog, SQL and result caches and LLM
+    client. Identical questions that arrive while one is being answered wait for that answer instead
+    of running again, and each user may only have per_user questions running at a time.
+
+    POST /query takes {"question": ..., "summary": false, "format": "json" | "arrow"};
+    GET /health and GET /stats report liveness and counters.
+    """
+
+    def __init__(self, pipeline, workers=8, per_user=2, timeout=300, api_keys=None, trusted_proxies=()):
+        self.pipeline = pipeline
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="nl2sql-server")
+        self.per_user = per_user
+        self.timeout = timeout
+        # Bearer token -> user name; without keys users are told apart by their address
+        self.api_keys = api_keys or {}
+        # Peer addresses whose X-User header names the user (an authenticating proxy in front)
+        self.trusted_proxies = set(trusted_proxies or ())
+        # Only touched from the event loop, so no locks are needed
+        self.inflight = {}
+        self.active = collections.Counter()
+        self.counters = collections.Counter()
+        self.latencies = collections.deque(maxlen=1000)
+        self.started = time.time()
+        # Latest cache hit rates, token use, ... for /stats
+        self.metrics = {}
+        if pipeline.on_metric is None:
+            pipeline.on_metric = self.metrics.__setitem__
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        route = (scope["method"], scope["path"])
+        if route == ("GET", "/health"):
+            await self.respond(send, 200, {"status": "ok"})
+        elif route == ("GET", "/stats"):
+            await self.respond(send, 200, self.stats())
+        elif route == ("POST", "/query"):
+            await self.query(scope, receive, send)
+        elif scope["path"] in ("/health", "/stats", "/query"):
+            await self.respond(send, 405, {"error": "Method not allowed"})
+        else:
+            await self.respond(send, 404, {"error": "Not found"})
+
+    async def lifespan(self, receive, send):
+        """Handle ASGI startup and shutdown; the pipeline is closed on shutdown"""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def respond(self, send, status, body, content_type="application/json", headers=()):
+        """Send a complete response; dict bodies are encoded as JSON"""
+        if isinstance(body, dict):
+            body = json.dumps(body).encode("utf-8")
+        response_headers = [(b"content-type", content_type.encode("latin-1")),
+                            (b"content-length", str(len(body)).encode("latin-1"))]
+        response_headers.extend(headers)
+        await send({"type": "http.response.start", "status": status, "headers": response_headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def read_body(self, receive):
+        """The request body, or None when it is larger than MAX_BODY"""
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > MAX_BODY:
+                return None
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+    def identify(self, scope, headers):
+        """The user a request counts against, or None when an API key is required and missing"""
+        if self.api_keys:
+            authorization = headers.get(b"authorization", b"").decode("latin-1")
+            if not authorization.startswith("Bearer "):
+                return None
+            return self.api_keys.get(authorization[len("Bearer "):].strip())
+        client = scope.get("client")
+        address = client[0] if client else "anonymous"
+        # Anyone can send X-User, so it only counts when a trusted proxy set it
+        user = headers.get(b"x-user", b"").decode("latin-1").strip()
+        if user and address in self.trusted_proxies:
+            return user
+        return address
+
+    async def query(self, scope, receive, send):
+        """Answer one question, coalescing it with an identical one already in flight"""
+        start = time.perf_counter()
+        headers = dict(scope.get("headers", []))
+        user = self.identify(scope, headers)
+        if user is None:
+            await self.respond(send, 401, {"error": "A valid API key is required"},
+                               headers=[(b"www-authenticate", b"Bearer")])
+            return
+
+        body = await self.read_body(receive)
+        if body is None:
+            await self.respond(send, 413, {"error": f"Request body is larger than {MAX_BODY} bytes"})
+            return
+        try:
+            request = json.loads(body or b"{}")
+            question = request["question"].strip()
+        except (ValueError, KeyError, TypeError, AttributeError):
+            await self.respond(send, 400, {"error": 'Expected a JSON body like {"question": "..."}'})
+            return
+        if not question:
+            await self.respond(send, 400, {"error": "The question is empty"})
+            return
+        summarize = bool(request.get("summary", False))
+        arrow = request.get("format") == "arrow" or ARROW_TYPE in headers.get(b"accept", b"").decode("latin-1")
+        if arrow and pa is None:
+            await self.respond(send, 406, {"error": "Arrow responses need pyarrow installed on the server"})
+            return
+
+        if self.active[user] >= self.per_user:
+            self.counters["throttled"] += 1
+            await self.respond(send, 429, {"error": f"At most {self.per_user} questions may run at once per user"},
+                               headers=[(b"retry-after", b"1")])
+            return
+
+        self.active[user] += 1
+        self.counters["requests"] += 1
+        try:
+            result, coalesced = await asyncio.wait_for(self.answer(question, summarize), self.timeout)
+            # Encoding a large result is CPU work; keep it off the event loop
+            loop = asyncio.get_running_loop()
+            encode = arrow_body if arrow else json_body
+            payload = await loop.run_in_executor(self.executor, encode, result, coalesced)
+        except asyncio.TimeoutError:
+            self.counters["failed"] += 1
+            await self.respond(send, 504, {"error": f"No answer within {self.timeout} seconds"})
+            return
+        except Exception as e:
+            self.counters["failed"] += 1
+            await self.respond(send, 500, {"error": str(e)})
+            return
+        finally:
+            self.active[user] -= 1
+            if not self.active[user]:
+                del self.active[user]
+
+        self.latencies.append(time.perf_counter() - start)
+        # Questions the pipeline could not answer (rejected, failed SQL, ...) are unprocessable
+        status = 422 if result["error"] else 200
+        if result["error"]:
+            self.counters["failed"] += 1
+        await self.respond(send, status, payload, ARROW_TYPE if arrow else "application/json")
+
+    async def answer(self, question, summarize):
+        """Run the pipeline on the executor, sharing the run with identical questions in flight
+
+        Returns (result, coalesced).
+        """
+        key = (normalize_question(question), summarize)
+        future = self.inflight.get(key)
+        coalesced = future is not None
+        if coalesced:
+            self.counters["coalesced"] += 1
+        else:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.executor, self.pipeline.answer, question, summarize)
+            self.inflight[key] = future
+            # Removed when the run ends, even if every waiting request has given up on it
+            future.add_done_callback(lambda done: self.inflight.pop(key, None) if self.inflight.get(key) is done else None)
+        # A timed-out or disconnected request must not cancel the run the others are waiting for
+        result = await asyncio.shield(future)
+        return result, coalesced
+
+    def stats(self):
+        """Counters, latency percentiles and the pipeline's latest metrics"""
+        latencies = list(self.latencies)
+        return {
+            "uptime": time.time() - self.started,
+            "requests": self.counters["requests"],
+            "coalesced": self.counters["coalesced"],
+            "throttled": self.counters["throttled"],
+            "failed": self.counters["failed"],
+            "in_flight": len(self.inflight),
+            "users": len(self.active),
+            "latency_p50": percentile(latencies, 0.5),
+            "latency_p95": percentile(latencies, 0.95),
+            "metrics": dict(self.metrics)
+        }
+
+    def close(self):
+        """Stop accepting work and release the pipeline"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.pipeline.close()
+
+
+def server_settings(settings):
+    """The server section of the settings with defaults, enlarging the pool to one connection per worker"""
+    server = dict({"host": "127.0.0.1", "port": 8000, "workers": 8, "per_user": 2, "timeout": 300, "api_keys": {},
+                   "trusted_proxies": []},
+                  **settings.get("server", {}))
+    pool_settings = settings.setdefault("connection_pool", {})
+    pool_settings["size"] = max(pool_settings.get("size", 5), server["workers"])
+    return server
+
+
+def build_server(db_config, openai_api_key, settings):
+    """QueryServer over a new pipeline, configured from the server settings"""
+    server = server_settings(settings)
+    return QueryServer(
+        NL2SQLPipeline(db_config, openai_api_key, settings),
+        workers=server["workers"],
+        per_user=server["per_user"],
+        timeout=server["timeout"],
+        api_keys=server["api_keys"],
+        trusted_proxies=server["trusted_proxies"]
+    )
+
+
+def create_app(config_path=CONFIG_FILE):
+    """Build the ASGI application from the configuration file (for any ASGI server's --factory option)"""
+    return build_server(*read_config(config_path))
+
+
+async def call(app, method, path, body=b"", headers=()):
+    """Send one request straight to an ASGI app, without a network; returns (status, headers, body)"""
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "headers": [(b"content-type", b"application/json")] + list(headers),
+        "client": ("127.0.0.1", 0)
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    response = {"status": None, "headers": [], "body": b""}
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = message.get("headers", [])
+        else:
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    return response["status"], response["headers"], response["body"]
+
+
+async def load_test(app, questions, users=20, requests=500):
+    """Simulate users each sending questions one after another; returns throughput and latency figures"""
+    latencies = []
+    statuses = collections.Counter()
+    remaining = [requests]
+
+    async def user(index):
+        position = index
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            body = json.dumps({"question": questions[position % len(questions)]}).encode("utf-8")
+            position += 1
+            start = time.perf_counter()
+            status, _, _ = await call(app, "POST", "/query", body, [(b"x-user", f"user{index}".encode("latin-1"))])
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(index) for index in range(users)))
+    wall_time = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "users": users,
+        "wall_time": wall_time,
+        "requests_per_second": len(latencies) / wall_time if wall_time else 0.0,
+        "latency_p50": percentile(latencies, 0.5),
+        "latency_p95": percentile(latencies, 0.95),
+        "statuses": dict(statuses),
+        "coalesced": app.counters["coalesced"]
+    }
+
+
+def run_load_test(args, db_config, openai_api_key, settings):
+    """Load-test the service in-process against a sample database, with the model replaced by a replay client"""
+    # The benchmark harness (SQLite fixtures, replay client) is only needed here, not for serving
+    from nl2sql_bench import BenchPipeline, ReplayLLM, GOLD_FILE, read_gold, load_fixture, bench_settings
+
+    items = [item for item in read_gold(GOLD_FILE) if item["database"] == args.database]
+    if not items:
+        print(f"No benchmark questions for {args.database}", file=sys.stderr)
+        return 1
+    server = server_settings(settings)
+    llm_client = ReplayLLM({item["question"]: item.get("response", item["sql"]) for item in items},
+                           delay=args.llm_delay)
+    with tempfile.TemporaryDirectory(prefix="nl2sql_load_") as directory:
+        sqlite_path = None if args.mysql else load_fixture(args.database, directory)
+        pipeline = BenchPipeline(dict(db_config, database=args.database), openai_api_key,
+                                 bench_settings(settings, not args.mysql), sqlite_path=sqlite_path,
+                                 llm_client=llm_client)
+        # Each simulated user waits for its answer before asking again, so nobody is throttled; the
+        # in-process client stands in for a proxy that names the user in X-User
+        app = QueryServer(pipeline, workers=server["workers"], per_user=server["per_user"],
+                          trusted_proxies=["127.0.0.1"])
+        try:
+            summary = asyncio.run(load_test(app, [item["question"] for item in items], args.users, args.requests))
+        finally:
+            app.close()
+    print(f"Requests: {summary['requests']} from {summary['users']} users in {summary['wall_time']:.2f}s "
+          f"({summary['requests_per_second']:.1f} requests/s)")
+    print(f"Latency: p50 {summary['latency_p50'] * 1000:.1f}ms, p95 {summary['latency_p95'] * 1000:.1f}ms")
+    print("Statuses: " + ", ".join(f"{status}: {count}" for status, count in sorted(summary["statuses"].items())))
+    print(f"Coalesced: {summary['coalesced']}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the NL2SQL pipeline over HTTP (ASGI)")
+    parser.add_argument("--config", default=CONFIG_FILE, help="configuration file (default: %(default)s)")
+    parser.add_argument("--host", help="address to listen on (default: server.host or 127.0.0.1)")
+    parser.add_argument("--port", type=int, help="port to listen on (default: server.port or 8000)")
+    parser.add_argument("--load-test", action="store_true",
+                        help="instead of serving, load-test the service in-process with a replayed model")
+    parser.add_argument("--users", type=int, default=20, help="simulated users for --load-test")
+    parser.add_argument("--requests", type=int, default=500, help="requests sent by --load-test")
+    parser.add_argument("--llm-delay", type=float, default=0.0, help="seconds the replayed model takes per call")
+    parser.add_argument("--mysql", action="store_true",
+                        help="load-test against the configured MySQL server instead of a SQLite copy")
+    parser.add_argument("--database", default="nl2sql_test", help="sample database for --load-test")
+    args = parser.parse_args(argv)
+
+    db_config, openai_api_key, settings = read_config(args.config)
+    if args.load_test:
+        return run_load_test(args, db_config, openai_api_key, settings)
+
+    if uvicorn is None:
+        print("uvicorn is not installed (pip install uvicorn); any ASGI server can also run "
+              "nl2sql_server:create_app as a factory", file=sys.stderr)
+        return 1
+    server = server_settings(settings)
+    app = build_server(db_config, openai_api_key, settings)
+    uvicorn.run(app, host=args.host or server["host"], port=args.port or server["port"])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+import uuid
+import warnings
+
+# OpenTelemetry is optional: without it traces only go to the JSON-lines log
+try:
+    from opentelemetry import trace as otel_trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+except ImportError:
+    otel_trace = None
+
+
+class Trace:
+    """Timing spans for one question; spans may be added from any thread"""
+
+    def __init__(self, question):
+        self.trace_id = uuid.uuid4().hex
+        self.question = question
+        self.started = time.time()
+        self.origin = time.perf_counter()
+        self.duration = None
+        self.status = None
+        self.error = None
+        self.spans = []
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        """Time the enclosed block as one span; the yielded dict takes extra attributes"""
+        start = time.perf_counter()
+        error = None
+        try:
+            yield attributes
+        except BaseException as e:
+            error = f"{type(e).__name__}: {str(e)}"
+            raise
+        finally:
+            self.add(name, start, time.perf_counter() - start, error, attributes)
+
+    def add(self, name, start, duration, error=None, attributes=None):
+        """Record a span that started at perf_counter() value start"""
+        span = {
+            "name": name,
+            "offset": start - self.origin,
+            "duration": duration,
+            "thread": threading.current_thread().name
+        }
+        if error:
+            span["error"] = error
+        if attributes:
+            span["attributes"] = attributes
+        with self.lock:
+            self.spans.append(span)
+
+    def to_dict(self):
+        """JSON-serialisable form of the trace"""
+        with self.lock:
+            spans = sorted(self.spans, key=lambda span: span["offset"])
+        return {
+            "trace_id": self.trace_id,
+            "question": self.question,
+            "started": self.started,
+            "duration": self.duration,
+            "status": self.status,
+            "error": self.error,
+            "spans": spans
+        }
+
+
+class Tracer:
+    """Collects finished traces: keeps the last few for display, appends them to a JSON-lines log
+    and optionally exports them to an OpenTelemetry collector over OTLP/HTTP"""
+
+    def __init__(self, path=None, keep=20, max_bytes=10 * 1024 * 1024, otlp_endpoint=None, service_name="nl2sql"):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.recent = collections.deque(maxlen=keep)
+        self.lock = threading.Lock()
+
+        self.provider = None
+        self.otel_tracer = None
+        if otlp_endpoint:
+            if otel_trace is None:
+                warnings.warn("opentelemetry-sdk is not installed; traces are only written to the log")
+            else:
+                # Spans are sent in the background, never on the caller's thread
+                self.provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+                self.provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=otlp_endpoint)))
+                self.otel_tracer = self.provider.get_tracer("nl2sql")
+
+    def start(self, question):
+        """Begin a trace for one question"""
+        return Trace(question)
+
+    def finish(self, trace, status="ok", error=None):
+        """Close a trace and hand it to the log, the exporter and the recent list"""
+        trace.duration = time.perf_counter() - trace.origin
+        trace.status = status
+        trace.error = error
+        with self.lock:
+            self.recent.append(trace)
+            if self.path:
+                self.write(trace.to_dict())
+        if self.otel_tracer is not None:
+            self.export(trace)
+
+    def traces(self):
+        """The most recent finished traces, oldest first"""
+        with self.lock:
+            return list(self.recent)
+
+    def write(self, record):
+        """Append one trace to the log, starting a new file once it grows past max_bytes"""
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+        except OSError:
+            # Tracing must never break a query
+            pass
+
+    def export(self, trace):
+        """Replay a finished trace as OpenTelemetry spans with their recorded times"""
+        record = trace.to_dict()
+        start_ns = int(record["started"] * 1e9)
+        root = self.otel_tracer.start_span(
+            "nl2sql.question",
+            start_time=start_ns,
+            attributes={"nl2sql.question": record["question"], "nl2sql.status": record["status"]}
+        )
+        if record["error"]:
+            root.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR, record["error"]))
+        context = otel_trace.set_span_in_context(root)
+        for span in record["spans"]:
+            attributes = {"thread.name": span["thread"]}
+            attributes.update({f"nl2sql.{key}": value for key, value in span.get("attributes", {}).items()
+                               if isinstance(value, (str, bool, int, float))})
+            child = self.otel_tracer.start_span(
+                span["name"], context=context, start_time=start_ns + int(span["offset"] * 1e9), attributes=attributes)
+            if span.get("error"):
+                child.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR, span["error"]))
+            child.end(end_time=start_ns + int((span["offset"] + span["duration"]) * 1e9))
+        root.end(end_time=start_ns + int(record["duration"] * 1e9))
+
+    def close(self):
+        """Flush spans still waiting for the exporter"""
+        if self.provider is not None:
+            self.provider.shutdown()
+            self.provider = None
+            self.otel_tracer = None
@@ -0,0 +1,386 @@
+import argparse
+import re
+import sqlite3
+import sys
+import time
+
+
+# Statements the application may run
+ALLOWED_STATEMENTS = {"SELECT", "WITH", "SHOW"}
+
+# Keywords that modify data, take locks or write files; never allowed outside literals
+# (other statements are already excluded by the check on the first word)
+FORBIDDEN_KEYWORDS = {
+    "DELETE", "DROP", "UPDATE", "INSERT", "ALTER", "TRUNCATE", "CREATE", "RENAME",
+    "REPLACE", "GRANT", "REVOKE", "INTO", "OUTFILE", "DUMPFILE", "LOAD", "HANDLER",
+    "CALL", "LOCK", "UNLOCK", "KILL"
+}
+
+# Functions that stall the server, read files or take locks; rejected even if allowlisted
+DENIED_FUNCTIONS = {
+    "SLEEP", "BENCHMARK", "LOAD_FILE", "GET_LOCK", "RELEASE_LOCK", "RELEASE_ALL_LOCKS",
+    "IS_FREE_LOCK", "IS_USED_LOCK", "MASTER_POS_WAIT", "SOURCE_POS_WAIT",
+    "WAIT_FOR_EXECUTED_GTID_SET", "SYS_EVAL", "SYS_EXEC"
+}
+
+# Read-only MySQL functions a generated query may call
+ALLOWED_FUNCTIONS = {
+    # Aggregates and window functions
+    "COUNT", "SUM", "AVG", "MIN", "MAX", "GROUP_CONCAT", "STD", "STDDEV", "STDDEV_POP",
+    "STDDEV_SAMP", "VARIANCE", "VAR_POP", "VAR_SAMP", "BIT_AND", "BIT_OR", "BIT_XOR",
+    "JSON_ARRAYAGG", "JSON_OBJECTAGG", "ROW_NUMBER", "RANK", "DENSE_RANK", "PERCENT_RANK",
+    "CUME_DIST", "NTILE", "LAG", "LEAD", "FIRST_VALUE", "LAST_VALUE", "NTH_VALUE",
+    # Control flow and comparison
+    "IF", "IFNULL", "NULLIF", "COALESCE", "GREATEST", "LEAST", "ISNULL", "INTERVAL",
+    # Casts
+    "CAST", "CONVERT", "BINARY",
+    # Strings
+    "CONCAT", "CONCAT_WS", "LENGTH", "CHAR_LENGTH", "CHARACTER_LENGTH", "LOWER", "UPPER",
+    "LCASE", "UCASE", "SUBSTRING", "SUBSTR", "SUBSTRING_INDEX", "LEFT", "RIGHT", "TRIM",
+    "LTRIM", "RTRIM", "REPLACE", "LPAD", "RPAD", "REVERSE", "LOCATE", "INSTR", "POSITION",
+    "FORMAT", "REPEAT", "SPACE", "ASCII", "CHAR", "HEX", "UNHEX", "FIELD", "FIND_IN_SET",
+    "ELT", "STRCMP", "SOUNDEX", "REGEXP_LIKE", "REGEXP_REPLACE", "REGEXP_SUBSTR",
+    "REGEXP_INSTR", "QUOTE", "MD5", "SHA1", "SHA2", "CRC32",
+    # Numbers
+    "ABS", "CEIL", "CEILING", "FLOOR", "ROUND", "TRUNCATE", "MOD", "POW", "POWER", "SQRT",
+    "EXP", "LN", "LOG", "LOG10", "LOG2", "SIGN", "PI", "RAND", "DIV", "CONV", "DEGREES",
+    "RADIANS", "SIN", "COS", "TAN", "ASIN", "ACOS", "ATAN", "ATAN2", "COT",
+    # Dates and times
+    "NOW", "CURDATE", "CURRENT_DATE", "CURTIME", "CURRENT_TIME", "CURRENT_TIMESTAMP",
+    "SYSDATE", "UTC_DATE", "UTC_TIMESTAMP", "DATE", "TIME", "TIMESTAMP", "YEAR", "MONTH",
+    "DAY", "DAYOFMONTH", "DAYOFWEEK", "DAYOFYEAR", "DAYNAME", "MONTHNAME", "WEEK",
+    "WEEKDAY", "WEEKOFYEAR", "YEARWEEK", "QUARTER", "HOUR", "MINUTE", "SECOND",
+    "MICROSECOND", "DATE_ADD", "DATE_SUB", "ADDDATE", "SUBDATE", "ADDTIME", "SUBTIME",
+    "DATEDIFF", "TIMEDIFF", "TIMESTAMPDIFF", "TIMESTAMPADD", "DATE_FORMAT", "TIME_FORMAT",
+    "STR_TO_DATE", "FROM_UNIXTIME", "UNIX_TIMESTAMP", "EXTRACT", "LAST_DAY", "MAKEDATE",
+    "MAKETIME", "PERIOD_ADD", "PERIOD_DIFF", "TO_DAYS", "FROM_DAYS", "TO_SECONDS",
+    "SEC_TO_TIME", "TIME_TO_SEC", "CONVERT_TZ",
+    # JSON
+    "JSON_EXTRACT", "JSON_UNQUOTE", "JSON_OBJECT", "JSON_ARRAY", "JSON_LENGTH",
+    "JSON_CONTAINS", "JSON_KEYS", "JSON_VALUE", "JSON_TYPE", "JSON_VALID", "JSON_SEARCH"
+}
+
+# Words followed by '(' that are syntax rather than function calls
+NON_FUNCTION_KEYWORDS = {
+    "IN", "EXISTS", "ANY", "ALL", "SOME", "AS", "ON", "USING", "FROM", "JOIN", "SELECT",
+    "WHERE", "AND", "OR", "NOT", "OVER", "VALUES", "ROW", "WITH", "RECURSIVE", "UNION",
+    "INTERSECT", "EXCEPT", "WINDOW", "PARTITION", "BY", "WHEN", "THEN", "ELSE", "CASE",
+    "LATERAL", "IS", "LIKE", "BETWEEN", "HAVING", "USE", "FORCE", "IGNORE", "INDEX",
+    "KEY", "DISTINCT", "RETURNING", "MATCH", "AGAINST", "LIMIT", "OFFSET", "COLUMNS",
+    # Type names in CAST(... AS DECIMAL(10, 2)) and similar
+    "DECIMAL", "NUMERIC", "DEC", "FLOAT", "DOUBLE", "REAL", "INT", "INTEGER", "SIGNED",
+    "UNSIGNED", "VARCHAR", "NCHAR", "DATETIME", "JSON"
+}
+
+# Words that end a FROM list (so what follows is not a table name)
+FROM_TERMINATORS = {
+    "WHERE", "GROUP", "HAVING", "ORDER", "LIMIT", "UNION", "INTERSECT", "EXCEPT", "WINDOW",
+    "ON", "USING", "JOIN", "INNER", "LEFT", "RIGHT", "CROSS", "NATURAL", "STRAIGHT_JOIN",
+    "FULL", "OUTER", "FOR", "LOCK", "INTO", "PARTITION", "USE", "FORCE", "IGNORE"
+}
+
+# Keywords upper-cased by canonical_sql (identifiers keep their case)
+SQL_KEYWORDS = ALLOWED_STATEMENTS | NON_FUNCTION_KEYWORDS | FROM_TERMINATORS | {
+    "DESC", "ASC", "NULL", "TRUE", "FALSE", "END", "DISTINCTROW", "ROLLUP", "ROWS",
+    "RANGE", "PRECEDING", "FOLLOWING", "UNBOUNDED", "CURRENT", "XOR", "DIV", "MOD",
+    "REGEXP", "RLIKE", "ESCAPE", "DUAL", "SQL_CALC_FOUND_ROWS"
+}
+
+# Schemas that expose server internals
+SYSTEM_SCHEMAS = {"information_schema", "mysql", "performance_schema", "sys"}
+
+TOKEN_PATTERN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<comment>--[ \t][^\n]*|--$|\#[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+  | (?P<quoted>`(?:[^`]|``)*`)
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<variable>@@?[\w.$]+|@'[^']*'|@`[^`]*`)
+  | (?P<word>[A-Za-z_$][\w$]*)
+  | (?P<operator>:=|<=>|<>|!=|<=|>=|<<|>>|&&|\|\||->>|->|[-+*/%=<>!~^&|])
+  | (?P<punct>[(),.;?])
+""", re.VERBOSE | re.DOTALL)
+
+
+def tokenize_sql(sql):
+    """Split MySQL text into (kind, value, position) tokens; raises ValueError on unlexable input"""
+    tokens = []
+    position = 0
+    length = len(sql)
+    while position < length:
+        match = TOKEN_PATTERN.match(sql, position)
+        if match is None:
+            raise ValueError(position)
+        kind = match.lastgroup
+        if kind not in ("space", "comment") or match.group().startswith("/*!"):
+            tokens.append((kind, match.group(), position))
+        position = match.end()
+    return tokens
+
+
+def reason(code, message, position=None):
+    """One structured validation failure"""
+    return {"code": code, "message": message, "position": position}
+
+
+class SQLValidator:
+    """Tokenizer-based safety check for generated SQL, returning structured reasons"""
+
+    def __init__(self, extra_functions=(), denied_functions=(), check_tables=True):
+        self.allowed_functions = ALLOWED_FUNCTIONS | {name.upper() for name in extra_functions}
+        self.denied_functions = DENIED_FUNCTIONS | {name.upper() for name in denied_functions}
+        self.check_tables = check_tables
+
+    def validate(self, sql, tables=None):
+        """Return a list of reasons the SQL may not run (empty when it is safe)
+
+        tables, when given, is the set of table names the query may read.
+        """
+        try:
+            tokens = tokenize_sql(sql)
+        except ValueError as e:
+            position = e.args[0]
+            return [reason("syntax", f"Unterminated or unrecognised text near position {position}.", position)]
+
+        if not tokens:
+            return [reason("empty", "The SQL statement is empty.")]
+
+        reasons = []
+
+        # Executable comments (/*! ... */) would hide arbitrary SQL from the checks below
+        for kind, value, position in tokens:
+            if kind == "comment":
+                reasons.append(reason("executable_comment", "MySQL executable comments are not allowed.", position))
+        tokens = [token for token in tokens if token[0] != "comment"]
+
+        # A single statement, optionally followed by one semicolon
+        for index, (kind, value, position) in enumerate(tokens):
+            if value == ";" and index != len(tokens) - 1:
+                reasons.append(reason("multiple_statements", "Multiple SQL statements are not allowed.", position))
+                break
+        if tokens[-1][1] == ";":
+            tokens = tokens[:-1]
+        if not tokens:
+            return reasons + [reason("empty", "The SQL statement is empty.")]
+
+        first = next((token for token in tokens if token[1] != "("), tokens[0])
+        if first[0] != "word" or first[1].upper() not in ALLOWED_STATEMENTS:
+            reasons.append(reason("statement_type", "Only SELECT, WITH and SHOW queries are allowed.", first[2]))
+
+        defined = self.defined_names(tokens)
+        reasons.extend(self.check_words(tokens, defined))
+        if self.check_tables and tables is not None:
+            reasons.extend(self.check_table_refs(tokens, tables, defined))
+        return reasons
+
+    def defined_names(self, tokens):
+        """Names the query defines itself: CTEs and named windows ("name AS (" / "name (cols) AS (")"""
+        defined = set()
+        for index, (kind, value, position) in enumerate(tokens):
+            if kind not in ("word", "quoted") or index + 2 >= len(tokens):
+                continue
+            following = index + 1
+            if tokens[following][1] == "(":
+                following = self.closing_paren(tokens, following) + 1
+            if (following + 1 < len(tokens) and tokens[following][1].upper() == "AS"
+                    and tokens[following + 1][1] == "("):
+                defined.add(self.identifier(value))
+        return defined
+
+    def closing_paren(self, tokens, index):
+        """Index of the ')' matching the '(' at index (or the last token if unbalanced)"""
+        depth = 0
+        for position in range(index, len(tokens)):
+            if tokens[position][1] == "(":
+                depth += 1
+            elif tokens[position][1] == ")":
+                depth -= 1
+                if depth == 0:
+                    return position
+        return len(tokens) - 1
+
+    def check_words(self, tokens, defined):
+        """Forbidden keywords, system schemas and function calls outside the allowlist"""
+        reasons = []
+        for index, (kind, value, position) in enumerate(tokens):
+            following = tokens[index + 1][1] if index + 1 < len(tokens) else ""
+            if kind == "quoted" or kind == "word":
+                if following == "." and self.identifier(value) in SYSTEM_SCHEMAS:
+                    reasons.append(reason("system_schema", f"Queries on {self.identifier(value)} are not allowed.", position))
+            if kind != "word":
+                continue
+            word = value.upper()
+
+            if following == "(" and word not in NON_FUNCTION_KEYWORDS:
+                if word in self.denied_functions:
+                    reasons.append(reason("denied_function", f"The {word}() function is not allowed.", position))
+                elif word not in self.allowed_functions and value.lower() not in defined:
+                    reasons.append(reason("function_not_allowed", f"The {word}() function is not on the allowlist.", position))
+                continue
+
+            if index and tokens[index - 1][1] == ".":
+                # Qualified column or table name, not a keyword
+                continue
+            if word in FORBIDDEN_KEYWORDS:
+                reasons.append(reason("forbidden_keyword", f"For security reasons, {word} is not allowed.", position))
+            elif word == "FOR" and following.upper() == "SHARE":
+                # A locking read like FOR UPDATE; SHARE alone is an ordinary column name
+                reasons.append(reason("forbidden_keyword", "For security reasons, FOR SHARE is not allowed.", position))
+        return reasons
+
+    def check_table_refs(self, tokens, tables, defined):
+        """Table names after FROM/JOIN must be known tables or names defined by the query itself"""
+        known = {name.lower() for name in tables}
+        reasons = []
+        for position, schema, name in self.table_refs(tokens):
+            if schema is not None and schema in SYSTEM_SCHEMAS:
+                # Already reported by check_words
+                continue
+            elif schema is None and name in defined:
+                continue
+            elif name not in known:
+                reasons.append(reason("unknown_table", f"Table {name} is not in the database schema.", position))
+        return reasons
+
+    def table_refs(self, tokens):
+        """Yield (position, schema, table) for each table named in a FROM list or JOIN"""
+        index = 0
+        count = len(tokens)
+        # One entry per open parenthesis: True when it holds a function's arguments, whose FROM
+        # (EXTRACT(YEAR FROM d), TRIM(LEADING 'x' FROM s)) names no table
+        calls = []
+        while index < count:
+            kind, value, _ = tokens[index]
+            if value == "(":
+                previous = tokens[index - 1] if index else None
+                calls.append(previous is not None and previous[0] == "word"
+                             and previous[1].upper() not in NON_FUNCTION_KEYWORDS)
+                index += 1
+                continue
+            if value == ")":
+                if calls:
+                    calls.pop()
+                index += 1
+                continue
+            word = value.upper() if kind == "word" else None
+            if word not in ("FROM", "JOIN", "STRAIGHT_JOIN") or (calls and calls[-1]):
+                index += 1
+                continue
+            index += 1
+            # A FROM list may name several comma-separated tables
+            while index < count:
+                if tokens[index][1] == "(":
+                    # Derived table or parenthesised join; its contents are scanned separately
+                    break
+                if tokens[index][0] not in ("word", "quoted"):
+                    break
+                if tokens[index][0] == "word" and tokens[index][1].upper() in FROM_TERMINATORS | {"LATERAL", "DUAL"}:
+                    break
+                position = tokens[index][2]
+                name = self.identifier(tokens[index][1])
+                schema = None
+                if index + 2 < count and tokens[index + 1][1] == "." and tokens[index + 2][0] in ("word", "quoted"):
+                    schema, name = name, self.identifier(tokens[index + 2][1])
+                    index += 2
+                yield position, schema, name
+                index += 1
+
+                # Optional alias
+                if index < count and tokens[index][0] == "word" and tokens[index][1].upper() == "AS":
+                    index += 1
+                if (index < count and tokens[index][0] in ("word", "quoted")
+                        and tokens[index][1].upper() not in FROM_TERMINATORS):
+                    index += 1
+                if index < count and tokens[index][1] == "," and word == "FROM":
+                    index += 1
+                    continue
+                break
+
+    def identifier(self, value):
+        """Lower-case identifier text without backticks"""
+        if value.startswith("`"):
+            value = value[1:-1].replace("``", "`")
+        return value.lower()
+
+
+def referenced_tables(sql, known=None):
+    """Lower-case names of the database tables a query reads (CTE names excluded)
+
+    With known (the schema's table names), any identifier naming a known table also counts,
+    which errs on the side of including too many tables rather than too few.
+    """
+    validator = SQLValidator()
+    tokens = [token for token in tokenize_sql(sql) if token[0] != "comment"]
+    defined = validator.defined_names(tokens)
+    tables = {name for position, schema, name in validator.table_refs(tokens)
+              if schema is not None or name not in defined}
+    if known is not None:
+        known = {name.lower() for name in known}
+        tables |= {validator.identifier(value) for kind, value, position in tokens
+                   if kind in ("word", "quoted") and validator.identifier(value) in known}
+    return tables
+
+
+def canonical_sql(sql):
+    """SQL with comments, optimizer hints, redundant whitespace and the final ';' removed, keywords upper-cased"""
+    parts = []
+    for kind, value, position in tokenize_sql(sql):
+        if kind == "comment":
+            continue
+        if kind == "word" and value.upper() in SQL_KEYWORDS:
+            value = value.upper()
+        parts.append(value)
+    if parts and parts[-1] == ";":
+        parts.pop()
+    return " ".join(parts)
+
+
+def quote_identifier(name):
+    """A table or column name as a MySQL identifier"""
+    return "`" + str(name).replace("`", "``") + "`"
+
+
+def read_corpus(path):
+    """Statements to benchmark: generated SQL from the SQL cache file, or a ';'-separated text file"""
+    if path.endswith((".sqlite", ".db")):
+        db = sqlite3.connect(path)
+        try:
+            return [row[0] for row in db.execute("SELECT sql FROM sql_cache")]
+        finally:
+            db.close()
+    with open(path, "r", encoding="utf-8") as f:
+        return [statement.strip() for statement in f.read().split(";\n") if statement.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the SQL validator on a corpus of generated queries")
+    parser.add_argument("corpus", help="SQL cache file (.sqlite) or a file of ';'-terminated statements")
+    parser.add_argument("--repeat", type=int, default=100, help="passes over the corpus (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    statements = read_corpus(args.corpus)
+    if not statements:
+        print("No statements found in " + args.corpus, file=sys.stderr)
+        return 1
+
+    validator = SQLValidator()
+    rejected = {}
+    for statement in statements:
+        for item in validator.validate(statement):
+            rejected[item["code"]] = rejected.get(item["code"], 0) + 1
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for statement in statements:
+            validator.validate(statement)
+    elapsed = time.perf_counter() - start
+
+    print(f"Statements: {len(statements)}")
+    print(f"Validation: {elapsed / (args.repeat * len(statements)) * 1e6:.1f} us per statement")
+    for code, count in sorted(rejected.items()):
+        print(f"  {code}: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
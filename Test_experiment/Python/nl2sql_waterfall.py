@@ -0,0 +1,80 @@
+import tkinter as tk
+from tkinter import ttk
+
+
+# Bar colour per pipeline stage; unknown stages are drawn in grey
+STAGE_COLOURS = {
+    "schema": "#8da0cb",
+    "generate": "#66c2a5",
+    "validate": "#a6d854",
+    "preflight": "#ffd92f",
+    "execute": "#fc8d62",
+    "repair": "#e78ac3",
+    "display": "#b3b3b3",
+    "chart": "#80b1d3",
+    "draw": "#bebada",
+    "summary": "#e5c494"
+}
+
+
+class WaterfallView(ttk.Frame):
+    """Waterfall of the stage spans of the most recent questions, newest at the top"""
+
+    def __init__(self, master, row_height=18, label_width=90):
+        super().__init__(master)
+        self.row_height = row_height
+        self.label_width = label_width
+        self.traces = []
+
+        self.canvas = tk.Canvas(self, background="white", highlightthickness=0)
+        scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.canvas.bind("<Configure>", lambda event: self.redraw())
+
+    def set_traces(self, traces):
+        """Show these finished traces (oldest first)"""
+        self.traces = list(traces)
+        self.redraw()
+
+    def redraw(self):
+        """Draw one block per trace: a heading line, then one bar per span on a shared time axis"""
+        self.canvas.delete("all")
+        width = max(self.canvas.winfo_width(), 400)
+        # Room on the right for the duration text
+        bar_space = width - self.label_width - 70
+        half = self.row_height / 2
+        y = 4
+
+        if not self.traces:
+            self.canvas.create_text(8, y + half, text="Stage timings appear here after a query has run",
+                                    anchor=tk.W, fill="gray")
+
+        for trace in reversed(self.traces):
+            question = trace.question if len(trace.question) <= 80 else trace.question[:77] + "..."
+            heading = f"{question}  -  {trace.duration * 1000:.0f} ms"
+            if trace.status != "ok":
+                heading += f" ({trace.status})"
+            self.canvas.create_text(4, y + half, text=heading, anchor=tk.W, font="TkHeadingFont")
+            y += self.row_height
+
+            scale = bar_space / max(trace.duration, 1e-6)
+            for span in trace.to_dict()["spans"]:
+                x0 = self.label_width + span["offset"] * scale
+                x1 = x0 + max(span["duration"] * scale, 1)
+                self.canvas.create_text(12, y + half, text=span["name"], anchor=tk.W)
+                self.canvas.create_rectangle(
+                    x0, y + 3, x1, y + self.row_height - 3,
+                    fill=STAGE_COLOURS.get(span["name"], "#cccccc"),
+                    outline="red" if span.get("error") else ""
+                )
+                self.canvas.create_text(x1 + 4, y + half, text=f"{span['duration'] * 1000:.0f} ms",
+                                        anchor=tk.W, fill="gray")
+                y += self.row_height
+
+            y += half
+            self.canvas.create_line(4, y, width - 4, y, fill="#dddddd")
+            y += half
+
+        self.canvas.configure(scrollregion=(0, 0, width, y))
@@ -0,0 +1,30 @@
+import pytest
+
+from nl2sql_batch import read_questions
+
+
+def test_missing_ids_are_numbered(tmp_path):
+    path = tmp_path / "questions.jsonl"
+    path.write_text('{"id": "a", "question": "q1"}\n{"question": "q2"}\n', encoding="utf-8")
+    assert read_questions(str(path)) == [("a", "q1"), ("2", "q2")]
+
+
+def test_duplicate_ids_are_rejected(tmp_path):
+    path = tmp_path / "questions.jsonl"
+    path.write_text('{"id": "a", "question": "q1"}\n{"id": "a", "question": "q2"}\n', encoding="utf-8")
+    with pytest.raises(ValueError, match="share the id 'a'"):
+        read_questions(str(path))
+
+
+def test_ids_sharing_a_file_name_are_rejected(tmp_path):
+    path = tmp_path / "questions.csv"
+    path.write_text("id,question\na/b,q1\na_b,q2\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="a_b"):
+        read_questions(str(path))
+
+
+def test_number_clashing_with_an_explicit_id_is_rejected(tmp_path):
+    path = tmp_path / "questions.jsonl"
+    path.write_text('{"id": "2", "question": "q1"}\n{"question": "q2"}\n', encoding="utf-8")
+    with pytest.raises(ValueError):
+        read_questions(str(path))
@@ -0,0 +1,121 @@
+import contextlib
+import sqlite3
+import time
+
+import pandas as pd
+import pytest
+
+import nl2sql_cache
+from nl2sql_cache import QuestionCache, ResultCache
+from nl2sql_pipeline import NL2SQLPipeline
+
+
+def test_question_cache_hit_on_normalised_question():
+    cache = QuestionCache()
+    cache.put("How many orders?", "fp", "model", "SELECT COUNT(*) FROM orders")
+    assert cache.get("  how many   ORDERS ", "fp", "model") == "SELECT COUNT(*) FROM orders"
+    assert cache.get("How many orders?", "other", "model") is None
+    assert cache.get("How many orders?", "fp", "other") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_question_cache_ttl_and_discard(monkeypatch):
+    cache = QuestionCache(ttl=60)
+    cache.put("q", "fp", "m", "SELECT 1")
+    cache.put("r", "fp", "m", "SELECT 2")
+    cache.discard("r", "fp", "m")
+    assert cache.get("r", "fp", "m") is None
+    now = time.time()
+    monkeypatch.setattr(nl2sql_cache.time, "time", lambda: now + 61)
+    assert cache.get("q", "fp", "m") is None
+
+
+def test_question_cache_persists_across_instances(tmp_path):
+    path = str(tmp_path / "sql_cache.sqlite")
+    cache = QuestionCache(path=path)
+    cache.put("q", "fp", "m", "SELECT 1")
+    cache.close()
+    cache = QuestionCache(path=path)
+    assert cache.get("q", "fp", "m") == "SELECT 1"
+    cache.close()
+
+
+def frame(count):
+    return pd.DataFrame({"id": list(range(count)), "name": [f"n{index}" for index in range(count)]})
+
+
+def test_result_cache_keys_on_canonical_sql():
+    cache = ResultCache()
+    cache.put("select *  from orders;", "db", frame(3), ["orders"], {"orders": "v1"})
+    df = cache.get("SELECT * -- every column\nFROM orders", "db")
+    assert df is not None and df.equals(frame(3))
+    assert cache.get("SELECT * FROM orders", "other_db") is None
+
+
+def test_result_cache_misses_when_a_table_changed():
+    cache = ResultCache()
+    cache.put("SELECT * FROM orders", "db", frame(3), ["orders"], {"orders": "v1"})
+    assert cache.get("SELECT * FROM orders", "db", lambda tables: {"orders": "v1"}) is not None
+    assert cache.get("SELECT * FROM orders", "db", lambda tables: {"orders": "v2"}) is None
+    # The stale entry is gone for good
+    assert cache.get("SELECT * FROM orders", "db") is None
+
+
+def test_result_cache_ttl(monkeypatch):
+    cache = ResultCache(ttl=60)
+    cache.put("SELECT * FROM orders", "db", frame(3), ["orders"], {})
+    now = time.time()
+    monkeypatch.setattr(nl2sql_cache.time, "time", lambda: now + 61)
+    assert cache.get("SELECT * FROM orders", "db") is None
+
+
+def test_result_cache_spill_round_trip(tmp_path):
+    pytest.importorskip("pyarrow")
+    size = ResultCache().serialize(frame(100))["size"]
+    cache = ResultCache(max_bytes=size + 1, spill_dir=str(tmp_path), max_entry_fraction=1.0)
+    cache.put("SELECT * FROM a", "db", frame(100), ["a"], {})
+    cache.put("SELECT * FROM b", "db", frame(100), ["b"], {})
+    # The first result was evicted to a Parquet file
+    assert len(list(tmp_path.glob("result_*.parquet"))) == 1
+
+    df = cache.get("SELECT * FROM a", "db")
+    assert df.equals(frame(100))
+    # Promoted back into memory, which spills the other one
+    assert list(cache.entries) == [cache.make_key("SELECT * FROM a", "db")]
+    assert cache.get("SELECT * FROM b", "db").equals(frame(100))
+    cache.close()
+    assert not list(tmp_path.glob("result_*.parquet"))
+
+
+class Pool:
+    """One in-memory SQLite database standing in for MySQL"""
+
+    def __init__(self):
+        self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self.conn.execute("CREATE TABLE orders (id INTEGER)")
+        self.conn.execute("INSERT INTO orders VALUES (1)")
+
+    @contextlib.contextmanager
+    def connection(self, timeout=None):
+        yield self.conn
+
+    def close(self):
+        self.conn.close()
+
+
+def test_pipeline_serves_repeats_until_update_time_changes():
+    settings = {"result_cache": {"spill": False}, "query_limits": {"streaming": False}}
+    pipeline = NL2SQLPipeline({"host": "h", "port": 1, "database": "db"}, "key", settings)
+    pool = Pool()
+    pipeline.get_connection_pool = lambda: pool
+    versions = {"orders": "2024-01-01 00:00:00"}
+    pipeline.table_versions = lambda tables: {table: versions.get(table) for table in tables}
+
+    assert len(pipeline.execute_sql("SELECT id FROM orders")) == 1
+    pool.conn.execute("INSERT INTO orders VALUES (2)")
+    # Same UPDATE_TIME: served from the cache
+    assert len(pipeline.execute_sql("select id from orders;")) == 1
+    versions["orders"] = "2024-01-01 00:00:05"
+    assert len(pipeline.execute_sql("SELECT id FROM orders")) == 2
+    assert (pipeline.result_cache.hits, pipeline.result_cache.misses) == (1, 2)
+    pool.close()
@@ -0,0 +1,63 @@
+from nl2sql_db import StreamingQuery
+
+
+class Cursor:
+    description = [("id",)]
+
+    def __init__(self, count):
+        self.rows = [(index,) for index in range(count)]
+
+    def execute(self, sql):
+        pass
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class Connection:
+    connection_id = 1
+
+    def __init__(self, count):
+        self.count = count
+
+    def cursor(self, buffered=True, raw=False):
+        return Cursor(self.count)
+
+
+class Pool:
+    def __init__(self, count):
+        self.count = count
+        self.broken = None
+
+    def acquire(self):
+        return Connection(self.count)
+
+    def release(self, conn, broken=False):
+        self.broken = broken
+
+
+def run(count, max_rows, chunk_size):
+    pool = Pool(count)
+    query = StreamingQuery(pool, "SELECT id FROM t", chunk_size=chunk_size, max_rows=max_rows, columnar=False)
+    # A capped read kills the statement; there is no server to kill it on
+    query.kill = lambda: None
+    rows = sum(len(chunk) for chunk in query.chunks())
+    return rows, query.truncated, pool.broken
+
+
+def test_result_of_exactly_max_rows_is_complete():
+    assert run(10, 10, 5) == (10, False, False)
+    assert run(10, 10, 20) == (10, False, False)
+
+
+def test_result_over_max_rows_is_truncated():
+    assert run(11, 10, 5) == (10, True, True)
+    assert run(11, 10, 20) == (10, True, True)
+
+
+def test_no_cap():
+    assert run(7, 0, 3) == (7, False, False)
@@ -0,0 +1,92 @@
+import contextlib
+import os
+import xml.etree.ElementTree as ElementTree
+import zipfile
+
+import pytest
+
+from nl2sql_export import ResultExport, progress_text
+
+
+ROWS = [(1, "alpha", 2.5), (2, "beta", None), (3, "gamma", 7.25)]
+
+
+class Cursor:
+    description = [("id",), ("name",), ("amount",)]
+
+    def __init__(self):
+        self.rows = list(ROWS)
+
+    def execute(self, sql):
+        pass
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class Connection:
+    connection_id = 1
+
+    def cursor(self, buffered=True, raw=False):
+        return Cursor()
+
+
+class Pool:
+    def acquire(self):
+        return Connection()
+
+    def release(self, conn, broken=False):
+        pass
+
+    @contextlib.contextmanager
+    def connection(self):
+        yield Connection()
+
+
+class Pipeline:
+    settings = {"export": {"chunk_size": 2}, "query_limits": {"columnar": False}}
+
+    def check_sql(self, sql):
+        return []
+
+    def get_connection_pool(self):
+        return Pool()
+
+
+def sheet_rows(path):
+    """Cell texts of the first worksheet, row by row"""
+    namespace = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+    with zipfile.ZipFile(path) as workbook:
+        root = ElementTree.fromstring(workbook.read("xl/worksheets/sheet1.xml"))
+    return [[cell.findtext(f"{namespace}v") or cell.findtext(f"{namespace}is/{namespace}t")
+             for cell in row.iter(f"{namespace}c")]
+            for row in root.iter(f"{namespace}row")]
+
+
+def test_xlsx_round_trip_with_progress(tmp_path):
+    pytest.importorskip("xlsxwriter")
+    path = str(tmp_path / "out.xlsx")
+    progress = []
+    export = ResultExport(Pipeline(), "SELECT id, name, amount FROM t", path,
+                          on_progress=lambda *args: progress.append(args))
+    assert export.run() == 3
+
+    assert [rows for rows, size, seconds in progress] == [2, 3]
+    assert all(progress_text(*args) for args in progress)
+    assert not os.path.exists(path + ".part")
+    assert sheet_rows(path) == [["id", "name", "amount"], ["1", "alpha", "2.5"], ["2", "beta"], ["3", "gamma", "7.25"]]
+
+
+def test_csv_progress_reports_bytes(tmp_path):
+    path = str(tmp_path / "out.csv")
+    sizes = []
+    ResultExport(Pipeline(), "SELECT id, name, amount FROM t", path,
+                 on_progress=lambda rows, size, seconds: sizes.append(size)).run()
+    assert sizes[-1] is not None
+    with open(path, encoding="utf-8") as f:
+        # pyarrow quotes the header, pandas does not
+        assert f.readline().strip().replace('"', "") == "id,name,amount"
@@ -0,0 +1,36 @@
+from nl2sql_guard import CostGuard
+
+
+def test_limit_after_trailing_comment():
+    guard = CostGuard(default_limit=100, max_execution_time=0)
+    for sql in ("SELECT * FROM t -- all", "SELECT * FROM t # all", "SELECT * FROM t; -- all", "SELECT * FROM t /* all */;"):
+        assert guard.rewrite(sql) == ("SELECT * FROM t LIMIT 100", ["LIMIT 100 added"])
+
+
+def test_limit_lowered_before_trailing_comment():
+    guard = CostGuard(max_limit=100, max_execution_time=0)
+    assert guard.rewrite("SELECT * FROM t LIMIT 5000 -- everything") == \
+        ("SELECT * FROM t LIMIT 100", ["LIMIT 5000 lowered to 100"])
+
+
+def test_time_limit_hint():
+    sql, notes = CostGuard(default_limit=10, max_execution_time=2).rewrite("SELECT a FROM t\n-- done")
+    assert sql == "SELECT /*+ MAX_EXECUTION_TIME(2000) */ a FROM t LIMIT 10"
+
+
+def test_leading_comment_is_guarded():
+    guard = CostGuard(default_limit=100, max_execution_time=2)
+    for sql in ("-- c\nSELECT * FROM orders", "/* x */ SELECT * FROM orders", "# c\nSELECT * FROM orders -- end"):
+        assert guard.explainable(sql)
+        assert guard.rewrite(sql) == ("SELECT /*+ MAX_EXECUTION_TIME(2000) */ * FROM orders LIMIT 100",
+                                      ["LIMIT 100 added"])
+
+
+def test_limit_before_locking_clause():
+    guard = CostGuard(default_limit=100, max_execution_time=0)
+    for clause in ("FOR UPDATE", "FOR SHARE", "LOCK IN SHARE MODE"):
+        assert guard.rewrite(f"SELECT * FROM orders {clause}")[0] == f"SELECT * FROM orders LIMIT 100 {clause}"
+
+
+def test_show_is_not_explainable():
+    assert not CostGuard().explainable("-- c\nSHOW TABLES")
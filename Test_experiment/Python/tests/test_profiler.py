@@ -0,0 +1,38 @@
+import nl2sql_profiler
+from nl2sql_profiler import SchemaProfiler
+
+
+class Catalog:
+    """Catalog whose schema gains a table every time it is read, as if refreshed in between"""
+
+    def __init__(self):
+        self.tables = {"a": [("id", "int")], "b": [("id", "int")]}
+        self.profiles = {}
+        self.row_counts = {}
+
+    def profile_state(self):
+        state = dict(self.tables), dict(self.profiles)
+        self.tables[f"new{len(self.tables)}"] = [("id", "int")]
+        return state
+
+    def set_profile(self, table_name, profile):
+        self.profiles[table_name] = profile
+
+
+class Profiler(SchemaProfiler):
+    def profile_table(self, table_name, columns):
+        if table_name == "a":
+            raise ValueError("bad table")
+        self.stopping.set()
+        return {"profiled": 0, "column_names": [name for name, _ in columns], "columns": {}}
+
+
+def test_failure_and_schema_change_do_not_stop_the_loop(monkeypatch):
+    monkeypatch.setattr(nl2sql_profiler, "CHECK_INTERVAL", 0)
+    catalog = Catalog()
+    profiler = Profiler(catalog, None, "db", pause=0)
+    profiler.run()
+
+    assert profiler.failed == 1
+    assert catalog.profiles["a"]["error"] == "bad table"
+    assert "b" in catalog.profiles
@@ -0,0 +1,90 @@
+import contextlib
+import sqlite3
+
+import pytest
+
+from nl2sql_pipeline import NL2SQLPipeline
+
+
+class Pool:
+    """One in-memory SQLite database standing in for MySQL"""
+
+    def __init__(self):
+        self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self.conn.execute("CREATE TABLE orders (id INTEGER, name TEXT)")
+        self.conn.execute("INSERT INTO orders VALUES (1, 'abc')")
+
+    @contextlib.contextmanager
+    def connection(self, timeout=None):
+        yield self.conn
+
+    def close(self):
+        self.conn.close()
+
+
+class Catalog:
+    """Schema catalog with a single table"""
+
+    tables = {"orders": [("id", "int"), ("name", "varchar(20)")]}
+    fingerprint = "fp"
+
+    def get_relevant_schema(self, question, top_k=4, token_budget=800, include=None):
+        self.include = include
+        return "Table: orders\nColumns: id int, name varchar(20)", {}
+
+
+class StubLLM:
+    """Replies with canned statements in turn, like the bench's ReplayLLM"""
+
+    model = "stub"
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.prompts = []
+
+    def complete(self, messages, purpose=None, **kwargs):
+        self.prompts.append(messages[-1]["content"])
+        return self.replies.pop(0), {"prompt_tokens": 10, "completion_tokens": 5}
+
+    def usage_text(self):
+        return "Tokens: 15"
+
+
+def make_pipeline(*replies):
+    settings = {
+        "cost_guard": {"enabled": False},
+        "sql_cache": {"enabled": False},
+        "result_cache": {"enabled": False},
+        "few_shot": {"enabled": False},
+        "schema_profile": {"enabled": False},
+        "query_limits": {"streaming": False}
+    }
+    pipeline = NL2SQLPipeline({"host": "h", "port": 1, "database": "db"}, "key", settings)
+    pool = Pool()
+    catalog = Catalog()
+    pipeline.get_connection_pool = lambda: pool
+    pipeline.schema_catalog = catalog
+    pipeline.get_schema_catalog = lambda: catalog
+    pipeline.llm_client = StubLLM(*replies)
+    return pipeline, pool
+
+
+def test_unterminated_quote_is_repaired():
+    pipeline, pool = make_pipeline("SELECT * FROM orders WHERE name = 'abc'")
+    result = pipeline.execute_with_repair("orders named abc", "SELECT * FROM orders WHERE name = 'abc")
+    assert result["sql"] == "SELECT * FROM orders WHERE name = 'abc'"
+    assert len(result["df"]) == 1
+    assert len(result["attempts"]) == 1
+    assert "FAILED SQL" in pipeline.llm_client.prompts[0]
+    # The broken statement names no tables, so only the question picks the schema
+    assert pipeline.schema_catalog.include == []
+    pool.close()
+
+
+def test_model_standing_by_unreadable_sql_reports_the_rejection():
+    broken = "SELECT * FROM orders WHERE name = 'abc"
+    pipeline, pool = make_pipeline(broken + "\n")
+    with pytest.raises(Exception, match="validator"):
+        pipeline.execute_with_repair("orders named abc", broken)
+    assert len(pipeline.llm_client.prompts) == 1
+    pool.close()
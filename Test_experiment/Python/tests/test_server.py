@@ -0,0 +1,16 @@
+from nl2sql_server import QueryServer
+
+
+class Pipeline:
+    on_metric = None
+
+
+def test_x_user_ignored_without_trusted_proxy():
+    server = QueryServer(Pipeline())
+    assert server.identify({"client": ("10.0.0.5", 4000)}, {b"x-user": b"alice"}) == "10.0.0.5"
+
+
+def test_x_user_from_trusted_proxy():
+    server = QueryServer(Pipeline(), trusted_proxies=["10.0.0.1"])
+    assert server.identify({"client": ("10.0.0.1", 4000)}, {b"x-user": b"alice"}) == "alice"
+    assert server.identify({"client": ("10.0.0.1", 4000)}, {}) == "10.0.0.1"
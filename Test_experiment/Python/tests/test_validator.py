@@ -0,0 +1,29 @@
+from nl2sql_validator import SQLValidator, referenced_tables
+
+
+TABLES = {"orders", "customers", "t"}
+
+
+def test_extract_from_is_not_a_table():
+    sql = "SELECT EXTRACT(YEAR_MONTH FROM order_date) FROM orders"
+    assert SQLValidator().validate(sql, TABLES) == []
+    assert referenced_tables(sql) == {"orders"}
+
+
+def test_trim_from_is_not_a_table():
+    sql = "SELECT TRIM(LEADING 'x' FROM name) FROM t"
+    assert SQLValidator().validate(sql, TABLES) == []
+    assert referenced_tables(sql) == {"t"}
+
+
+def test_subqueries_are_still_checked():
+    sql = "SELECT COALESCE((SELECT MAX(id) FROM nope), 0) FROM orders WHERE id IN (SELECT id FROM customers)"
+    assert [item["code"] for item in SQLValidator().validate(sql, TABLES)] == ["unknown_table"]
+    assert referenced_tables(sql) == {"orders", "nope", "customers"}
+
+
+def test_locking_reads_are_rejected():
+    for clause in ("FOR UPDATE", "FOR SHARE", "LOCK IN SHARE MODE"):
+        assert SQLValidator().validate(f"SELECT * FROM orders {clause}", TABLES)
+    # SHARE is only a keyword after FOR
+    assert SQLValidator().validate("SELECT share FROM orders", TABLES) == []